@@ -0,0 +1,138 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import multiprocessing
+import os
+import os.path as osp
+import time
+
+from modules.colmap.api import MATCHERS, ColmapAPI
+from modules.colmap.feature_store import DEFAULT_FEATURE_STORE_DIR
+from modules.gui.settings import Settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run COLMAP on many datasets without the GUI. Every dataset is a folder with an images/ '
+                    'sub-folder, the results are cached in it exactly like the GUI does.')
+    parser.add_argument('datasets', nargs='+',
+                        help='Dataset folders or glob patterns, e.g. "datasets/*"')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of datasets reconstructed in parallel')
+    parser.add_argument('--threads-per-job', type=int, default=None,
+                        help='CPU threads given to every job (default: all the cores divided by --jobs)')
+    parser.add_argument('--gpu-index', type=int, default=-1,
+                        help='GPU used for feature extraction and matching, -1 to run on the CPU')
+    parser.add_argument('--camera-model', default=Settings.DEFAULT_CAMERA_MODEL, choices=Settings.CAMERA_MODELS)
+    parser.add_argument('--matcher', default=Settings.DEFAULT_COLMAP_MATCHER, choices=MATCHERS)
+    parser.add_argument('--downsample', type=int, default=Settings.DEFAULT_DOWNSAMPLE_FACTOR,
+                        help='Downsample the images by this factor before running COLMAP')
+    parser.add_argument('--recompute', action='store_true',
+                        help='Run every COLMAP stage again, even on datasets whose cached result is up to date')
+    parser.add_argument('--full', action='store_true',
+                        help='Redo complete reconstructions instead of only adding new images')
+    parser.add_argument('--feature-store', default=DEFAULT_FEATURE_STORE_DIR,
+                        help='Folder of the features shared by all datasets, known images are not extracted again')
+    parser.add_argument('--dense', action='store_true',
+                        help='Also run the dense stage, resuming from the depth maps of an interrupted run')
+    parser.add_argument('--summary', default='batch_summary.json',
+                        help='Where to write the JSON summary of the run')
+    return parser.parse_args()
+
+
+def find_datasets(patterns):
+    datasets = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            path = osp.abspath(path)
+            if osp.isdir(osp.join(path, 'images')) and path not in datasets:
+                datasets.append(path)
+    return datasets
+
+
+def run_job(data_path, api_kwargs, recompute, incremental, dense=False):
+    ''' Reconstruct one dataset, returning its summary entry. Runs in a worker process. '''
+    start = time.perf_counter()
+    entry = {'dataset': data_path}
+
+    api = ColmapAPI(**api_kwargs)
+    api.data_path = data_path
+    entry['num_images'] = len(api._list_images_in_folder(api.image_dir))
+
+    try:
+        # Only skipped when every stage is done with the current images and settings, a result made with another
+        # matcher, camera model or downsampling resumes from the first stage they change
+        up_to_date = all(status == 'cached' for _, status in api.stage_status())
+        if not recompute and up_to_date and api.check_colmap_folder_valid() and api.is_cache_valid():
+            entry['status'] = 'skipped'
+        else:
+            if recompute:
+                api.invalidate_stages()
+            # Otherwise an interrupted or outdated run resumes from its first stale stage
+            api._estimate_cameras(recompute=True, incremental=incremental)
+            entry['status'] = 'done'
+            entry['num_cameras'] = api.num_cameras
+            entry['num_points'] = api.num_points
+            entry['peak_rss_mb'] = api.last_profile['peak_rss_mb']
+            entry['stages'] = api.last_profile['stages']
+        if dense:
+            if entry['status'] == 'skipped':
+                api._estimate_cameras(recompute=False)
+            entry['num_dense_points'] = len(api.estimate_dense().result().points)
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = str(e)
+
+    entry['seconds'] = time.perf_counter() - start
+    return entry
+
+
+def main():
+    args = parse_args()
+
+    datasets = find_datasets(args.datasets)
+    if len(datasets) == 0:
+        print('No dataset with an images/ folder matches', args.datasets)
+        return
+
+    jobs = max(1, min(args.jobs, len(datasets)))
+    threads_per_job = args.threads_per_job or max(1, (os.cpu_count() or 1) // jobs)
+    api_kwargs = {
+        'gpu_index': args.gpu_index if args.gpu_index >= 0 else None,
+        'camera_model': args.camera_model,
+        'matcher': args.matcher,
+        'downsample_factor': args.downsample,
+        'num_workers': threads_per_job,
+        'num_threads': threads_per_job,
+        'feature_store_dir': args.feature_store,
+    }
+    print(f'Reconstructing {len(datasets)} datasets, {jobs} at a time with {threads_per_job} threads each')
+
+    summary = {
+        'settings': dict(api_kwargs, jobs=jobs, recompute=args.recompute, incremental=not args.full, dense=args.dense),
+        'jobs': [],
+    }
+    start = time.perf_counter()
+
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_job, data_path, api_kwargs, args.recompute, not args.full, args.dense)
+            for data_path in datasets
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            entry = future.result()
+            print(f'[{entry["status"]}] {entry["dataset"]} in {entry["seconds"]:.1f}s', entry.get('error', ''))
+
+            # Written after every job, so an interrupted batch still leaves a usable summary
+            summary['jobs'].append(entry)
+            summary['total_seconds'] = time.perf_counter() - start
+            with open(args.summary, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+    print('Summary written to', args.summary)
+
+
+if __name__ == "__main__":
+    main()
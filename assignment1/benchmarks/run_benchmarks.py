@@ -0,0 +1,213 @@
+import argparse
+import json
+import numpy as np
+import open3d as o3d
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_api, make_reconstruction
+from modules.colmap.cache import ReconstructionCache
+from modules.colmap.camera_store import CameraTable
+from modules.colmap.point_filters import (
+    DEFAULT_FILTERS, error_mask, statistical_mask, track_length_mask, triangulation_angle_mask)
+from modules.colmap.spatial_index import SpatialIndex
+from utils.geometry_utils import compute_frustum_lines, compute_frustum_points, compute_frustum_rays
+
+
+# Scene sizes as (num_cameras, num_points)
+PRESETS = {
+    'small': [(100, 10 ** 4)],
+    'medium': [(100, 10 ** 4), (1000, 10 ** 5), (1000, 10 ** 6)],
+    'large': [(100, 10 ** 4), (1000, 10 ** 6), (10000, 10 ** 6), (10000, 10 ** 7)],
+}
+
+
+def bench_extract_camera_parameters(api, reconstruction, work_dir):
+    names = api.camera_names
+
+    def run():
+        for name in names:
+            api.extract_camera_parameters(name)
+    return run
+
+
+def bench_frustums(api, reconstruction, work_dir):
+    # Same steps as AppWindow._visualize_cameras after a new reconstruction
+    def run():
+        centers, rays = compute_frustum_rays(*api.stacked_camera_parameters())
+        lines = o3d.geometry.LineSet()
+        lines.lines = o3d.utility.Vector2iVector(compute_frustum_lines(len(rays)))
+        lines.points = o3d.utility.Vector3dVector(compute_frustum_points(centers, rays, 0.3))
+        lines.paint_uniform_color([0.784, 0.526, 0.973])
+    return run
+
+
+def bench_cache_load(api, reconstruction, work_dir):
+    cache = ReconstructionCache(os.path.join(work_dir, 'cache'))
+    cache.save(reconstruction, 'benchmark')
+
+    # Load the arrays and build the camera table, as _estimate_cameras does for an up to date cache
+    def run():
+        loaded = cache.load()
+        CameraTable.from_reconstruction(loaded)
+        np.asarray(loaded['xyz']).min(axis=0)
+    return run
+
+
+def bench_point_cloud(api, reconstruction, work_dir):
+    def run():
+        api._pcd = None
+        api.pcd
+    return run
+
+
+def bench_point_chunks(api, reconstruction, work_dir):
+    def run():
+        for _ in api.iter_point_chunks():
+            pass
+    return run
+
+
+def bench_spatial_index(api, reconstruction, work_dir):
+    # Build the index, then pick 100 points and crop a box, as the GUI selection tools do
+    rng = np.random.default_rng(0)
+    targets = rng.uniform(-1, 1, (100, 3))
+
+    def run():
+        index = SpatialIndex(reconstruction['xyz'])
+        for target in targets:
+            index.nearest(target)
+        index.box([-0.2, -0.2, -0.2], [0.2, 0.2, 0.2])
+    return run
+
+
+def bench_point_filters(api, reconstruction, work_dir):
+    # Every mask at its default threshold, as computed once per result before being cached
+    centers = api.cameras.centers()
+
+    def run():
+        error_mask(reconstruction['errors'], DEFAULT_FILTERS['max_error'])
+        track_length_mask(reconstruction['track_offsets'], DEFAULT_FILTERS['min_track_length'])
+        triangulation_angle_mask(reconstruction['xyz'], reconstruction['track_offsets'],
+                                 reconstruction['track_images'], centers, DEFAULT_FILTERS['min_angle'])
+        statistical_mask(reconstruction['xyz'], DEFAULT_FILTERS['std_ratio'])
+    return run
+
+
+# Name: function(api, reconstruction, work_dir) returning the callable to time
+BENCHMARKS = {
+    'extract_camera_parameters': bench_extract_camera_parameters,
+    'frustums': bench_frustums,
+    'cache_load': bench_cache_load,
+    'point_cloud': bench_point_cloud,
+    'point_chunks': bench_point_chunks,
+    'spatial_index': bench_spatial_index,
+    'point_filters': bench_point_filters,
+}
+
+
+def time_function(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(sizes, names, repeat):
+    results = []
+    for num_cameras, num_points in sizes:
+        print(f'Scene with {num_cameras} cameras and {num_points} points')
+        reconstruction = make_reconstruction(num_cameras, num_points)
+        api = make_api(reconstruction)
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name in names:
+                times = time_function(BENCHMARKS[name](api, reconstruction, work_dir), repeat)
+                results.append({
+                    'name': name,
+                    'cameras': num_cameras,
+                    'points': num_points,
+                    'repeat': repeat,
+                    'median_seconds': float(np.median(times)),
+                    'min_seconds': min(times),
+                })
+                print(f'  {name}: {np.median(times) * 1000:.2f} ms')
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    ''' Results whose median time is more than tolerance (relative) slower than the baseline '''
+    baseline_times = {
+        (entry['name'], entry['cameras'], entry['points']): entry['median_seconds'] for entry in baseline['results']
+    }
+    regressions = []
+    for entry in results:
+        reference = baseline_times.get((entry['name'], entry['cameras'], entry['points']))
+        if reference is not None and entry['median_seconds'] > (1 + tolerance) * reference:
+            regressions.append((entry, reference))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Time the load and visualization hot paths on synthetic reconstructions, without GUI or GPU.')
+    parser.add_argument('--preset', default='small', choices=list(PRESETS.keys()),
+                        help='Set of scene sizes to run')
+    parser.add_argument('--cameras', type=int, nargs='+',
+                        help='Number of cameras of the scenes, replaces the preset together with --points')
+    parser.add_argument('--points', type=int, nargs='+',
+                        help='Number of points of the scenes, every combination with --cameras is run')
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS.keys()), choices=list(BENCHMARKS.keys()))
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs of every benchmark, the median is reported')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=None,
+                        help='Results of a previous run to compare with, the exit code is 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative slowdown over the baseline reported as a regression')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    sizes = PRESETS[args.preset]
+    if args.cameras or args.points:
+        if not (args.cameras and args.points):
+            raise ValueError('--cameras and --points must be given together')
+        sizes = [(num_cameras, num_points) for num_cameras in args.cameras for num_points in args.points]
+
+    results = run_benchmarks(sizes, args.benchmarks, args.repeat)
+    output = {
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'open3d': o3d.__version__,
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print('Results written to', args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for entry, reference in regressions:
+            print(f'Regression: {entry["name"]} with {entry["cameras"]} cameras and {entry["points"]} points, '
+                  f'{entry["median_seconds"] * 1000:.2f} ms against {reference * 1000:.2f} ms')
+        if len(regressions) > 0:
+            sys.exit(1)
+        print('No regression against', args.baseline)
+
+
+if __name__ == "__main__":
+    main()
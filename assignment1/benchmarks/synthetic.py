@@ -0,0 +1,56 @@
+import numpy as np
+
+from modules.colmap.api import ColmapAPI
+
+
+def make_reconstruction(num_cameras, num_points, seed=0):
+    ''' Synthetic reconstruction in the format returned by modules.colmap.reader.read_sparse_model
+
+    The cameras sit on a sphere of radius 5 and look at the origin, the points fill a unit cube around it.
+    '''
+    rng = np.random.default_rng(seed)
+
+    # Fibonacci sphere, so any number of cameras is spread evenly
+    i = np.arange(num_cameras) + 0.5
+    polar = np.arccos(1 - 2 * i / num_cameras)
+    azimuth = np.pi * (1 + 5 ** 0.5) * i
+    centers = 5.0 * np.stack([
+        np.cos(azimuth) * np.sin(polar),
+        np.sin(azimuth) * np.sin(polar),
+        np.cos(polar),
+    ], axis=1)
+
+    # World-to-camera rotations whose z axis points from the center to the origin
+    forward = -centers / np.linalg.norm(centers, axis=1, keepdims=True)
+    up = np.where(np.abs(forward[:, 2:]) < 0.99, [[0.0, 0.0, 1.0]], [[0.0, 1.0, 0.0]])
+    right = np.cross(forward, up)
+    right /= np.linalg.norm(right, axis=1, keepdims=True)
+    down = np.cross(forward, right)
+    rotations = np.stack([right, down, forward], axis=1)
+    translations = -np.einsum('nij,nj->ni', rotations, centers)
+
+    intrinsics = np.tile([1920.0, 1080.0, 1500.0, 1500.0, 960.0, 540.0], (num_cameras, 1))
+
+    # Every point is seen by 2 to 5 random cameras
+    track_lengths = rng.integers(2, 6, num_points)
+    track_offsets = np.zeros(num_points + 1, dtype=np.int64)
+    np.cumsum(track_lengths, out=track_offsets[1:])
+
+    return {
+        'xyz': rng.uniform(-1, 1, (num_points, 3)).astype(np.float32),
+        'rgb': rng.integers(0, 256, (num_points, 3), dtype=np.uint8),
+        'errors': rng.exponential(0.5, num_points).astype(np.float32),
+        'track_offsets': track_offsets,
+        'track_images': rng.integers(0, num_cameras, track_offsets[-1], dtype=np.int32),
+        'image_names': [f'image_{i:06d}.jpg' for i in range(num_cameras)],
+        'rotations': rotations,
+        'translations': translations,
+        'intrinsics': intrinsics,
+    }
+
+
+def make_api(reconstruction):
+    ''' A ColmapAPI holding reconstruction, as if _estimate_cameras had just loaded it '''
+    api = ColmapAPI(gpu_index=None, camera_model='OPENCV', matcher='exhaustive_matcher')
+    api._set_reconstruction(reconstruction, [])
+    return api
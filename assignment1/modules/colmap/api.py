@@ -1,12 +1,43 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
 import numpy as np
 import open3d as o3d
+import os
 import os.path as osp
 import glob
+import shutil
 
-from utils.thread_utils import run_on_thread
+from modules.colmap.cache import CACHE_ARRAYS, CACHE_VERSION, ReconstructionCache, compute_fingerprint
+from modules.colmap.camera_store import CameraTable
+from modules.colmap.commands import run_colmap
+from modules.colmap.dense import (
+    DEFAULT_DENSE_MAX_SIZE, DEFAULT_NUM_DEPTHS, DEFAULT_NUM_SOURCES, DEFAULT_TILE_SIZE, DENSE_VERSION,
+    compute_depth_maps, depth_map_path, fuse_depth_maps, make_views)
+from modules.colmap.database import clear_matches, count_verified_pairs, read_features, read_image_names
+from modules.colmap.feature_store import (
+    DEFAULT_FEATURE_STORE_DIR, FeatureStore, extractor_key, hash_images, write_feature_text)
+from modules.colmap.lod import build_lod_pyramid
+from modules.colmap.matcher_planner import SEQUENTIAL_OVERLAP, plan_matching
+from modules.colmap.point_filters import (
+    DEFAULT_FILTERS, error_mask, mask_key, statistical_mask, track_length_mask, triangulation_angle_mask)
+from modules.colmap.preprocess import downsample_images, rescale_intrinsics
+from modules.colmap.reader import find_model_files, find_models, model_size, read_sparse_model
+from modules.colmap.spatial_index import SpatialIndex
+from modules.colmap.stages import STAGES, StageManifests, stage_keys
+from utils.profile_utils import StageProfiler, format_record
+from utils.shared_memory_utils import attach_arrays, release_blocks, share_arrays
+from utils.thread_utils import current_future, report_progress, run_on_process, run_on_thread
 
 
 VOCAB_PATH = 'modules/colmap/vocab_tree_flickr100K_words32K.bin'
+DEFAULT_CHUNK_SIZE = 250000
+EXECUTION_MODES = ['thread', 'process']
+MATCHERS = ['exhaustive_matcher', 'vocab_tree_matcher', 'sequential_matcher', 'auto']
+
+# A model COLMAP wrote besides the main one, with its colored points and cameras
+SubModel = collections.namedtuple('SubModel', ['name', 'pcd', 'cameras'])
 
 
 class ColmapAPI:
@@ -15,19 +46,53 @@ class ColmapAPI:
         gpu_index,
         camera_model,
         matcher,
+        execution_mode='thread',
+        downsample_factor=1,
+        num_workers=None,
+        num_threads=None,
+        feature_store_dir=DEFAULT_FEATURE_STORE_DIR,
     ):
         self._data_path = None
         self._pcd = None
-        self._thread = None
+        self._points_xyz = None
+        self._points_rgb = None
+        self._point_errors = None
+        # Observing images of every point as (track_offsets, track_images), see read_sparse_model
+        self._tracks = None
+        self._spatial_index_future = None
+        # Active point filters as name: threshold, the masks of the current result by mask_key, and the points
+        # kept by all the active filters (None when there is none)
+        self._point_filters = {}
+        self._filter_masks = {}
+        self._point_mask = None
+        self._lod_levels = []
+        self._dense_pcd = None
+        # Sub-models loaded by load_sub_models, by name
+        self._sub_models = {}
+        self._future = None
         self._active_camera_name = None
-        self._cameras = dict()
+        self._cameras = None
         self._vis = None
+        # Shared memory blocks backing the arrays received from a worker process
+        self._shared_blocks = []
+        # Stages of the running estimation, and the summary of the last finished one
+        self._profiler = None
+        self._last_profile = None
 
         self._gpu_index = gpu_index
         self._camera_model = camera_model
         self._matcher = matcher
-        if self._matcher not in ['exhaustive_matcher', 'vocab_tree_matcher', 'sequential_matcher']:
-            raise ValueError(f'Only support exhaustive_matcher and vocab_tree_matcher, got {self._matcher}')
+        self._downsample_factor = downsample_factor
+        self._num_workers = num_workers
+        # CPU threads given to every COLMAP command, None to let COLMAP use all the cores
+        self._num_threads = num_threads
+        # Features shared by all datasets, keyed by image content, None to always extract them
+        self._feature_store_dir = feature_store_dir
+        if self._matcher not in MATCHERS:
+            raise ValueError(f'Only support {MATCHERS} matchers, got {self._matcher}')
+        self._execution_mode = execution_mode
+        if self._execution_mode not in EXECUTION_MODES:
+            raise ValueError(f'Only support {EXECUTION_MODES} execution modes, got {self._execution_mode}')
 
     @property
     def data_path(self):
@@ -51,32 +116,279 @@ class ColmapAPI:
     def sparse_dir(self):
         return osp.join(self.data_path, 'colmap/sparse')
 
+    @property
+    def preprocessed_image_dir(self):
+        return osp.join(self.data_path, f'images_{self._downsample_factor}')
+
+    @property
+    def preprocess_path(self):
+        # Downsampling used by the current sparse model, needed to rescale its intrinsics
+        return osp.join(self.data_path, 'colmap/preprocess.json')
+
+    @property
+    def run_parameters_path(self):
+        # Parameters of the run that produced the database, an incremental update must use the same ones
+        return osp.join(self.data_path, 'colmap/run.json')
+
+    @property
+    def image_hashes_path(self):
+        # Content hashes of the images, addressing their features in the feature store
+        return osp.join(self.data_path, 'colmap/image_hashes.json')
+
+    @property
+    def stages_dir(self):
+        # One manifest per finished reconstruction stage, see modules.colmap.stages
+        return osp.join(self.data_path, 'colmap/stages')
+
+    @property
+    def cache_dir(self):
+        return osp.join(self.data_path, 'colmap/cache')
+
+    @property
+    def thumbnail_dir(self):
+        # Downsampled copies of the images for display, see modules.gui.thumbnails
+        return osp.join(self.data_path, 'colmap/thumbnails')
+
+    @property
+    def dense_dir(self):
+        # Depth maps of the dense stage, one file per image, and the fused point cloud
+        return osp.join(self.data_path, 'colmap/dense')
+
+    @property
+    def dense_path(self):
+        return osp.join(self.dense_dir, 'fused.ply')
+
+    @property
+    def trace_path(self):
+        # One JSON line per run with the duration, memory and item counts of every stage
+        return osp.join(self.data_path, 'colmap/trace.jsonl')
+
+    @property
+    def model_dir(self):
+        # COLMAP's mapper writes one model per group of connected images into numbered sub-folders, the
+        # largest one is the main reconstruction and the others are sub-models
+        model_dirs = find_models(self.sparse_dir)
+        if len(model_dirs) == 0:
+            return osp.join(self.sparse_dir, '0')
+        return max(model_dirs, key=model_size)
+
+    @property
+    def sub_model_dirs(self):
+        ''' Folders of the models other than model_dir, smallest first '''
+        model_dir = self.model_dir
+        return sorted((path for path in find_models(self.sparse_dir) if path != model_dir), key=model_size)
+
+    @property
+    def sub_models_cache_dir(self):
+        # One reconstruction cache per sub-model, named after its folder
+        return osp.join(self.data_path, 'colmap/cache_models')
+
     @property
     def num_cameras(self):
-        return len(self._cameras)
+        return 0 if self._cameras is None else len(self._cameras)
 
     @property
     def camera_names(self):
-        return list(self._cameras.keys())
+        return [] if self._cameras is None else self._cameras.names
+
+    @property
+    def cameras(self):
+        ''' The modules.colmap.camera_store.CameraTable of the reconstruction '''
+        if self._cameras is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        return self._cameras
 
     @property
     def pcd(self):
         if self._pcd is None:
-            raise ValueError(f'COLMAP has not estimated the camera yet')
+            if self._points_xyz is None:
+                raise ValueError(f'COLMAP has not estimated the camera yet')
+            self._pcd = o3d.geometry.PointCloud()
+            self._pcd.points = o3d.utility.Vector3dVector(self._points_xyz.astype(np.float64))
+            self._pcd.colors = o3d.utility.Vector3dVector(self._points_rgb / 255.0)
         return self._pcd
 
+    def points_subset(self, indices):
+        ''' A colored point cloud of the full-resolution points at indices '''
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        subset = o3d.geometry.PointCloud()
+        subset.points = o3d.utility.Vector3dVector(self._points_xyz[indices].astype(np.float64))
+        subset.colors = o3d.utility.Vector3dVector(self._points_rgb[indices] / 255.0)
+        return subset
+
+    @property
+    def dense_pcd(self):
+        ''' The fused point cloud of the last dense stage run on the current result, None if there is none '''
+        return self._dense_pcd
+
+    @property
+    def num_points(self):
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        return len(self._points_xyz)
+
+    @property
+    def num_lod_levels(self):
+        ''' Number of point cloud levels, level 0 being the full-resolution cloud '''
+        # The coarse levels are built from the unfiltered points, only level 0 can be filtered
+        if self._point_mask is not None:
+            return 1
+        return 1 + len(self._lod_levels)
+
+    def lod_voxel_size(self, level):
+        if level == 0:
+            return 0.0
+        return self._lod_levels[level - 1][0]
+
+    def lod_num_points(self, level):
+        if level == 0 and self._point_mask is not None:
+            return int(np.count_nonzero(self._point_mask))
+        if level == 0:
+            return self.num_points
+        return len(self._lod_levels[level - 1][1])
+
+    @property
+    def point_filters(self):
+        return dict(self._point_filters)
+
+    @property
+    def point_mask(self):
+        ''' Boolean mask of the points kept by the active filters, None when no filter is active '''
+        return self._point_mask
+
+    def set_point_filters(self, filters):
+        ''' Only keep the points passing every filter of filters, a dictionary name: threshold like DEFAULT_FILTERS
+
+        The filters also apply to the next results. Masks that are not cached yet are computed, so this can take
+        a while the first time a threshold is used.
+        '''
+        for name in filters:
+            if name not in DEFAULT_FILTERS:
+                raise ValueError(f'Only support {list(DEFAULT_FILTERS.keys())} point filters, got {name}')
+        self._point_filters = dict(filters)
+        if self._points_xyz is not None:
+            self._point_mask = self._combined_filter_mask()
+
+    def filter_mask(self, name, threshold):
+        ''' Mask of the points kept by a single filter, computed once per result and cached next to the model '''
+        key = mask_key(name, threshold)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            cache = ReconstructionCache(self.cache_dir)
+            mask = cache.load_mask(key)
+            if mask is None:
+                cache.save_mask(key, self._compute_filter_mask(name, threshold))
+                mask = cache.load_mask(key)
+            self._filter_masks[key] = mask
+        return mask
+
+    def _compute_filter_mask(self, name, threshold):
+        track_offsets, track_images = self._tracks
+        if name == 'max_error':
+            return error_mask(self._point_errors, threshold)
+        if name == 'min_track_length':
+            return track_length_mask(track_offsets, threshold)
+        if name == 'min_angle':
+            return triangulation_angle_mask(
+                self._points_xyz, track_offsets, track_images, self._cameras.centers(), threshold)
+        if name == 'std_ratio':
+            return statistical_mask(self._points_xyz, threshold)
+        raise ValueError(f'Only support {list(DEFAULT_FILTERS.keys())} point filters, got {name}')
+
+    def _combined_filter_mask(self):
+        if len(self._point_filters) == 0:
+            return None
+        return np.logical_and.reduce([
+            self.filter_mask(name, threshold) for name, threshold in self._point_filters.items()])
+
+    def _filter_points(self):
+        # Masks of the default thresholds are computed right away, so toggling a filter only reads the cache
+        with self._profiler.stage('filter points', points=self.num_points):
+            report_progress('filter points')
+            for name, threshold in DEFAULT_FILTERS.items():
+                self.filter_mask(name, threshold)
+            self._point_mask = self._combined_filter_mask()
+            if self._point_mask is not None:
+                self._profiler.count(kept=int(np.count_nonzero(self._point_mask)))
+
+    @property
+    def spatial_index(self):
+        ''' The modules.colmap.spatial_index.SpatialIndex of the full-resolution points, waiting for it if needed '''
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        return self.build_spatial_index().result()
+
+    def build_spatial_index(self):
+        ''' Start building the spatial index in the background, returning its future. It is built once per result '''
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        if self._spatial_index_future is None:
+            self._spatial_index_future = run_on_thread(SpatialIndex)(self._points_xyz)
+        return self._spatial_index_future
+
+    def memory_usage(self):
+        ''' Estimated bytes held by the loaded result, memory-mapped arrays included since they get paged in '''
+        arrays = [self._points_xyz, self._points_rgb, self._point_errors, self._point_mask]
+        if self._tracks is not None:
+            arrays += list(self._tracks)
+        if self._cameras is not None:
+            arrays += [self._cameras.intrinsics, self._cameras.rotations, self._cameras.translations]
+        arrays += [array for _, xyz, rgb in self._lod_levels for array in (xyz, rgb)]
+        arrays += list(self._filter_masks.values())
+        nbytes = sum(np.asarray(array).nbytes for array in arrays if array is not None)
+
+        # Open3D clouds hold float64 positions and colors
+        clouds = [self._pcd, self._dense_pcd] + [sub_model.pcd for sub_model in self._sub_models.values()]
+        nbytes += sum(48 * len(pcd.points) for pcd in clouds if pcd is not None)
+        future = self._spatial_index_future
+        if future is not None and future.done() and future.exception() is None:
+            nbytes += future.result().nbytes
+        return nbytes
+
+    def point_info(self, index):
+        ''' Position, color, mean reprojection error in pixels and observing image names of the point at index '''
+        if self._tracks is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        track_offsets, track_images = self._tracks
+        names = self.camera_names
+        track = track_images[track_offsets[index]:track_offsets[index + 1]]
+        return {
+            'xyz': np.array(self._points_xyz[index], dtype=np.float64),
+            'rgb': np.array(self._points_rgb[index]),
+            'error': float(self._point_errors[index]),
+            # A point can be observed several times by the same image
+            'images': list(dict.fromkeys(names[i] for i in track)),
+        }
+
+    @property
+    def bounds(self):
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        if len(self._points_xyz) == 0:
+            return o3d.geometry.AxisAlignedBoundingBox()
+        return o3d.geometry.AxisAlignedBoundingBox(
+            self._points_xyz.min(axis=0).astype(np.float64),
+            self._points_xyz.max(axis=0).astype(np.float64),
+        )
+
     @property
     def activate_camera_name(self):
-        if len(self._cameras) == 0:
+        if self.num_cameras == 0:
             raise ValueError(f'COLMAP has not estimated the camera yet')
         return self._active_camera_name
 
     @activate_camera_name.setter
     def activate_camera_name(self, new_value):
-        if len(self._cameras) == 0:
+        if self.num_cameras == 0:
             raise ValueError(f'COLMAP has not estimated the camera yet')
         self._active_camera_name = new_value
 
+    @property
+    def last_profile(self):
+        ''' Stage records of the last estimation, see utils.profile_utils.StageProfiler.to_dict '''
+        return self._last_profile
+
     @property
     def camera_model(self):
         return self._camera_model
@@ -93,6 +405,14 @@ class ColmapAPI:
     def matcher(self, new_value):
         self._matcher = new_value
 
+    @property
+    def downsample_factor(self):
+        return self._downsample_factor
+
+    @downsample_factor.setter
+    def downsample_factor(self, new_value):
+        self._downsample_factor = new_value
+
     def check_colmap_folder_valid(self):
         database_path = self.database_path
         image_dir = self.image_dir
@@ -107,10 +427,21 @@ class ColmapAPI:
             osp.isdir(image_dir) and \
             osp.isdir(sparse_dir)
 
+        stages = StageManifests(self.stages_dir)
+        if is_valid and stages.exists() and stages.read('map') is None:
+            # Folders written before the stage manifests have none, they are trusted as before
+            print('The last COLMAP run stopped before mapping was done:', stages.manifest_dir)
+            is_valid = False
+
         return is_valid
 
-    @run_on_thread
-    def _estimate_cameras(self, recompute):
+    def is_cache_valid(self):
+        ''' Whether the cached arrays match the current sparse model and images '''
+        if find_model_files(self.model_dir) is None:
+            return False
+        return ReconstructionCache(self.cache_dir).is_valid(self._reconstruction_fingerprint())
+
+    def _estimate_cameras(self, recompute, incremental=False):
         ''' Assignment 1
 
         In this assignment, you need to compute two things:
@@ -132,28 +463,606 @@ class ColmapAPI:
                 }
 
             You can check the extract_camera_parameters method to understand how the cameras are used.
+            The cameras are kept as a modules.colmap.camera_store.CameraTable, whose camera_dict method
+            returns this format for a single camera.
         '''
 
-        ## Insert your code below
+        self._profiler = StageProfiler('estimate_cameras', on_record=self._on_stage_record)
+        self._profiler.metadata.update(self._run_parameters(), recompute=recompute, incremental=incremental)
+
         if recompute:
-            # Compute the result once and cache it in self.data_path. This will save a lot of time on the next run
-            # If you use COLMAP, save the database and bundle adjustment data in self.database_dir and
-            # self.sparse_dir, respectively.
-            pass
+            # The result is cached in self.data_path: the database and bundle adjustment data go to
+            # self.database_path and self.sparse_dir, the loaded arrays to self.cache_dir
+            os.makedirs(osp.dirname(self.database_path), exist_ok=True)
+            with self._profiler.stage('list images'):
+                image_paths = self._list_images_in_folder(self.image_dir)
+                self._profiler.count(images=len(image_paths))
+                keys = self._stage_keys(image_paths)
+            self._run_stages(image_paths, keys, incremental)
+        else:
+            keys = None
 
-        # You can load the cached data here before adding points and cameras
+        reconstruction = self._load_reconstruction()
+        lod_levels = self._load_lod_pyramid(reconstruction)
+        self._set_reconstruction(reconstruction, lod_levels)
+        self._filter_points()
+        self._mark_exported(keys)
 
-        # Add points
-        pcd = o3d.geometry.PointCloud()
+        self._last_profile = self._profiler.to_dict()
+        self._profiler.append_to(self.trace_path)
+
+    @staticmethod
+    def _on_stage_record(record):
+        print('Stage', format_record(record))
+        report_progress(record['stage'], message='done', profile=record)
+
+    def _preprocess_images(self, image_paths):
+        ''' Downsample the input images when requested, returning the folder to reconstruct from and the sizes '''
+        if self._downsample_factor <= 1:
+            return self.image_dir, {}
+
+        with self._profiler.stage('preprocess', images=len(image_paths)):
+            sizes = downsample_images(
+                image_paths,
+                self.preprocessed_image_dir,
+                self._downsample_factor,
+                osp.join(self.data_path, f'colmap/images_{self._downsample_factor}.json'),
+                self._num_workers,
+            )
+        return self.preprocessed_image_dir, sizes
+
+    def _run_parameters(self):
+        return {
+            'camera_model': self._camera_model,
+            'matcher': self._matcher,
+            'downsample_factor': self._downsample_factor,
+        }
+
+    def _extract_options(self, image_dir):
+        use_gpu = self._gpu_index is not None and self._gpu_index >= 0
+        options = {
+            'database_path': self.database_path,
+            'image_path': image_dir,
+            'ImageReader.camera_model': self._camera_model,
+            'SiftExtraction.use_gpu': use_gpu,
+            'SiftExtraction.gpu_index': self._gpu_index if use_gpu else -1,
+        }
+        if self._num_threads is not None:
+            options['SiftExtraction.num_threads'] = self._num_threads
+        return options
+
+    def _extractor_settings(self):
+        # Everything the extracted features depend on, the images themselves aside
+        use_gpu = self._gpu_index is not None and self._gpu_index >= 0
+        return {'extractor': 'sift', 'use_gpu': use_gpu}
+
+    def _import_options(self, image_dir, import_path, image_list_path):
+        return {
+            'database_path': self.database_path,
+            'image_path': image_dir,
+            'import_path': import_path,
+            'image_list_path': image_list_path,
+            'ImageReader.camera_model': self._camera_model,
+        }
+
+    def _match_options(self):
+        use_gpu = self._gpu_index is not None and self._gpu_index >= 0
+        options = {
+            'database_path': self.database_path,
+            'SiftMatching.use_gpu': use_gpu,
+            'SiftMatching.gpu_index': self._gpu_index if use_gpu else -1,
+        }
+        if self._num_threads is not None:
+            options['SiftMatching.num_threads'] = self._num_threads
+        return options
+
+    def _mapper_options(self):
+        options = {'database_path': self.database_path}
+        if self._num_threads is not None:
+            options['Mapper.num_threads'] = self._num_threads
+        return options
+
+    def _stage_parameters(self):
+        # Everything a stage depends on besides the stages before it, see modules.colmap.stages
+        return {
+            'preprocess': {'downsample_factor': self._downsample_factor},
+            'extract': dict(self._extractor_settings(), camera_model=self._camera_model),
+            'match': {'matcher': self._matcher},
+            'export': {'cache_version': CACHE_VERSION},
+        }
+
+    def _stage_keys(self, image_paths):
+        hashes = hash_images(image_paths, self.image_hashes_path)
+        inputs_hash = hashlib.sha1(json.dumps(hashes, sort_keys=True).encode('utf-8')).hexdigest()
+        return stage_keys(inputs_hash, self._stage_parameters())
+
+    def _first_stale_stage(self, stages, keys):
+        ''' First stage to run again for keys, also when the output of a finished stage was removed since '''
+        first = stages.first_stale(keys)
+        missing = None
+        if self._downsample_factor > 1 and not osp.isdir(self.preprocessed_image_dir):
+            missing = 'preprocess'
+        elif not osp.isfile(self.database_path):
+            missing = 'extract'
+        elif find_model_files(self.model_dir) is None:
+            missing = 'map'
+        if missing is not None and (first is None or STAGES.index(missing) < STAGES.index(first)):
+            first = missing
+        return first
+
+    def _complete_stage(self, stages, keys, stage, **outputs):
+        stages.mark_done(stage, keys[stage], self._stage_parameters().get(stage, {}), outputs)
+
+    def _run_stages(self, image_paths, keys, incremental):
+        ''' Run COLMAP from the first stage that is not done for keys, the export stage being left to loading
 
-        # Add cameras
-        colmap_cameras = {}
+        The manifests of the stages that run again are removed first, and every stage writes its manifest once
+        done, so an interrupted run resumes from the stage it was in.
+        '''
+        stages = StageManifests(self.stages_dir)
+        first = self._first_stale_stage(stages, keys)
+        if first is None or first == 'export':
+            print('COLMAP stages are up to date:', stages.manifest_dir)
+            return
+        print(f'Running COLMAP from the {first} stage')
+        stages.invalidate(first)
+        pending = STAGES[STAGES.index(first):]
+
+        if 'list' in pending:
+            self._complete_stage(stages, keys, 'list', images=len(image_paths))
+
+        if 'preprocess' in pending:
+            image_dir, sizes = self._preprocess_images(image_paths)
+            self._complete_stage(stages, keys, 'preprocess', sizes=sizes)
+        else:
+            image_dir = self.preprocessed_image_dir if self._downsample_factor > 1 else self.image_dir
+            sizes = stages.read('preprocess')['outputs']['sizes']
+
+        new_names = self._find_new_images(image_dir) if incremental and 'extract' in pending else None
+        # Only written back once mapping is done, so an interrupted run is never extended incrementally
+        if osp.isfile(self.run_parameters_path):
+            os.remove(self.run_parameters_path)
+
+        if new_names is not None:
+            if len(new_names) > 0:
+                self._update_colmap(image_dir, new_names)
+            for stage in ('extract', 'match', 'verify', 'map'):
+                self._complete_stage(stages, keys, stage, images=len(new_names))
+        else:
+            self._run_colmap(image_dir, stages, keys, pending)
+
+        with open(self.run_parameters_path, 'w') as f:
+            json.dump(self._run_parameters(), f)
+        # Left untouched when nothing changed, so the cached result stays valid
+        if new_names is None or len(new_names) > 0:
+            with open(self.preprocess_path, 'w') as f:
+                json.dump({'factor': self._downsample_factor, 'sizes': sizes}, f)
+
+    def _run_colmap(self, image_dir, stages, keys, pending):
+        names = [osp.basename(path) for path in self._list_images_in_folder(image_dir)]
+        num_images = len(names)
+
+        if 'extract' in pending:
+            if osp.isfile(self.database_path):
+                os.remove(self.database_path)
+            with self._profiler.stage('extract', images=num_images):
+                report_progress('extract')
+                self._extract_features(image_dir, names)
+            self._complete_stage(stages, keys, 'extract', images=num_images)
+
+        if 'match' in pending:
+            with self._profiler.stage('match', images=num_images):
+                report_progress('match')
+                # Matchers skip the pairs already in the database, those of another matcher included
+                clear_matches(self.database_path)
+                self._match_features(image_dir)
+            self._complete_stage(stages, keys, 'match')
+
+        if 'verify' in pending:
+            # COLMAP verifies the pairs while matching, this checks there is something to map before mapping
+            with self._profiler.stage('verify', images=num_images):
+                report_progress('verify')
+                verified_pairs = count_verified_pairs(self.database_path)
+                self._profiler.count(verified_pairs=verified_pairs)
+            if verified_pairs == 0:
+                raise RuntimeError('No image pair was geometrically verified, the images may not overlap enough')
+            self._complete_stage(stages, keys, 'verify', verified_pairs=verified_pairs)
+
+        if 'map' in pending:
+            if osp.isdir(self.sparse_dir):
+                shutil.rmtree(self.sparse_dir)
+            os.makedirs(self.sparse_dir)
+            with self._profiler.stage('map', images=num_images):
+                report_progress('map')
+                mapper_options = self._mapper_options()
+                mapper_options['image_path'] = image_dir
+                mapper_options['output_path'] = self.sparse_dir
+                run_colmap('mapper', mapper_options)
+            if find_model_files(self.model_dir) is None:
+                raise RuntimeError(f'COLMAP mapper did not write any model in {self.sparse_dir}')
+            self._complete_stage(stages, keys, 'map')
+
+    def _mark_exported(self, keys=None):
+        ''' Record the export stage once the reconstruction of up to date stages is cached
+
+        keys are those of the run that just finished. Loading a result without running computes them only when
+        the export stage was never recorded, since that lists and stats every image.
+        '''
+        stages = StageManifests(self.stages_dir)
+        if not stages.exists():
+            return
+        if keys is None:
+            if stages.read('export') is not None:
+                return
+            keys = self._stage_keys(self._list_images_in_folder(self.image_dir))
+        if stages.is_done('map', keys['map']) and not stages.is_done('export', keys['export']):
+            self._complete_stage(stages, keys, 'export', fingerprint=self._reconstruction_fingerprint())
+
+    def stage_status(self):
+        ''' [(stage, 'cached' | 'stale' | 'missing')] of every stage for the current images and parameters '''
+        stages = StageManifests(self.stages_dir)
+        if not stages.exists():
+            return [(stage, 'missing') for stage in STAGES]
+        keys = self._stage_keys(self._list_images_in_folder(self.image_dir))
+        first = self._first_stale_stage(stages, keys)
+        stale = STAGES[STAGES.index(first):] if first is not None else []
+        return [
+            (stage, 'stale' if status == 'cached' and stage in stale else status)
+            for stage, status in stages.status(keys)
+        ]
+
+    def invalidate_stages(self, stage='list'):
+        ''' Make the next run start again from stage, even if it is up to date '''
+        StageManifests(self.stages_dir).invalidate(stage)
+
+    def _find_new_images(self, image_dir):
+        ''' Names of the images missing from the existing database, or None when a full run is needed
+
+        A full run is needed when there is no previous result, when it used different parameters, or when
+        images were removed since.
+        '''
+        if not osp.isfile(self.database_path) or find_model_files(self.model_dir) is None:
+            return None
+        if not osp.isfile(self.run_parameters_path):
+            return None
+        with open(self.run_parameters_path, 'r') as f:
+            if json.load(f) != self._run_parameters():
+                return None
+
+        names = [osp.basename(path) for path in self._list_images_in_folder(image_dir)]
+        known_names = read_image_names(self.database_path)
+        if any(name not in names for name in known_names):
+            return None
+        return [name for name in names if name not in known_names]
+
+    def _update_colmap(self, image_dir, new_names):
+        ''' Extract and match only new_names, then register them into the existing sparse model '''
+        colmap_dir = osp.dirname(self.database_path)
+        print(f'Adding {len(new_names)} new images to the existing reconstruction')
+
+        image_list_path = osp.join(colmap_dir, 'new_images.txt')
+        with open(image_list_path, 'w') as f:
+            f.write('\n'.join(new_names) + '\n')
+
+        with self._profiler.stage('extract', images=len(new_names)):
+            report_progress('extract', message=f'{len(new_names)} new images')
+            self._extract_features(image_dir, new_names)
+
+        with self._profiler.stage('match', images=len(new_names)):
+            report_progress('match', message=f'{len(new_names)} new images')
+            self._match_features(image_dir, new_names)
+            self._profiler.count(verified_pairs=count_verified_pairs(self.database_path))
+
+        with self._profiler.stage('map', images=len(new_names)):
+            report_progress('map', message=f'{len(new_names)} new images')
+            model_dir = self.model_dir
+            registrator_options = self._mapper_options()
+            registrator_options['input_path'] = model_dir
+            registrator_options['output_path'] = model_dir
+            run_colmap('image_registrator', registrator_options)
+            run_colmap('bundle_adjuster', {
+                'input_path': model_dir,
+                'output_path': model_dir,
+            })
+
+    def _extract_features(self, image_dir, names):
+        ''' Add the images in names to the database together with their features
+
+        Images whose content was already extracted with the same settings, in this dataset or any other, get
+        their features imported from the feature store instead. The features of the other images are added to
+        the store once extracted.
+        '''
+        colmap_dir = osp.dirname(self.database_path)
+        missing, cached = list(names), []
+        if self._feature_store_dir is not None:
+            store = FeatureStore(self._feature_store_dir, extractor_key(self._extractor_settings()))
+            hashes = hash_images([osp.join(image_dir, name) for name in names], self.image_hashes_path)
+            in_store = {name: store.contains(hashes[name]) for name in names}
+            missing = [name for name in names if not in_store[name]]
+            cached = [name for name in names if in_store[name]]
+        self._profiler.count(extracted=len(missing), reused=len(cached))
+
+        if len(missing) > 0:
+            report_progress('extract', message=f'{len(missing)} images')
+            image_list_path = osp.join(colmap_dir, 'extract_images.txt')
+            with open(image_list_path, 'w') as f:
+                f.write('\n'.join(missing) + '\n')
+            extract_options = self._extract_options(image_dir)
+            extract_options['image_list_path'] = image_list_path
+            run_colmap('feature_extractor', extract_options)
+            if self._feature_store_dir is not None:
+                for name, (keypoints, descriptors) in read_features(self.database_path, missing).items():
+                    store.save(hashes[name], keypoints, descriptors)
+
+        if len(cached) > 0:
+            report_progress('extract', message=f'{len(cached)} images from the feature store')
+            import_dir = osp.join(colmap_dir, 'imported_features')
+            if osp.isdir(import_dir):
+                shutil.rmtree(import_dir)
+            os.makedirs(import_dir)
+            for name in cached:
+                write_feature_text(osp.join(import_dir, name + '.txt'), *store.load(hashes[name]))
+            image_list_path = osp.join(colmap_dir, 'import_images.txt')
+            with open(image_list_path, 'w') as f:
+                f.write('\n'.join(cached) + '\n')
+            run_colmap('feature_importer', self._import_options(image_dir, import_dir, image_list_path))
+            shutil.rmtree(import_dir)
+
+    def _match_features(self, image_dir, new_names=None):
+        ''' Match all the images, or only new_names against all the images '''
+        image_paths = self._list_images_in_folder(image_dir)
+        all_names = [osp.basename(path) for path in image_paths]
+        colmap_dir = osp.dirname(self.database_path)
+
+        # Explicit pair list, None to let the COLMAP matcher pick the pairs
+        pairs = None
+        matcher = self._matcher
+        use_vocab_tree = matcher == 'vocab_tree_matcher'
+        if matcher == 'auto':
+            plan = plan_matching(image_paths, VOCAB_PATH)
+            print(f'Matching plan: {" + ".join(plan.strategies)}, about {plan.estimated_pairs} pairs '
+                  f'for {len(image_paths)} images, as {plan.reason}')
+            report_progress('match', message=' + '.join(plan.strategies))
+            if plan.pairs is None:
+                matcher = 'exhaustive_matcher'
+            else:
+                pairs = plan.pairs
+                use_vocab_tree = plan.use_vocab_tree
+
+        if new_names is not None:
+            if pairs is not None:
+                new_set = set(new_names)
+                pairs = [pair for pair in pairs if pair[0] in new_set or pair[1] in new_set]
+            elif not use_vocab_tree:
+                pairs = self._incremental_match_pairs(new_names, all_names, matcher == 'sequential_matcher')
+
+        if pairs is not None:
+            self._profiler.count(pairs=len(pairs))
+            if len(pairs) > 0:
+                pairs_path = osp.join(colmap_dir, 'pairs.txt')
+                with open(pairs_path, 'w') as f:
+                    for name1, name2 in pairs:
+                        f.write(f'{name1} {name2}\n')
+                match_options = self._match_options()
+                match_options['match_list_path'] = pairs_path
+                match_options['match_type'] = 'pairs'
+                run_colmap('matches_importer', match_options)
+        elif not use_vocab_tree:
+            if matcher == 'exhaustive_matcher':
+                self._profiler.count(pairs=len(all_names) * (len(all_names) - 1) // 2)
+            run_colmap(matcher, self._match_options())
+
+        if use_vocab_tree:
+            match_options = self._match_options()
+            match_options['VocabTreeMatching.vocab_tree_path'] = VOCAB_PATH
+            if new_names is not None:
+                # Retrieves the neighbours of the listed images among all the images of the database
+                match_options['VocabTreeMatching.match_list_path'] = osp.join(colmap_dir, 'new_images.txt')
+            run_colmap('vocab_tree_matcher', match_options)
+
+    @staticmethod
+    def _incremental_match_pairs(new_names, all_names, sequential):
+        new_set = set(new_names)
+        pairs = set()
+        if sequential:
+            for i, name in enumerate(all_names):
+                if name not in new_set:
+                    continue
+                for other in all_names[max(0, i - SEQUENTIAL_OVERLAP):i + SEQUENTIAL_OVERLAP + 1]:
+                    if other != name:
+                        pairs.add(tuple(sorted((name, other))))
+        else:
+            for name in new_names:
+                for other in all_names:
+                    if other != name:
+                        pairs.add(tuple(sorted((name, other))))
+        return sorted(pairs)
+
+    def _estimate_cameras_on_process(self, recompute, incremental=False):
+        ''' Run _estimate_cameras in a worker process and map its result from shared memory
+
+        A cache that is already up to date is memory-mapped directly, there is nothing to offload in that case.
+        '''
+        if not recompute and self.is_cache_valid():
+            self._estimate_cameras(recompute)
+            return
+
+        worker = run_on_process(_estimate_cameras_worker)(
+            self._worker_kwargs(), self.data_path, recompute, incremental)
+        parent = current_future()
+        if parent is not None:
+            worker.add_progress_callback(parent.set_progress)
+        shared = worker.result()
+
+        arrays, blocks = attach_arrays(shared['arrays'])
+        reconstruction = {name: arrays[name] for name in CACHE_ARRAYS}
+        reconstruction['image_names'] = shared['image_names']
+        lod_levels = [
+            (voxel_size, arrays[f'lod{i + 1}_xyz'], arrays[f'lod{i + 1}_rgb'])
+            for i, voxel_size in enumerate(shared['lod_voxel_sizes'])
+        ]
+
+        self._set_reconstruction(reconstruction, lod_levels)
+        self._shared_blocks += blocks
+        self._last_profile = shared['profile']
+        # The worker cached the default masks, the active ones are read back from the cache
+        self._point_mask = self._combined_filter_mask()
+
+    def _worker_kwargs(self):
+        return {
+            'gpu_index': self._gpu_index,
+            'camera_model': self._camera_model,
+            'matcher': self._matcher,
+            'downsample_factor': self._downsample_factor,
+            'num_workers': self._num_workers,
+            'num_threads': self._num_threads,
+            'feature_store_dir': self._feature_store_dir,
+        }
+
+    def _share_reconstruction(self):
+        ''' Move the current result into shared memory, returning picklable descriptors for the other process '''
+        arrays = {
+            'xyz': self._points_xyz,
+            'rgb': self._points_rgb,
+            'errors': self._point_errors,
+            'track_offsets': self._tracks[0],
+            'track_images': self._tracks[1],
+            'rotations': self._cameras.rotations,
+            'translations': self._cameras.translations,
+            'intrinsics': self._cameras.intrinsics,
+        }
+        for i, (_, xyz, rgb) in enumerate(self._lod_levels):
+            arrays[f'lod{i + 1}_xyz'] = xyz
+            arrays[f'lod{i + 1}_rgb'] = rgb
 
-        ####### End of your code #####################
+        return {
+            'arrays': share_arrays(arrays),
+            'image_names': self.camera_names,
+            'lod_voxel_sizes': [voxel_size for voxel_size, _, _ in self._lod_levels],
+            'profile': self._last_profile,
+        }
 
-        self._pcd = pcd
-        self._cameras = colmap_cameras
+    def _set_reconstruction(self, reconstruction, lod_levels):
+        self._pcd = None
+        self._points_xyz = reconstruction['xyz']
+        self._points_rgb = reconstruction['rgb']
+        self._point_errors = reconstruction['errors']
+        self._tracks = (reconstruction['track_offsets'], reconstruction['track_images'])
+        self._spatial_index_future = None
+        self._dense_pcd = None
+        self._filter_masks = {}
+        self._point_mask = None
+        self._lod_levels = lod_levels
+        self._cameras = CameraTable.from_reconstruction(reconstruction)
         self.activate_camera_name = self.camera_names[0]
+        # Blocks of a previous result can only be closed once nothing references their arrays anymore
+        self._shared_blocks = release_blocks(self._shared_blocks)
+
+    def _reconstruction_fingerprint(self, model_dir=None):
+        model_dir = self.model_dir if model_dir is None else model_dir
+        model_files = find_model_files(model_dir)
+        if model_files is None:
+            raise FileNotFoundError(f'No COLMAP model found in {model_dir}')
+        paths = model_files + self._list_images_in_folder(self.image_dir)
+        if osp.isfile(self.preprocess_path):
+            paths.append(self.preprocess_path)
+        return compute_fingerprint(paths)
+
+    def _load_reconstruction(self):
+        ''' Load the sparse model, going through the binary cache whenever it is up to date
+
+        The cache is keyed on the sparse model files and the images, so it is rebuilt as soon as any of them change.
+        '''
+        model_dir = self.model_dir
+        fingerprint = self._reconstruction_fingerprint()
+        cache = ReconstructionCache(self.cache_dir)
+        if not cache.is_valid(fingerprint):
+            print('Building reconstruction cache:', cache.cache_dir)
+            with self._profiler.stage('read model'):
+                report_progress('read model', message=model_dir)
+                reconstruction = self._read_model(model_dir, self._preprocess_sizes())
+                cache.save(reconstruction, fingerprint)
+                self._profiler.count(
+                    images=len(reconstruction['image_names']), points=len(reconstruction['xyz']))
+
+        with self._profiler.stage('load cache'):
+            report_progress('load cache', message=cache.cache_dir)
+            reconstruction = cache.load()
+            self._profiler.count(images=len(reconstruction['image_names']), points=len(reconstruction['xyz']))
+        return reconstruction
+
+    def _preprocess_sizes(self):
+        # Original sizes of the images COLMAP ran on, None when there is no record of the preprocessing
+        if not osp.isfile(self.preprocess_path):
+            return None
+        with open(self.preprocess_path, 'r') as f:
+            return json.load(f)['sizes']
+
+    @staticmethod
+    def _read_model(model_dir, sizes):
+        reconstruction = read_sparse_model(model_dir)
+        if sizes is not None:
+            reconstruction['intrinsics'] = rescale_intrinsics(
+                reconstruction['intrinsics'], reconstruction['image_names'], sizes)
+        return reconstruction
+
+    @property
+    def sub_models(self):
+        ''' Sub-models loaded so far by load_sub_models, {name: SubModel} '''
+        return dict(self._sub_models)
+
+    def load_sub_models(self):
+        ''' Load every model besides the main one on a thread pool, returning a future of their names
+
+        The smallest models are loaded first, a progress event whose message is the model name is published as
+        each one is loaded. This does not wait for the main reconstruction, so both can be loaded at once.
+        '''
+        # Resolved now, so a later change of data_path cannot mix two datasets
+        model_dirs = self.sub_model_dirs
+        cache_dirs = [osp.join(self.sub_models_cache_dir, osp.basename(model_dir)) for model_dir in model_dirs]
+        fingerprints = [self._reconstruction_fingerprint(model_dir) for model_dir in model_dirs]
+        return run_on_thread(self._load_sub_models)(model_dirs, cache_dirs, fingerprints, self._preprocess_sizes())
+
+    def _load_sub_models(self, model_dirs, cache_dirs, fingerprints, sizes):
+        self._sub_models = loaded = {}
+        if len(model_dirs) == 0:
+            return []
+
+        with concurrent.futures.ThreadPoolExecutor(self._num_workers) as pool:
+            # Submitted smallest first, so they are also the first to be done
+            futures = [
+                pool.submit(self._load_sub_model, model_dir, cache_dir, fingerprint, sizes)
+                for model_dir, cache_dir, fingerprint in zip(model_dirs, cache_dirs, fingerprints)
+            ]
+            for i, future in enumerate(concurrent.futures.as_completed(futures)):
+                sub_model = future.result()
+                loaded[sub_model.name] = sub_model
+                report_progress('load sub-models', current=i + 1, total=len(futures), message=sub_model.name)
+        return list(loaded.keys())
+
+    def _load_sub_model(self, model_dir, cache_dir, fingerprint, sizes):
+        cache = ReconstructionCache(cache_dir)
+        if not cache.is_valid(fingerprint):
+            print('Building reconstruction cache:', cache_dir)
+            cache.save(self._read_model(model_dir, sizes), fingerprint)
+        reconstruction = cache.load()
+
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(np.asarray(reconstruction['xyz'], dtype=np.float64))
+        pcd.colors = o3d.utility.Vector3dVector(reconstruction['rgb'] / 255.0)
+        return SubModel(osp.basename(model_dir), pcd, CameraTable.from_reconstruction(reconstruction))
+
+    def _load_lod_pyramid(self, reconstruction):
+        cache = ReconstructionCache(self.cache_dir)
+        levels = cache.load_lod()
+        if levels is None:
+            print('Building level-of-detail pyramid:', cache.cache_dir)
+            with self._profiler.stage('build lod', points=len(reconstruction['xyz'])):
+                report_progress('build lod', total=len(reconstruction['xyz']))
+                cache.save_lod(build_lod_pyramid(reconstruction['xyz'], reconstruction['rgb']))
+                levels = cache.load_lod()
+                self._profiler.count(levels=len(levels))
+        return levels
 
     @staticmethod
     def _list_images_in_folder(directory):
@@ -163,24 +1072,146 @@ class ColmapAPI:
         return files
 
     def estimate_done(self):
-        return not self._thread.is_alive()
+        return self._future is not None and self._future.done()
 
-    def estimate_cameras(self, recompute=False):
-        self._thread = self._estimate_cameras(recompute)
+    def estimate_cameras(self, recompute=False, incremental=False):
+        ''' Start the estimation in the background
 
-    def extract_camera_parameters(self, camera_name):
-        intrinsics = o3d.camera.PinholeCameraIntrinsic(
-            self._cameras[camera_name]['intrinsic']['width'],
-            self._cameras[camera_name]['intrinsic']['height'],
-            self._cameras[camera_name]['intrinsic']['fx'],
-            self._cameras[camera_name]['intrinsic']['fy'],
-            self._cameras[camera_name]['intrinsic']['cx'],
-            self._cameras[camera_name]['intrinsic']['cy'],
-        )
+        Returns a utils.thread_utils.TaskFuture that completes once the points and cameras are available and
+        reports the progress of every stage. With incremental, a recompute only processes the images that are
+        not in the existing database yet and registers them into the existing model.
+        '''
+        if self._execution_mode == 'process':
+            self._future = run_on_thread(self._estimate_cameras_on_process)(recompute, incremental)
+        else:
+            self._future = run_on_thread(self._estimate_cameras)(recompute, incremental)
+        return self._future
 
-        extrinsics = np.eye(4)
-        extrinsics[:3, :3] = self._cameras[camera_name]['extrinsic'][0]
-        extrinsics[:3, 3] = self._cameras[camera_name]['extrinsic'][1]
-        extrinsics = extrinsics
+    def estimate_dense(self, max_size=DEFAULT_DENSE_MAX_SIZE, num_depths=DEFAULT_NUM_DEPTHS,
+                       num_sources=DEFAULT_NUM_SOURCES, tile_size=DEFAULT_TILE_SIZE):
+        ''' Start the dense stage in the background, once the cameras are estimated
 
+        Computes a depth map per image on a pool of num_workers processes and fuses them into a dense point
+        cloud. Returns a utils.thread_utils.TaskFuture whose result is the fused open3d.geometry.PointCloud.
+        '''
+        if self._cameras is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+        return run_on_thread(self._estimate_dense)(max_size, num_depths, num_sources, tile_size)
+
+    def _estimate_dense(self, max_size, num_depths, num_sources, tile_size):
+        ''' Multi-view stereo on the CPU, resuming from the depth maps of an interrupted run
+
+        Depth maps are kept in self.dense_dir as long as the reconstruction and the parameters are the same.
+        The tile size only changes how the work is split, so it does not invalidate them.
+        '''
+        profiler = StageProfiler('estimate_dense', on_record=self._on_stage_record)
+        parameters = {
+            'version': DENSE_VERSION,
+            'fingerprint': self._reconstruction_fingerprint(),
+            'max_size': max_size,
+            'num_depths': num_depths,
+            'num_sources': num_sources,
+        }
+        profiler.metadata.update(parameters, tile_size=tile_size, num_workers=self._num_workers)
+
+        manifest_path = osp.join(self.dense_dir, 'dense.json')
+        manifest = None
+        if osp.isfile(manifest_path):
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        if manifest != parameters:
+            if osp.isdir(self.dense_dir):
+                print('Dropping stale depth maps:', self.dense_dir)
+                shutil.rmtree(self.dense_dir)
+            os.makedirs(self.dense_dir)
+            with open(manifest_path, 'w') as f:
+                json.dump(parameters, f)
+
+        depth_dir = osp.join(self.dense_dir, 'depth_maps')
+        with profiler.stage('select views'):
+            track_offsets, track_images = self._tracks
+            views = make_views(
+                self._cameras, self.image_dir, self._points_xyz, track_offsets, track_images, max_size, num_sources)
+            profiler.count(views=len(views))
+
+        # The fused cloud is only out of date when depth maps are added, its manifest is removed before so a run
+        # interrupted in between fuses them again
+        fusion_path = osp.join(self.dense_dir, 'fusion.json')
+        if osp.isfile(fusion_path) and not all(osp.isfile(depth_map_path(depth_dir, view.name)) for view in views):
+            os.remove(fusion_path)
+
+        with profiler.stage('dense depth', views=len(views)):
+            computed = compute_depth_maps(views, depth_dir, num_depths, tile_size, self._num_workers)
+            profiler.count(computed=computed)
+
+        if not osp.isfile(fusion_path):
+            with profiler.stage('dense fusion', views=len(views)):
+                bounds = self.bounds
+                margin = 0.05 * np.linalg.norm(bounds.get_extent())
+                xyz, rgb = fuse_depth_maps(
+                    views, depth_dir, bounds.min_bound - margin, bounds.max_bound + margin)
+                pcd = o3d.geometry.PointCloud()
+                pcd.points = o3d.utility.Vector3dVector(xyz.astype(np.float64))
+                pcd.colors = o3d.utility.Vector3dVector(rgb / 255.0)
+                # open3d cannot write an empty cloud, the manifest alone records that fusion found no point
+                if osp.isfile(self.dense_path):
+                    os.remove(self.dense_path)
+                if len(xyz) > 0 and not o3d.io.write_point_cloud(self.dense_path, pcd):
+                    raise RuntimeError(f'Could not write {self.dense_path}')
+                with open(fusion_path, 'w') as f:
+                    json.dump({'points': len(xyz)}, f)
+                profiler.count(points=len(xyz))
+        elif osp.isfile(self.dense_path):
+            pcd = o3d.io.read_point_cloud(self.dense_path)
+        else:
+            pcd = o3d.geometry.PointCloud()
+
+        self._dense_pcd = pcd
+        profiler.append_to(self.trace_path)
+        return pcd
+
+    def iter_point_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE, level=0):
+        ''' Yield the point cloud of a level of detail as a sequence of small open3d point clouds
+
+        Only one chunk is converted at a time, so the memory used on top of the memory-mapped arrays is
+        bounded by chunk_size instead of the size of the cloud.
+        '''
+        if self._points_xyz is None:
+            raise ValueError(f'COLMAP has not estimated the camera yet')
+
+        mask = None
+        if level == 0:
+            xyz, rgb, mask = self._points_xyz, self._points_rgb, self._point_mask
+        else:
+            _, xyz, rgb = self._lod_levels[level - 1]
+
+        for start in range(0, len(xyz), chunk_size):
+            chunk_xyz = xyz[start:start + chunk_size]
+            chunk_rgb = rgb[start:start + chunk_size]
+            if mask is not None:
+                # Filtered chunk by chunk, so the filtered cloud is never copied as a whole
+                keep = mask[start:start + chunk_size]
+                chunk_xyz, chunk_rgb = chunk_xyz[keep], chunk_rgb[keep]
+            chunk = o3d.geometry.PointCloud()
+            chunk.points = o3d.utility.Vector3dVector(chunk_xyz.astype(np.float64))
+            chunk.colors = o3d.utility.Vector3dVector(chunk_rgb / 255.0)
+            yield chunk
+
+    def stacked_camera_parameters(self):
+        ''' Intrinsics (N, 6), rotations (N, 3, 3) and translations (N, 3) of all cameras, in camera_names order '''
+        cameras = self.cameras
+        return cameras.intrinsics, cameras.rotations, cameras.translations
+
+    def extract_camera_parameters(self, camera_name):
+        cameras = self.cameras
+        intrinsics = cameras.pinhole_intrinsic(camera_name)
+        extrinsics = cameras.extrinsic_matrices()[cameras.index(camera_name)].copy()
         return intrinsics, extrinsics
+
+
+def _estimate_cameras_worker(api_kwargs, data_path, recompute, incremental):
+    ''' Entry point of the worker process used by the 'process' execution mode '''
+    api = ColmapAPI(**api_kwargs)
+    api.data_path = data_path
+    api._estimate_cameras(recompute, incremental)
+    return api._share_reconstruction()
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import numpy as np
+import os
+import os.path as osp
+import shutil
+
+
+CACHE_VERSION = 3
+
+# Array name: dtype stored on disk
+CACHE_ARRAYS = {
+    'xyz': np.float32,
+    'rgb': np.uint8,
+    'errors': np.float32,
+    'track_offsets': np.int64,
+    'track_images': np.int32,
+    'rotations': np.float64,
+    'translations': np.float64,
+    'intrinsics': np.float64,
+}
+
+MANIFEST_NAME = 'manifest.json'
+LOD_MANIFEST_NAME = 'lod.json'
+# Point filter masks, see modules.colmap.point_filters
+MASK_DIR_NAME = 'masks'
+
+
+def compute_fingerprint(paths):
+    ''' Hash the path, size and modification time of every file in paths '''
+    h = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        h.update(f'{osp.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode('utf-8'))
+    return h.hexdigest()
+
+
+class ReconstructionCache:
+    ''' Versioned binary cache of a reconstruction
+
+    Every array is stored as a separate .npy file so that it can be memory-mapped without any copy.
+    The manifest is written last, so a cache that was interrupted while saving is never considered valid.
+    '''
+    def __init__(self, cache_dir):
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def manifest_path(self):
+        return osp.join(self._cache_dir, MANIFEST_NAME)
+
+    def read_manifest(self):
+        if not osp.isfile(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, fingerprint):
+        manifest = self.read_manifest()
+        if manifest is None:
+            return False
+        if manifest.get('version') != CACHE_VERSION or manifest.get('fingerprint') != fingerprint:
+            return False
+        return all(osp.isfile(osp.join(self._cache_dir, name + '.npy')) for name in manifest['arrays'])
+
+    def load(self):
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f'No reconstruction cache in {self._cache_dir}')
+
+        reconstruction = {'image_names': manifest['image_names']}
+        for name in manifest['arrays']:
+            reconstruction[name] = np.load(osp.join(self._cache_dir, name + '.npy'), mmap_mode='r')
+        return reconstruction
+
+    def save(self, reconstruction, fingerprint):
+        tmp_dir = self._cache_dir + '.tmp'
+        if osp.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        for name, dtype in CACHE_ARRAYS.items():
+            array = np.ascontiguousarray(reconstruction[name], dtype=dtype)
+            np.save(osp.join(tmp_dir, name + '.npy'), array)
+
+        manifest = {
+            'version': CACHE_VERSION,
+            'fingerprint': fingerprint,
+            'arrays': list(CACHE_ARRAYS.keys()),
+            'image_names': list(reconstruction['image_names']),
+        }
+        with open(osp.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+
+        if osp.isdir(self._cache_dir):
+            shutil.rmtree(self._cache_dir)
+        os.replace(tmp_dir, self._cache_dir)
+
+    def load_lod(self):
+        ''' Load the cached level-of-detail pyramid as a list of (voxel_size, xyz, rgb), or None if it is stale '''
+        manifest = self.read_manifest()
+        lod_path = osp.join(self._cache_dir, LOD_MANIFEST_NAME)
+        if manifest is None or not osp.isfile(lod_path):
+            return None
+        try:
+            with open(lod_path, 'r') as f:
+                lod_manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if lod_manifest.get('version') != CACHE_VERSION or lod_manifest.get('fingerprint') != manifest['fingerprint']:
+            return None
+
+        levels = []
+        for i, voxel_size in enumerate(lod_manifest['voxel_sizes']):
+            xyz_path = osp.join(self._cache_dir, f'lod{i + 1}_xyz.npy')
+            rgb_path = osp.join(self._cache_dir, f'lod{i + 1}_rgb.npy')
+            if not osp.isfile(xyz_path) or not osp.isfile(rgb_path):
+                return None
+            levels.append((voxel_size, np.load(xyz_path, mmap_mode='r'), np.load(rgb_path, mmap_mode='r')))
+        return levels
+
+    def save_lod(self, levels):
+        ''' Save the coarse levels of a pyramid given as a list of (voxel_size, xyz, rgb) '''
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f'No reconstruction cache in {self._cache_dir}')
+
+        for i, (_, xyz, rgb) in enumerate(levels):
+            np.save(osp.join(self._cache_dir, f'lod{i + 1}_xyz.npy'), np.ascontiguousarray(xyz, dtype=np.float32))
+            np.save(osp.join(self._cache_dir, f'lod{i + 1}_rgb.npy'), np.ascontiguousarray(rgb, dtype=np.uint8))
+
+        lod_manifest = {
+            'version': CACHE_VERSION,
+            'fingerprint': manifest['fingerprint'],
+            'voxel_sizes': [float(voxel_size) for voxel_size, _, _ in levels],
+        }
+        with open(osp.join(self._cache_dir, LOD_MANIFEST_NAME), 'w') as f:
+            json.dump(lod_manifest, f)
+
+    def mask_path(self, key):
+        return osp.join(self._cache_dir, MASK_DIR_NAME, key + '.npy')
+
+    def load_mask(self, key):
+        ''' Load a cached point filter mask, memory-mapped, or None if it was never saved for this reconstruction '''
+        if self.read_manifest() is None or not osp.isfile(self.mask_path(key)):
+            return None
+        return np.load(self.mask_path(key), mmap_mode='r')
+
+    def save_mask(self, key, mask):
+        ''' Save a point filter mask, it is dropped together with the cache when the reconstruction changes '''
+        if self.read_manifest() is None:
+            raise FileNotFoundError(f'No reconstruction cache in {self._cache_dir}')
+        os.makedirs(osp.dirname(self.mask_path(key)), exist_ok=True)
+        # Written under another name first, so a mask that was interrupted while saving is never loaded
+        tmp_path = self.mask_path(key) + '.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(mask, dtype=bool))
+        os.replace(tmp_path, self.mask_path(key))
@@ -0,0 +1,115 @@
+import numpy as np
+import open3d as o3d
+
+from utils.pose_utils import invert_poses
+
+
+class CameraTable:
+    ''' The cameras of a reconstruction as contiguous arrays
+
+    Camera i is described by intrinsics[i] = [width, height, fx, fy, cx, cy] and the world-to-camera
+    rotations[i] (3, 3) and translations[i] (3,). The arrays are kept as given, so memory-mapped or shared
+    memory arrays are never copied. Batched accessors take an array of indices, None meaning all cameras.
+    '''
+    def __init__(self, names, intrinsics, rotations, translations):
+        self._names = list(names)
+        self._index = {name: i for i, name in enumerate(self._names)}
+        self._intrinsics = intrinsics
+        self._rotations = rotations
+        self._translations = translations
+        # Built on first use, they do not change afterwards
+        self._extrinsic_matrices = None
+        self._pinhole_intrinsics = {}
+
+    @classmethod
+    def from_reconstruction(cls, reconstruction):
+        ''' Table of a reconstruction dictionary as returned by modules.colmap.reader.read_sparse_model '''
+        return cls(
+            reconstruction['image_names'],
+            reconstruction['intrinsics'],
+            reconstruction['rotations'],
+            reconstruction['translations'],
+        )
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    @property
+    def intrinsics(self):
+        return self._intrinsics
+
+    @property
+    def rotations(self):
+        return self._rotations
+
+    @property
+    def translations(self):
+        return self._translations
+
+    def index(self, name):
+        return self._index[name]
+
+    def indices(self, names):
+        return np.array([self._index[name] for name in names], dtype=np.int64)
+
+    def extrinsic_matrices(self, indices=None):
+        ''' World-to-camera 4x4 matrices (N, 4, 4) '''
+        if self._extrinsic_matrices is None:
+            matrices = np.zeros((len(self), 4, 4), dtype=np.float64)
+            matrices[:, :3, :3] = self._rotations
+            matrices[:, :3, 3] = self._translations
+            matrices[:, 3, 3] = 1
+            self._extrinsic_matrices = matrices
+        if indices is None:
+            return self._extrinsic_matrices
+        return self._extrinsic_matrices[indices]
+
+    def intrinsic_matrices(self, indices=None):
+        ''' Calibration matrices K (N, 3, 3) '''
+        intrinsics = self._intrinsics if indices is None else self._intrinsics[indices]
+        matrices = np.zeros((len(intrinsics), 3, 3), dtype=np.float64)
+        matrices[:, 0, 0] = intrinsics[:, 2]
+        matrices[:, 1, 1] = intrinsics[:, 3]
+        matrices[:, 0, 2] = intrinsics[:, 4]
+        matrices[:, 1, 2] = intrinsics[:, 5]
+        matrices[:, 2, 2] = 1
+        return matrices
+
+    def centers(self, indices=None):
+        ''' Camera centers in world coordinates (N, 3) '''
+        rotations = self._rotations if indices is None else self._rotations[indices]
+        translations = self._translations if indices is None else self._translations[indices]
+        return invert_poses(rotations, translations)[1]
+
+    def pinhole_intrinsic(self, name):
+        ''' open3d.camera.PinholeCameraIntrinsic of a camera, created once per camera '''
+        intrinsic = self._pinhole_intrinsics.get(name)
+        if intrinsic is None:
+            width, height, fx, fy, cx, cy = self._intrinsics[self._index[name]]
+            intrinsic = o3d.camera.PinholeCameraIntrinsic(
+                int(width), int(height), float(fx), float(fy), float(cx), float(cy))
+            self._pinhole_intrinsics[name] = intrinsic
+        return intrinsic
+
+    def camera_dict(self, name):
+        ''' A camera in the dictionary format described in ColmapAPI._estimate_cameras, as views of the arrays '''
+        i = self._index[name]
+        width, height, fx, fy, cx, cy = self._intrinsics[i]
+        return {
+            'extrinsic': [self._rotations[i], self._translations[i]],
+            'intrinsic': {
+                'width': int(width),
+                'height': int(height),
+                'fx': float(fx),
+                'fy': float(fy),
+                'cx': float(cx),
+                'cy': float(cy),
+            }
+        }
@@ -0,0 +1,21 @@
+import subprocess
+
+
+COLMAP_EXECUTABLE = 'colmap'
+
+
+def run_colmap(command, options):
+    ''' Run a COLMAP command line tool, options being a dict of {'Section.option': value} '''
+    args = [COLMAP_EXECUTABLE, command]
+    for key, value in options.items():
+        if isinstance(value, bool):
+            value = int(value)
+        args += ['--' + key, str(value)]
+
+    print('Running:', ' '.join(args))
+    try:
+        subprocess.run(args, check=True)
+    except FileNotFoundError:
+        raise RuntimeError(f'Could not find the COLMAP executable "{COLMAP_EXECUTABLE}", is it installed and in PATH?')
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f'COLMAP {command} failed with exit code {e.returncode}')
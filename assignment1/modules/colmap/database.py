@@ -0,0 +1,50 @@
+import contextlib
+import numpy as np
+import sqlite3
+
+
+def read_image_names(database_path):
+    ''' Names of the images registered in a COLMAP database, mapped to their image_id '''
+    with contextlib.closing(sqlite3.connect(database_path)) as db:
+        return {name: image_id for image_id, name in db.execute('SELECT image_id, name FROM images')}
+
+
+def count_verified_pairs(database_path):
+    ''' Number of image pairs with geometrically verified matches, 0 before any matching '''
+    with contextlib.closing(sqlite3.connect(database_path)) as db:
+        tables = {name for name, in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if 'two_view_geometries' not in tables:
+            return 0
+        return db.execute('SELECT COUNT(*) FROM two_view_geometries WHERE rows > 0').fetchone()[0]
+
+
+def clear_matches(database_path):
+    ''' Remove all the matches and verified pairs, keeping the images and their features '''
+    with contextlib.closing(sqlite3.connect(database_path)) as db:
+        tables = {name for name, in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        for table in ('matches', 'two_view_geometries'):
+            if table in tables:
+                db.execute(f'DELETE FROM {table}')
+        db.commit()
+
+
+def read_features(database_path, names):
+    ''' Keypoints and descriptors of the images in names, as {name: (keypoints, descriptors)}
+
+    Keypoints are (N, C) float32 and descriptors (N, D) uint8 arrays, as COLMAP stores them.
+    '''
+    features = {}
+    with contextlib.closing(sqlite3.connect(database_path)) as db:
+        image_ids = {name: image_id for image_id, name in db.execute('SELECT image_id, name FROM images')}
+        for name in names:
+            image_id = image_ids[name]
+            rows, cols, data = db.execute(
+                'SELECT rows, cols, data FROM keypoints WHERE image_id = ?', (image_id,)).fetchone()
+            keypoints = np.frombuffer(data, dtype=np.float32).reshape(rows, cols) if rows > 0 else \
+                np.zeros((0, cols), dtype=np.float32)
+            rows, cols, data = db.execute(
+                'SELECT rows, cols, data FROM descriptors WHERE image_id = ?', (image_id,)).fetchone()
+            descriptors = np.frombuffer(data, dtype=np.uint8).reshape(rows, cols) if rows > 0 else \
+                np.zeros((0, cols), dtype=np.uint8)
+            features[name] = (keypoints, descriptors)
+    return features
@@ -0,0 +1,413 @@
+import collections
+import concurrent.futures
+import multiprocessing
+import numpy as np
+import open3d as o3d
+import os
+import os.path as osp
+
+from utils.pose_utils import invert_poses
+from utils.thread_utils import report_progress
+
+
+# Longest side of the images the depth maps are computed at, larger images are downsampled first
+DEFAULT_DENSE_MAX_SIZE = 640
+# Depth hypotheses tested per pixel, uniform in inverse depth between the near and far planes of the view
+DEFAULT_NUM_DEPTHS = 64
+# Source images compared to every reference image, picked by the number of sparse points they share
+DEFAULT_NUM_SOURCES = 4
+# Side of the square tiles the reference images are split into, every tile is a job of the worker pool
+DEFAULT_TILE_SIZE = 128
+# Side of the window the normalized cross-correlation is computed over
+NCC_WINDOW = 7
+# Pixels whose best matching score is lower are left out of the fused cloud
+MIN_CONFIDENCE = 0.6
+# Fused points must be seen by at least this many depth maps
+MIN_FUSED_VIEWS = 2
+
+DENSE_VERSION = 2
+
+# A reference image to compute a depth map for. intrinsic is [fx, fy, cx, cy] at the dense size (width,
+# height), rotation and translation map world to camera, and sources lists the paths, intrinsics, rotations
+# and translations of its source images in the same way
+DenseView = collections.namedtuple('DenseView', [
+    'name', 'path', 'width', 'height', 'intrinsic', 'rotation', 'translation', 'near', 'far', 'sources'])
+
+
+def load_image(path, width, height):
+    ''' An image resized to width x height, as float32 gray levels (H, W) and uint8 colors (H, W, 3) '''
+    image = o3d.t.io.read_image(path)
+    if image.is_empty():
+        raise OSError(f'Could not read {path}')
+    if image.columns != width or image.rows != height:
+        image = image.resize(width / image.columns, o3d.t.geometry.InterpType.Super)
+    rgb = image.as_tensor().numpy()
+    if rgb.ndim == 2 or rgb.shape[2] == 1:
+        rgb = np.repeat(rgb.reshape(rgb.shape[0], rgb.shape[1], 1), 3, axis=2)
+    if rgb.dtype == np.uint16:
+        rgb = (rgb // 257).astype(np.uint8)
+    rgb = np.ascontiguousarray(rgb[:height, :width, :3])
+    gray = rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return gray, rgb
+
+
+def dense_size(intrinsic, max_size):
+    ''' Size of the depth map of a camera with intrinsics [width, height, fx, fy, cx, cy], and its scale '''
+    width, height = intrinsic[:2]
+    scale = min(1.0, max_size / max(width, height))
+    return int(round(width * scale)), int(round(height * scale)), scale
+
+
+def select_sources(track_offsets, track_images, num_images, num_sources, max_pairs=1 << 22):
+    ''' For every image, the indices of the num_sources images sharing the most sparse points with it
+
+    The image pairs of every track are counted a chunk of tracks at a time, at most max_pairs pairs per chunk,
+    and only the pairs that share points are kept, so memory does not grow with the square of the images.
+    '''
+    track_offsets = np.asarray(track_offsets, dtype=np.int64)
+    track_images = np.asarray(track_images, dtype=np.int64)
+    lengths = np.diff(track_offsets)
+    # Every track of length L gives L * L ordered pairs, those of an image with itself being dropped below
+    ends = np.cumsum(lengths ** 2)
+    pairs = np.zeros(0, dtype=np.int64)
+    counts = np.zeros(0, dtype=np.int64)
+
+    start = 0
+    while start < len(lengths):
+        done = ends[start - 1] if start > 0 else 0
+        end = max(start + 1, int(np.searchsorted(ends, done + max_pairs, side='right')))
+        chunk_lengths = lengths[start:end]
+        images = track_images[track_offsets[start]:track_offsets[end]]
+        # For every observation, its image paired with every image of the same track
+        element_lengths = np.repeat(chunk_lengths, chunk_lengths)
+        element_starts = np.repeat(track_offsets[start:end] - track_offsets[start], chunk_lengths)
+        firsts = np.repeat(images, element_lengths)
+        group_starts = np.repeat(np.cumsum(element_lengths) - element_lengths, element_lengths)
+        seconds = images[np.repeat(element_starts, element_lengths) + np.arange(len(firsts)) - group_starts]
+        keep = firsts != seconds
+
+        chunk_pairs, chunk_counts = np.unique(firsts[keep] * num_images + seconds[keep], return_counts=True)
+        pairs, inverse = np.unique(np.concatenate([pairs, chunk_pairs]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts, chunk_counts]), minlength=len(pairs))
+        counts = counts.astype(np.int64)
+        start = end
+
+    rows, cols = pairs // num_images, pairs % num_images
+    # By image, then most shared points first, then lowest index
+    order = np.lexsort((cols, -counts, rows))
+    rows, cols = rows[order], cols[order]
+    row_starts = np.searchsorted(rows, np.arange(num_images + 1))
+    return [cols[row_starts[i]:min(row_starts[i + 1], row_starts[i] + num_sources)] for i in range(num_images)]
+
+
+def depth_ranges(xyz, track_offsets, track_images, rotations, translations):
+    ''' Near and far depths (N, 2) of every camera from the sparse points it observes, 0 when it observes none '''
+    lengths = np.diff(track_offsets)
+    points = np.repeat(np.arange(len(lengths)), lengths)
+    images = np.asarray(track_images)
+    depths = np.einsum('ij,ij->i', rotations[images, 2], np.asarray(xyz, dtype=np.float64)[points]) + \
+        translations[images, 2]
+
+    ranges = np.zeros((len(rotations), 2), dtype=np.float64)
+    order = np.argsort(images, kind='stable')
+    bounds = np.searchsorted(images[order], np.arange(len(rotations) + 1))
+    for i in range(len(rotations)):
+        view_depths = depths[order[bounds[i]:bounds[i + 1]]]
+        view_depths = view_depths[view_depths > 0]
+        if len(view_depths) > 0:
+            near, far = np.percentile(view_depths, [2, 98])
+            # Margin for the surfaces that are not covered by sparse points
+            ranges[i] = [0.8 * near, 1.25 * far]
+    return ranges
+
+
+def make_views(cameras, image_dir, xyz, track_offsets, track_images, max_size, num_sources):
+    ''' The DenseView of every camera of a CameraTable that observes sparse points and has source images '''
+    sources = select_sources(track_offsets, track_images, len(cameras), num_sources)
+    ranges = depth_ranges(xyz, track_offsets, track_images, cameras.rotations, cameras.translations)
+
+    def camera(i):
+        width, height, _ = dense_size(cameras.intrinsics[i], max_size)
+        fx, fy, cx, cy = cameras.intrinsics[i, 2:]
+        # Scale of every axis after rounding the size, the pixel centers stay at half-integer coordinates
+        sx, sy = width / cameras.intrinsics[i, 0], height / cameras.intrinsics[i, 1]
+        intrinsic = np.array([fx * sx, fy * sy, cx * sx, cy * sy])
+        return (osp.join(image_dir, cameras.names[i]), width, height, intrinsic,
+                np.asarray(cameras.rotations[i], dtype=np.float64),
+                np.asarray(cameras.translations[i], dtype=np.float64))
+
+    views = []
+    for i, name in enumerate(cameras.names):
+        if len(sources[i]) == 0 or ranges[i, 1] <= 0:
+            continue
+        path, width, height, intrinsic, rotation, translation = camera(i)
+        views.append(DenseView(
+            name, path, width, height, intrinsic, rotation, translation, ranges[i, 0], ranges[i, 1],
+            [camera(j) for j in sources[i]]))
+    return views
+
+
+def depth_map_path(depth_dir, name):
+    # The extension is kept, so a.jpg and a.png get their own depth maps
+    return osp.join(depth_dir, name + '.npy')
+
+
+def compute_depth_maps(views, depth_dir, num_depths=DEFAULT_NUM_DEPTHS, tile_size=DEFAULT_TILE_SIZE,
+                       num_workers=None):
+    ''' Compute the depth map of every view by plane sweeping, tile by tile on a process pool
+
+    Every depth map is written to depth_dir as soon as all its tiles are done, as a (2, H, W) float32 array of
+    depths and matching scores. Views whose depth map already exists are skipped, so an interrupted run resumes
+    where it stopped. Returns the number of depth maps computed by this call.
+    '''
+    os.makedirs(depth_dir, exist_ok=True)
+    todo = [view for view in views if not osp.isfile(depth_map_path(depth_dir, view.name))]
+    if len(todo) == 0:
+        return 0
+    print(f'Computing {len(todo)} depth maps into {depth_dir}')
+
+    jobs = []
+    for i, view in enumerate(todo):
+        for y in range(0, view.height, tile_size):
+            for x in range(0, view.width, tile_size):
+                jobs.append((i, (x, y, min(x + tile_size, view.width), min(y + tile_size, view.height))))
+
+    index = {view.name: i for i, view in enumerate(todo)}
+    maps = {}
+    remaining = collections.Counter(i for i, _ in jobs)
+    done = 0
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=context) as pool:
+        # Jobs are submitted in view order and only a few ahead of the running ones, so at most a few views
+        # are being assembled at any time
+        max_in_flight = 2 * (num_workers or os.cpu_count() or 1)
+        pending = set()
+        jobs = iter(jobs)
+        while True:
+            for i, rect in jobs:
+                view = todo[i]
+                pending.add(pool.submit(sweep_tile, view, rect, num_depths))
+                if len(pending) >= max_in_flight:
+                    break
+            if len(pending) == 0:
+                break
+
+            finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name, (x0, y0, x1, y1), depth, score = future.result()
+                i = index[name]
+                if i not in maps:
+                    maps[i] = np.zeros((2, todo[i].height, todo[i].width), dtype=np.float32)
+                maps[i][0, y0:y1, x0:x1] = depth
+                maps[i][1, y0:y1, x0:x1] = score
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    _save_depth_map(depth_map_path(depth_dir, name), maps.pop(i))
+                    done += 1
+                    report_progress('dense depth', done, len(todo), message=name)
+    return done
+
+
+def _save_depth_map(path, depth_map):
+    # Written under another name first, so a depth map that was interrupted while saving is never used
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, depth_map)
+    os.replace(tmp_path, path)
+
+
+# Images loaded by this worker process, the tiles of a view share their reference and source images
+_image_cache = collections.OrderedDict()
+_IMAGE_CACHE_SIZE = 8
+
+
+def _cached_gray(path, width, height):
+    key = (path, width, height)
+    if key in _image_cache:
+        _image_cache.move_to_end(key)
+    else:
+        _image_cache[key] = load_image(path, width, height)[0]
+        if len(_image_cache) > _IMAGE_CACHE_SIZE:
+            _image_cache.popitem(last=False)
+    return _image_cache[key]
+
+
+def _window_sums(images, radius):
+    ''' Sums over the (2 radius + 1)^2 window around every pixel of images (..., H, W), from integral images '''
+    size = 2 * radius + 1
+    height, width = images.shape[-2:]
+    integral = np.zeros(images.shape[:-2] + (height + size, width + size), dtype=np.float64)
+    integral[..., radius + 1:radius + 1 + height, radius + 1:radius + 1 + width] = images
+    np.cumsum(integral, axis=-2, out=integral)
+    np.cumsum(integral, axis=-1, out=integral)
+    return integral[..., size:, size:] - integral[..., :-size, size:] - integral[..., size:, :-size] + \
+        integral[..., :-size, :-size]
+
+
+def _bilinear(image, u, v):
+    ''' Sample image at pixel coordinates (u, v), NaN outside of it '''
+    height, width = image.shape
+    inside = (u >= 0) & (v >= 0) & (u <= width - 1) & (v <= height - 1)
+    u = np.clip(u, 0, width - 1)
+    v = np.clip(v, 0, height - 1)
+    u0 = np.minimum(np.floor(u).astype(np.int64), width - 2)
+    v0 = np.minimum(np.floor(v).astype(np.int64), height - 2)
+    du, dv = u - u0, v - v0
+    values = (image[v0, u0] * (1 - du) * (1 - dv) + image[v0, u0 + 1] * du * (1 - dv) +
+              image[v0 + 1, u0] * (1 - du) * dv + image[v0 + 1, u0 + 1] * du * dv)
+    return np.where(inside, values, np.nan)
+
+
+def sweep_tile(view, rect, num_depths):
+    ''' Best depth and normalized cross-correlation of every pixel of a tile of a view
+
+    Runs in the worker processes of compute_depth_maps. Every depth hypothesis is scored by the mean of the two
+    best correlations over the source images, so a pixel occluded in some of them can still be matched.
+    Returns the view name, rect, and the depth and score arrays of the tile.
+    '''
+    x0, y0, x1, y1 = rect
+    radius = NCC_WINDOW // 2
+    # The tile grows by the window radius, so the windows of its border pixels are complete
+    px0, py0 = max(x0 - radius, 0), max(y0 - radius, 0)
+    px1, py1 = min(x1 + radius, view.width), min(y1 + radius, view.height)
+
+    reference = _cached_gray(view.path, view.width, view.height)[py0:py1, px0:px1].astype(np.float64)
+    # Windows are cut at the image borders, every sum is divided by the number of pixels of its window
+    window_sizes = _window_sums(np.ones_like(reference), radius)
+    ref_mean, ref_square_mean = _window_sums(np.stack([reference, reference * reference]), radius) / window_sizes
+    ref_var = np.maximum(ref_square_mean - ref_mean * ref_mean, 0)
+
+    # Rays of the tile pixels in world coordinates, from the camera center
+    fx, fy, cx, cy = view.intrinsic
+    xs, ys = np.meshgrid(np.arange(px0, px1) + 0.5, np.arange(py0, py1) + 0.5)
+    rays = np.stack([(xs - cx) / fx, (ys - cy) / fy, np.ones_like(xs)], axis=-1)
+    rotation_inv, center = invert_poses(view.rotation, view.translation)
+    rays = rays @ rotation_inv.T
+
+    sources = []
+    for path, width, height, intrinsic, rotation, translation in view.sources:
+        # A point at depth d projects to d * direction + offset in the source camera
+        sources.append((_cached_gray(path, width, height).astype(np.float64), intrinsic,
+                        rays @ rotation.T, rotation @ center + translation))
+
+    inverse_depths = np.linspace(1 / view.near, 1 / view.far, num_depths)
+    best_depth = np.zeros(reference.shape, dtype=np.float64)
+    best_score = np.full(reference.shape, -np.inf, dtype=np.float64)
+    # Warped source image, its square, its product with the reference and its invalid pixels, for every source
+    stack = np.empty((len(sources), 4) + reference.shape, dtype=np.float64)
+    for inverse_depth in inverse_depths:
+        depth = 1 / inverse_depth
+        for i, (image, (sfx, sfy, scx, scy), direction, offset) in enumerate(sources):
+            points = depth * direction + offset
+            z = points[..., 2]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                u = np.where(z > 0, sfx * points[..., 0] / z + scx - 0.5, -1)
+                v = np.where(z > 0, sfy * points[..., 1] / z + scy - 0.5, -1)
+            warped = _bilinear(image, u, v)
+            invalid = np.isnan(warped)
+            warped[invalid] = 0
+            stack[i, 0] = warped
+            stack[i, 1] = warped * warped
+            stack[i, 2] = reference * warped
+            stack[i, 3] = invalid
+
+        sums = _window_sums(stack, radius)
+        mean, square_mean, product_mean = sums[:, :3].transpose(1, 0, 2, 3) / window_sizes
+        var = np.maximum(square_mean - mean * mean, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ncc = (product_mean - ref_mean * mean) / np.sqrt(ref_var * var)
+        # Windows that leave the source image or have no texture do not count
+        ncc = np.where((sums[:, 3] < 0.5) & (ref_var * var > 1e-6), ncc, -1)
+
+        if len(sources) > 1:
+            score = np.partition(ncc, len(sources) - 2, axis=0)[-2:].mean(axis=0)
+        else:
+            score = ncc[0]
+        better = score > best_score
+        best_depth[better] = depth
+        best_score[better] = score[better]
+
+    crop = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+    return view.name, rect, best_depth[crop].astype(np.float32), best_score[crop].astype(np.float32)
+
+
+class FusionGrid:
+    ''' Running average of points on a voxel grid, built from one depth map at a time
+
+    Only one entry per occupied voxel is kept: the sums of positions and colors, and the number of depth
+    maps that hit it, so the memory is bounded by the size of the fused cloud and not by the depth maps.
+    '''
+    def __init__(self, min_bound, max_bound, voxel_size):
+        self._min_bound = np.asarray(min_bound, dtype=np.float64)
+        self._voxel_size = voxel_size
+        self._dims = np.ceil((np.asarray(max_bound) - self._min_bound) / voxel_size).astype(np.int64) + 1
+        self._keys = np.empty(0, dtype=np.int64)
+        self._xyz_sums = np.empty((0, 3), dtype=np.float64)
+        self._rgb_sums = np.empty((0, 3), dtype=np.float64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._views = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, xyz, rgb):
+        ''' Add the points of one depth map, every voxel it hits counts as one view '''
+        cells = np.floor((xyz - self._min_bound) / self._voxel_size).astype(np.int64)
+        inside = np.all((cells >= 0) & (cells < self._dims), axis=1)
+        cells, xyz, rgb = cells[inside], xyz[inside], rgb[inside]
+        keys = (cells[:, 0] * self._dims[1] + cells[:, 1]) * self._dims[2] + cells[:, 2]
+
+        keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        xyz_sums = np.stack([np.bincount(inverse, weights=xyz[:, i], minlength=len(keys)) for i in range(3)], 1)
+        rgb_sums = np.stack([np.bincount(inverse, weights=rgb[:, i], minlength=len(keys)) for i in range(3)], 1)
+
+        all_keys = np.concatenate([self._keys, keys])
+        self._keys, inverse = np.unique(all_keys, return_inverse=True)
+        size = len(self._keys)
+        self._xyz_sums = np.stack([
+            np.bincount(inverse, weights=np.concatenate([self._xyz_sums[:, i], xyz_sums[:, i]]), minlength=size)
+            for i in range(3)], 1)
+        self._rgb_sums = np.stack([
+            np.bincount(inverse, weights=np.concatenate([self._rgb_sums[:, i], rgb_sums[:, i]]), minlength=size)
+            for i in range(3)], 1)
+        self._counts = np.bincount(inverse, weights=np.concatenate([self._counts, counts]), minlength=size)
+        self._views = np.bincount(
+            inverse, weights=np.concatenate([self._views, np.ones(len(keys))]), minlength=size).astype(np.int64)
+
+    def points(self, min_views=MIN_FUSED_VIEWS):
+        ''' Average position (M, 3) float32 and color (M, 3) uint8 of the voxels hit by at least min_views '''
+        kept = self._views >= min_views
+        counts = self._counts[kept, None]
+        return (self._xyz_sums[kept] / counts).astype(np.float32), \
+            np.round(self._rgb_sums[kept] / counts).astype(np.uint8)
+
+
+def fuse_depth_maps(views, depth_dir, min_bound, max_bound, voxel_size=None, min_confidence=MIN_CONFIDENCE,
+                    min_views=MIN_FUSED_VIEWS):
+    ''' Fuse the depth maps of views into a colored point cloud inside [min_bound, max_bound]
+
+    Depth maps are read one at a time. The voxel size defaults to the median footprint of a pixel at the
+    median depth of the views. Returns xyz (M, 3) float32 and rgb (M, 3) uint8.
+    '''
+    if voxel_size is None:
+        footprints = [np.sqrt(view.near * view.far) / view.intrinsic[0] for view in views]
+        voxel_size = float(np.median(footprints)) if len(footprints) > 0 else 1.0
+    # Keeps the voxel keys within int64
+    voxel_size = max(voxel_size, float(np.max(np.asarray(max_bound) - np.asarray(min_bound))) / 2 ** 20)
+
+    grid = FusionGrid(min_bound, max_bound, voxel_size)
+    for i, view in enumerate(views):
+        path = depth_map_path(depth_dir, view.name)
+        if not osp.isfile(path):
+            continue
+        depth, score = np.load(path)
+        valid = (score >= min_confidence) & (depth > 0)
+
+        fx, fy, cx, cy = view.intrinsic
+        ys, xs = np.nonzero(valid)
+        d = depth[ys, xs].astype(np.float64)
+        camera_points = np.stack([(xs + 0.5 - cx) / fx * d, (ys + 0.5 - cy) / fy * d, d], axis=1)
+        rotation_inv, center = invert_poses(view.rotation, view.translation)
+        _, rgb = load_image(view.path, view.width, view.height)
+        grid.add(camera_points @ rotation_inv.T + center, rgb[ys, xs].astype(np.float64))
+        report_progress('dense fusion', i + 1, len(views), message=view.name)
+    return grid.points(min_views)
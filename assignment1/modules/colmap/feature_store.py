@@ -0,0 +1,117 @@
+import hashlib
+import json
+import numpy as np
+import os
+import os.path as osp
+import threading
+
+
+# Shared by all the datasets, so an image copied or moved to another dataset keeps its features
+DEFAULT_FEATURE_STORE_DIR = os.environ.get(
+    'COLMAP_FEATURE_STORE', osp.join(osp.expanduser('~'), '.cache', 'colmap_features'))
+
+# Bump when the way features are extracted or stored changes, older entries are then ignored
+FEATURE_STORE_VERSION = 1
+
+
+def hash_file(path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_images(image_paths, memo_path):
+    ''' Content hash of every image, {name: sha1}
+
+    Hashes are remembered in memo_path with the size and modification time of the images, so only new or
+    modified images are read. The memo is keyed by absolute path, so the original and downsampled copies of an
+    image hashed into the same memo do not replace each other.
+    '''
+    memo = {}
+    if osp.isfile(memo_path):
+        try:
+            with open(memo_path, 'r') as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = {}
+    # Memos written before were keyed by name
+    memo = {path: entry for path, entry in memo.items() if osp.isabs(path)}
+
+    hashes, entries = {}, {}
+    for path in image_paths:
+        path = osp.abspath(path)
+        stat = os.stat(path)
+        source = [stat.st_size, stat.st_mtime_ns]
+        entry = memo.get(path)
+        if entry is None or entry['source'] != source:
+            entry = {'source': source, 'sha1': hash_file(path)}
+        hashes[osp.basename(path)] = entry['sha1']
+        entries[path] = entry
+
+    if any(memo.get(path) != entry for path, entry in entries.items()):
+        memo.update(entries)
+        # The GUI and a reconstruction running in another process may write it at the same time
+        tmp_path = f'{memo_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(memo, f)
+        os.replace(tmp_path, memo_path)
+    return hashes
+
+
+def extractor_key(options):
+    ''' Name of the store partition for features extracted with options, a dict of the settings they depend on '''
+    text = json.dumps(dict(options, version=FEATURE_STORE_VERSION), sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class FeatureStore:
+    ''' Keypoints and descriptors of images, addressed by image content hash and extractor settings
+
+    Every entry is a separate .npz file written under a temporary name first, so concurrent runs can share
+    the store and an interrupted write is never read.
+    '''
+    def __init__(self, root, key):
+        self._root = root
+        self._key = key
+
+    def path(self, image_hash):
+        return osp.join(self._root, self._key, image_hash[:2], image_hash + '.npz')
+
+    def contains(self, image_hash):
+        return osp.isfile(self.path(image_hash))
+
+    def load(self, image_hash):
+        ''' Keypoints (N, C) float32 and descriptors (N, 128) uint8, as stored in the COLMAP database '''
+        with np.load(self.path(image_hash)) as entry:
+            return entry['keypoints'], entry['descriptors']
+
+    def save(self, image_hash, keypoints, descriptors):
+        path = self.path(image_hash)
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, keypoints=keypoints, descriptors=descriptors)
+        os.replace(tmp_path, path)
+
+
+def write_feature_text(path, keypoints, descriptors):
+    ''' Write features in the text format of COLMAP's feature_importer
+
+    The importer takes a position, scale and orientation per keypoint, they are recovered from the affine
+    shape [x, y, a11, a12, a21, a22] when the database stores one.
+    '''
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    if keypoints.shape[1] == 6:
+        a11, a12, a21, a22 = keypoints[:, 2], keypoints[:, 3], keypoints[:, 4], keypoints[:, 5]
+        scales = (np.hypot(a11, a21) + np.hypot(a12, a22)) / 2
+        orientations = np.arctan2(a21, a11)
+    elif keypoints.shape[1] == 4:
+        scales, orientations = keypoints[:, 2], keypoints[:, 3]
+    else:
+        scales, orientations = np.ones(len(keypoints)), np.zeros(len(keypoints))
+
+    rows = np.column_stack([keypoints[:, :2], scales, orientations, descriptors])
+    with open(path, 'w') as f:
+        f.write(f'{len(keypoints)} {descriptors.shape[1]}\n')
+        np.savetxt(f, rows, fmt=['%.6f'] * 4 + ['%d'] * descriptors.shape[1])
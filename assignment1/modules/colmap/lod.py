@@ -0,0 +1,49 @@
+import numpy as np
+
+
+MIN_LOD_POINTS = 50000
+MAX_LOD_LEVELS = 6
+
+
+def voxel_downsample(xyz, rgb, voxel_size):
+    ''' Average the points and colors falling into each voxel of a regular grid '''
+    xyz = np.asarray(xyz, dtype=np.float32)
+    keys = np.floor((xyz - xyz.min(axis=0)) / voxel_size).astype(np.int64)
+    dims = keys.max(axis=0) + 1
+    keys = (keys[:, 0] * dims[1] + keys[:, 1]) * dims[2] + keys[:, 2]
+
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    num_voxels = len(counts)
+
+    out_xyz = np.empty((num_voxels, 3), dtype=np.float32)
+    out_rgb = np.empty((num_voxels, 3), dtype=np.uint8)
+    for axis in range(3):
+        out_xyz[:, axis] = np.bincount(inverse, weights=xyz[:, axis], minlength=num_voxels) / counts
+        out_rgb[:, axis] = np.round(np.bincount(inverse, weights=rgb[:, axis], minlength=num_voxels) / counts)
+    return out_xyz, out_rgb
+
+
+def build_lod_pyramid(xyz, rgb, min_points=MIN_LOD_POINTS, max_levels=MAX_LOD_LEVELS):
+    ''' Build coarser and coarser voxel-downsampled copies of a point cloud
+
+    Returns a list of (voxel_size, xyz, rgb), finest first. Every level holds at most half the points of the
+    previous one and each level is computed from the previous one, so the total cost stays close to a single
+    pass over the full cloud. The full-resolution cloud itself is not part of the list.
+    '''
+    levels = []
+    if len(xyz) <= min_points:
+        return levels
+
+    diagonal = float(np.linalg.norm(xyz.max(axis=0) - xyz.min(axis=0)))
+    if diagonal == 0:
+        return levels
+
+    voxel_size = diagonal / 2048
+    level_xyz, level_rgb = xyz, rgb
+    while len(levels) < max_levels and len(level_xyz) > min_points:
+        down_xyz, down_rgb = voxel_downsample(level_xyz, level_rgb, voxel_size)
+        if len(down_xyz) <= len(level_xyz) // 2:
+            levels.append((voxel_size, down_xyz, down_rgb))
+            level_xyz, level_rgb = down_xyz, down_rgb
+        voxel_size *= 2
+    return levels
@@ -0,0 +1,243 @@
+import collections
+import datetime
+import numpy as np
+import os.path as osp
+import re
+import struct
+
+
+# Below this number of images, matching every pair is affordable
+EXHAUSTIVE_LIMIT = 100
+# Number of neighbouring images matched with each image in an ordered sequence
+SEQUENTIAL_OVERLAP = 10
+# Number of nearest GPS neighbours matched with each image
+SPATIAL_NEIGHBORS = 20
+# Number of images retrieved for each image by the vocabulary tree (COLMAP's default)
+VOCAB_TREE_NUM_IMAGES = 100
+
+# How to match a dataset: the strategies combined, the explicit pairs (None to match every pair), whether the
+# vocabulary tree adds retrieved pairs, the estimated number of pairs and why this plan was chosen
+MatchPlan = collections.namedtuple(
+    'MatchPlan', ['strategies', 'pairs', 'use_vocab_tree', 'estimated_pairs', 'reason'])
+
+
+def read_exif(path):
+    ''' Capture timestamp and GPS position (latitude, longitude, altitude) of a JPEG image, None when missing
+
+    Only the APP1 segment at the start of the file is read, the image itself is never decoded.
+    '''
+    if osp.splitext(path)[1].lower() not in ['.jpg', '.jpeg']:
+        return None, None
+
+    with open(path, 'rb') as f:
+        data = f.read(1 << 16)
+    if data[:2] != b'\xff\xd8':
+        return None, None
+
+    offset = 2
+    try:
+        while offset + 4 <= len(data) and data[offset] == 0xFF:
+            marker = data[offset + 1]
+            length, = struct.unpack_from('>H', data, offset + 2)
+            if marker == 0xE1 and data[offset + 4:offset + 10] == b'Exif\x00\x00':
+                return _parse_tiff(data[offset + 10:offset + 2 + length])
+            if marker == 0xDA:
+                break
+            offset += 2 + length
+    except (struct.error, ValueError, KeyError, IndexError, ZeroDivisionError):
+        pass
+    return None, None
+
+
+# Byte size of the EXIF value types
+_EXIF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+
+def _parse_tiff(tiff):
+    endian = '<' if tiff[:2] == b'II' else '>'
+
+    def read_ifd(offset):
+        entries = {}
+        num_entries, = struct.unpack_from(endian + 'H', tiff, offset)
+        for i in range(num_entries):
+            entry = offset + 2 + 12 * i
+            tag, value_type, count = struct.unpack_from(endian + 'HHI', tiff, entry)
+            value_offset = entry + 8
+            if _EXIF_TYPE_SIZES.get(value_type, 1) * count > 4:
+                value_offset, = struct.unpack_from(endian + 'I', tiff, entry + 8)
+            entries[tag] = (value_type, count, value_offset)
+        return entries
+
+    def read_value(entry):
+        value_type, count, offset = entry
+        if value_type == 2:
+            return tiff[offset:offset + count].split(b'\x00')[0].decode('ascii', errors='ignore')
+        if value_type == 3:
+            return struct.unpack_from(endian + 'H' * count, tiff, offset)
+        if value_type == 4:
+            return struct.unpack_from(endian + 'I' * count, tiff, offset)
+        if value_type == 5:
+            values = struct.unpack_from(endian + 'I' * (2 * count), tiff, offset)
+            return [values[i] / values[i + 1] for i in range(0, len(values), 2)]
+        return tiff[offset:offset + count]
+
+    ifd0 = read_ifd(struct.unpack_from(endian + 'I', tiff, 4)[0])
+
+    timestamp = None
+    date = None
+    if 0x8769 in ifd0:
+        exif_ifd = read_ifd(read_value(ifd0[0x8769])[0])
+        if 0x9003 in exif_ifd:
+            date = read_value(exif_ifd[0x9003])
+    if date is None and 0x0132 in ifd0:
+        date = read_value(ifd0[0x0132])
+    if date:
+        try:
+            timestamp = datetime.datetime.strptime(date.strip(), '%Y:%m:%d %H:%M:%S').timestamp()
+        except ValueError:
+            pass
+
+    position = None
+    if 0x8825 in ifd0:
+        gps_ifd = read_ifd(read_value(ifd0[0x8825])[0])
+        if 2 in gps_ifd and 4 in gps_ifd:
+            latitude = _degrees(read_value(gps_ifd[2]))
+            longitude = _degrees(read_value(gps_ifd[4]))
+            if 1 in gps_ifd and read_value(gps_ifd[1]).upper() == 'S':
+                latitude = -latitude
+            if 3 in gps_ifd and read_value(gps_ifd[3]).upper() == 'W':
+                longitude = -longitude
+            altitude = read_value(gps_ifd[6])[0] if 6 in gps_ifd else 0.0
+            if 5 in gps_ifd and bytes(read_value(gps_ifd[5]))[:1] == b'\x01':
+                altitude = -altitude
+            position = (latitude, longitude, altitude)
+
+    return timestamp, position
+
+
+def _degrees(dms):
+    return dms[0] + dms[1] / 60.0 + dms[2] / 3600.0
+
+
+def _filename_sequence_order(names):
+    ''' Order of the images by frame number, or None if the names do not look like a sequence
+
+    A sequence is recognized from numbers with a regular step, as produced by cameras and video exports.
+    '''
+    numbers = []
+    for name in names:
+        match = re.search(r'(\d+)\D*$', name)
+        if match is None:
+            return None
+        numbers.append(int(match.group(1)))
+
+    steps = np.diff(np.sort(numbers))
+    if len(steps) == 0 or np.any(steps == 0):
+        return None
+    if float(np.median(steps)) > 2 * max(1, int(steps.min())):
+        return None
+    return list(np.argsort(numbers, kind='stable'))
+
+
+def _sequential_pairs(order):
+    ''' Pairs of each image with its SEQUENTIAL_OVERLAP next ones, and with the ones 2, 4, 8, ... images later
+
+    The long range pairs are the quadratic overlap of COLMAP's sequential matcher, they let the mapper close
+    the loop when the sequence comes back to where it started.
+    '''
+    pairs = set()
+    for i in range(len(order)):
+        for j in range(i + 1, min(i + 1 + SEQUENTIAL_OVERLAP, len(order))):
+            pairs.add((order[i], order[j]))
+        for k in range(SEQUENTIAL_OVERLAP):
+            j = i + 2 ** k
+            if j >= len(order):
+                break
+            pairs.add((order[i], order[j]))
+    return pairs
+
+
+def _spatial_pairs(positions):
+    ''' Pairs of each image with its nearest neighbours, positions being (latitude, longitude, altitude) '''
+    positions = np.asarray(positions, dtype=np.float64)
+    # Local metric approximation around the first image, good enough to rank neighbours
+    earth_radius = 6371000.0
+    latitude0 = np.radians(positions[0, 0])
+    xyz = np.stack([
+        earth_radius * np.radians(positions[:, 1] - positions[0, 1]) * np.cos(latitude0),
+        earth_radius * np.radians(positions[:, 0] - positions[0, 0]),
+        positions[:, 2] - positions[0, 2],
+    ], axis=1)
+
+    k = min(SPATIAL_NEIGHBORS, len(xyz) - 1)
+    pairs = set()
+    for start in range(0, len(xyz), 1024):
+        distances = np.linalg.norm(xyz[start:start + 1024, None] - xyz[None], axis=2)
+        rows = np.arange(len(distances))
+        distances[rows, start + rows] = np.inf
+        neighbors = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        for row, columns in enumerate(neighbors):
+            for column in columns:
+                i, j = start + row, int(column)
+                pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+
+def plan_matching(image_paths, vocab_path=None):
+    ''' Choose how to select the image pairs to match
+
+    Small datasets are matched exhaustively. Otherwise pair lists are combined from the ordering of the images
+    (frame numbers in the file names or EXIF timestamps), from the EXIF GPS positions, and from vocabulary tree
+    retrieval when the vocabulary file exists. Exhaustive matching is the fallback when none of them applies.
+
+    Cameras number their photos whether they were taken along a path or not, so the order of the file names is
+    only used together with GPS or retrieval, which connect the images it does not.
+    '''
+    names = [osp.basename(path) for path in image_paths]
+    num_images = len(names)
+    exhaustive_pairs = num_images * (num_images - 1) // 2
+    use_vocab_tree = vocab_path is not None and osp.isfile(vocab_path)
+
+    if num_images <= EXHAUSTIVE_LIMIT:
+        return MatchPlan(['exhaustive'], None, False, exhaustive_pairs, f'at most {EXHAUSTIVE_LIMIT} images')
+
+    exif = [read_exif(path) for path in image_paths]
+    timestamps = [timestamp for timestamp, _ in exif if timestamp is not None]
+    positions = [position for _, position in exif if position is not None]
+
+    strategies = []
+    reasons = []
+    index_pairs = set()
+    has_gps = len(positions) == num_images
+
+    # Like GPS, capture times are only used when every image has one, an image without would not be ordered
+    if len(timestamps) == num_images:
+        strategies.append('sequential (timestamps)')
+        reasons.append('every image has a capture time')
+        index_pairs |= _sequential_pairs(list(np.argsort(timestamps, kind='stable')))
+    else:
+        file_order = _filename_sequence_order(names)
+        if file_order is not None and (has_gps or use_vocab_tree):
+            strategies.append('sequential (file names)')
+            reasons.append('the file names are numbered')
+            index_pairs |= _sequential_pairs(file_order)
+        elif file_order is not None:
+            reasons.append('numbered file names alone may be an unordered photo collection')
+
+    if has_gps:
+        strategies.append('spatial (GPS)')
+        reasons.append('every image has a GPS position')
+        index_pairs |= _spatial_pairs(positions)
+
+    estimated_pairs = len(index_pairs)
+    if use_vocab_tree:
+        strategies.append('retrieval (vocab tree)')
+        reasons.append('the vocabulary tree is available')
+        estimated_pairs += num_images * min(VOCAB_TREE_NUM_IMAGES, num_images - 1)
+
+    if len(strategies) == 0:
+        reasons.append('no capture times, GPS positions or vocabulary tree')
+        return MatchPlan(['exhaustive'], None, False, exhaustive_pairs, ', '.join(reasons))
+
+    pairs = sorted((names[min(i, j)], names[max(i, j)]) for i, j in index_pairs)
+    return MatchPlan(strategies, pairs, use_vocab_tree, min(estimated_pairs, exhaustive_pairs), ', '.join(reasons))
@@ -0,0 +1,76 @@
+import numpy as np
+import open3d as o3d
+
+
+# Filter name: default threshold. A point is kept when its reprojection error in pixels is at most 'max_error',
+# it is observed at least 'min_track_length' times, its largest triangulation angle in degrees is at least
+# 'min_angle', and its mean distance to its neighbours is within 'std_ratio' standard deviations of the average
+DEFAULT_FILTERS = {
+    'max_error': 2.0,
+    'min_track_length': 3,
+    'min_angle': 1.5,
+    'std_ratio': 2.0,
+}
+
+# Neighbours used by the statistical outlier filter
+STATISTICAL_NEIGHBORS = 20
+
+# Pairs of rays compared at once by triangulation_angles, each one takes 8 bytes
+MAX_ANGLE_PAIRS = 1 << 22
+
+
+def error_mask(errors, max_error):
+    return np.asarray(errors) <= max_error
+
+
+def track_length_mask(track_offsets, min_length):
+    return np.diff(track_offsets) >= min_length
+
+
+def triangulation_angles(xyz, track_offsets, track_images, centers, max_pairs=MAX_ANGLE_PAIRS):
+    ''' Largest angle in degrees between the rays from the observing cameras to every point
+
+    Every pair of rays of a track is compared. Tracks of the same length are processed together, at most
+    max_pairs pairs at a time. Points observed by less than two images get 0.
+    '''
+    xyz = np.asarray(xyz, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    track_offsets = np.asarray(track_offsets)
+    track_images = np.asarray(track_images)
+    lengths = np.diff(track_offsets)
+    angles = np.zeros(len(xyz), dtype=np.float64)
+
+    for length in np.unique(lengths[lengths >= 2]):
+        points = np.flatnonzero(lengths == length)
+        step = max(1, max_pairs // (length * length))
+        for start in range(0, len(points), step):
+            chunk = points[start:start + step]
+            # Unit rays (n, length, 3) of the observations of the points of the chunk
+            observations = track_offsets[chunk, None] + np.arange(length)
+            rays = xyz[chunk, None] - centers[track_images[observations]]
+            rays /= np.maximum(np.linalg.norm(rays, axis=2, keepdims=True), 1e-12)
+            cosines = np.einsum('nik,njk->nij', rays, rays).reshape(len(chunk), -1).min(axis=1)
+            angles[chunk] = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+    return angles
+
+
+def triangulation_angle_mask(xyz, track_offsets, track_images, centers, min_angle):
+    return triangulation_angles(xyz, track_offsets, track_images, centers) >= min_angle
+
+
+def statistical_mask(xyz, std_ratio, num_neighbors=STATISTICAL_NEIGHBORS):
+    ''' Points whose mean distance to their neighbours is at most std_ratio standard deviations above average '''
+    mask = np.zeros(len(xyz), dtype=bool)
+    if len(xyz) <= num_neighbors:
+        mask[:] = True
+        return mask
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(np.asarray(xyz, dtype=np.float64))
+    _, kept = pcd.remove_statistical_outlier(num_neighbors, std_ratio)
+    mask[np.asarray(kept, dtype=np.int64)] = True
+    return mask
+
+
+def mask_key(name, threshold):
+    ''' Name under which the mask of a filter is cached '''
+    return f'{name}_{threshold:g}'
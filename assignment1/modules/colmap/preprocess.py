@@ -0,0 +1,104 @@
+import concurrent.futures
+import json
+import multiprocessing
+import numpy as np
+import open3d as o3d
+import os
+import os.path as osp
+import shutil
+
+from utils.thread_utils import report_progress
+
+
+# Formats open3d can decode, the other images are copied as they are
+DECODABLE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+
+def downsample_images(image_paths, output_dir, factor, manifest_path, num_workers=None):
+    ''' Write a copy of every image downsampled by factor into output_dir
+
+    Images whose size and modification time match the manifest are skipped. Returns a dictionary
+    {name: [width, height, downsampled_width, downsampled_height]}.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {}
+    if osp.isfile(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('factor') != factor:
+            manifest = {}
+    entries = manifest.get('images', {})
+
+    sizes, todo = {}, []
+    for path in image_paths:
+        name = osp.basename(path)
+        stat = os.stat(path)
+        entry = entries.get(name)
+        if entry is not None and entry['source'] == [stat.st_size, stat.st_mtime_ns] \
+                and osp.isfile(osp.join(output_dir, name)):
+            sizes[name] = entry['sizes']
+        else:
+            todo.append(path)
+
+    # Remove the outputs of images that are gone
+    names = {osp.basename(path) for path in image_paths}
+    for name in set(os.listdir(output_dir)) - names:
+        os.remove(osp.join(output_dir, name))
+
+    if len(todo) > 0:
+        print(f'Downsampling {len(todo)} images by {factor} into {output_dir}')
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=context) as pool:
+            jobs = [pool.submit(_downsample_image, path, output_dir, factor) for path in todo]
+            for i, job in enumerate(concurrent.futures.as_completed(jobs)):
+                name, image_sizes = job.result()
+                sizes[name] = image_sizes
+                report_progress('preprocess', i + 1, len(todo))
+
+    entries = {}
+    for path in image_paths:
+        name = osp.basename(path)
+        stat = os.stat(path)
+        entries[name] = {'source': [stat.st_size, stat.st_mtime_ns], 'sizes': sizes[name]}
+    with open(manifest_path, 'w') as f:
+        json.dump({'factor': factor, 'images': entries}, f)
+
+    return sizes
+
+
+def _downsample_image(path, output_dir, factor):
+    name = osp.basename(path)
+    output_path = osp.join(output_dir, name)
+
+    if osp.splitext(name)[1].lower() not in DECODABLE_EXTENSIONS:
+        shutil.copy2(path, output_path)
+        return name, None
+
+    image = o3d.t.io.read_image(path)
+    height, width = image.rows, image.columns
+    small = image.resize(1.0 / factor, o3d.t.geometry.InterpType.Super)
+    # open3d takes the compression level for PNG and the quality for JPEG
+    quality = 9 if osp.splitext(name)[1].lower() == '.png' else 95
+    if not o3d.t.io.write_image(output_path, small, quality):
+        raise OSError(f'Could not write {output_path}')
+    return name, [width, height, small.columns, small.rows]
+
+
+def rescale_intrinsics(intrinsics, image_names, sizes):
+    ''' Bring intrinsics estimated on downsampled images back to the resolution of the original images
+
+    Every parameter is multiplied by the ratio of the sizes. This is exact in COLMAP's convention, where the
+    image corner is at (0, 0) and the first pixel center at (0.5, 0.5), so the principal point scales like the
+    focal lengths.
+    '''
+    intrinsics = np.array(intrinsics, dtype=np.float64)
+    for i, name in enumerate(image_names):
+        image_sizes = sizes.get(name)
+        if image_sizes is None:
+            continue
+        width, height, small_width, small_height = image_sizes
+        sx, sy = width / small_width, height / small_height
+        intrinsics[i] *= [sx, sy, sx, sy, sx, sy]
+        intrinsics[i, :2] = [width, height]
+    return intrinsics
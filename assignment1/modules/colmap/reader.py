@@ -0,0 +1,229 @@
+import numpy as np
+import os
+import os.path as osp
+import struct
+
+from utils.pose_utils import quaternions_to_matrices
+
+
+# model_id: (model_name, num_params)
+CAMERA_MODELS = {
+    0: ('SIMPLE_PINHOLE', 3),
+    1: ('PINHOLE', 4),
+    2: ('SIMPLE_RADIAL', 4),
+    3: ('RADIAL', 5),
+    4: ('OPENCV', 8),
+    5: ('OPENCV_FISHEYE', 8),
+    6: ('FULL_OPENCV', 12),
+    7: ('FOV', 5),
+    8: ('SIMPLE_RADIAL_FISHEYE', 4),
+    9: ('RADIAL_FISHEYE', 5),
+    10: ('THIN_PRISM_FISHEYE', 12),
+}
+CAMERA_MODEL_IDS = {name: model_id for model_id, (name, _) in CAMERA_MODELS.items()}
+
+# Models that share a single focal length between both axes
+SINGLE_FOCAL_MODELS = {'SIMPLE_PINHOLE', 'SIMPLE_RADIAL', 'RADIAL', 'SIMPLE_RADIAL_FISHEYE', 'RADIAL_FISHEYE'}
+
+
+def find_model_files(model_dir):
+    ''' Return the (cameras, images, points3D) files of a sparse model, preferring the binary format '''
+    for ext in ['.bin', '.txt']:
+        files = [osp.join(model_dir, name + ext) for name in ['cameras', 'images', 'points3D']]
+        if all(osp.isfile(f) for f in files):
+            return files
+    return None
+
+
+def find_models(sparse_dir):
+    ''' Folders of all the models in sparse_dir, itself or its numbered sub-folders, in COLMAP's numbering order '''
+    if find_model_files(sparse_dir) is not None:
+        return [sparse_dir]
+    if not osp.isdir(sparse_dir):
+        return []
+    names = sorted((name for name in os.listdir(sparse_dir) if name.isdigit()), key=int)
+    return [osp.join(sparse_dir, name) for name in names if find_model_files(osp.join(sparse_dir, name)) is not None]
+
+
+def model_size(model_dir):
+    ''' Total size in bytes of the files of a model, which grows with its number of images and points '''
+    return sum(osp.getsize(path) for path in find_model_files(model_dir))
+
+
+def read_sparse_model(model_dir):
+    ''' Read a COLMAP sparse model into packed arrays
+
+    Returns a dictionary with:
+        xyz: float32 (P, 3) point positions
+        rgb: uint8 (P, 3) point colors
+        image_names: list of N image names, sorted
+        rotations: float64 (N, 3, 3) world-to-camera rotations
+        translations: float64 (N, 3) world-to-camera translations
+        intrinsics: float64 (N, 6) rows of [width, height, fx, fy, cx, cy]
+        errors: float32 (P,) mean reprojection errors of the points, in pixels
+        track_offsets: int64 (P + 1,) offsets of the point tracks into track_images
+        track_images: int32 (T,) indices into image_names of the images observing every point, point i being
+            observed by track_images[track_offsets[i]:track_offsets[i + 1]]
+    '''
+    files = find_model_files(model_dir)
+    if files is None:
+        raise FileNotFoundError(f'No COLMAP model found in {model_dir}')
+    cameras_file, images_file, points_file = files
+
+    if cameras_file.endswith('.bin'):
+        cameras = _read_cameras_binary(cameras_file)
+        images = _read_images_binary(images_file)
+        xyz, rgb, errors, track_lengths, track_image_ids = _read_points3D_binary(points_file)
+    else:
+        cameras = _read_cameras_text(cameras_file)
+        images = _read_images_text(images_file)
+        xyz, rgb, errors, track_lengths, track_image_ids = _read_points3D_text(points_file)
+
+    images = sorted(images, key=lambda x: x[0])
+    image_names = [name for name, _, _, _, _ in images]
+    qvecs = np.array([qvec for _, qvec, _, _, _ in images], dtype=np.float64).reshape(-1, 4)
+    translations = np.array([tvec for _, _, tvec, _, _ in images], dtype=np.float64).reshape(-1, 3)
+    intrinsics = np.array([cameras[camera_id] for _, _, _, camera_id, _ in images], dtype=np.float64).reshape(-1, 6)
+
+    # COLMAP image ids to indices into the sorted image names
+    image_ids = np.array([image_id for _, _, _, _, image_id in images], dtype=np.int64)
+    id_to_index = np.full(image_ids.max() + 1 if len(image_ids) > 0 else 1, -1, dtype=np.int32)
+    id_to_index[image_ids] = np.arange(len(image_ids), dtype=np.int32)
+
+    track_offsets = np.zeros(len(xyz) + 1, dtype=np.int64)
+    np.cumsum(track_lengths, out=track_offsets[1:])
+
+    return {
+        'xyz': xyz,
+        'rgb': rgb,
+        'errors': errors,
+        'track_offsets': track_offsets,
+        'track_images': id_to_index[track_image_ids],
+        'image_names': image_names,
+        # COLMAP stores quaternions as [w, x, y, z]
+        'rotations': quaternions_to_matrices(qvecs[:, [1, 2, 3, 0]]),
+        'translations': translations,
+        'intrinsics': intrinsics,
+    }
+
+
+def _camera_to_intrinsic(model_name, width, height, params):
+    if model_name in SINGLE_FOCAL_MODELS:
+        fx = fy = params[0]
+        cx, cy = params[1], params[2]
+    else:
+        fx, fy, cx, cy = params[:4]
+    return [width, height, fx, fy, cx, cy]
+
+
+def _read_cameras_binary(path):
+    cameras = {}
+    with open(path, 'rb') as f:
+        num_cameras, = struct.unpack('<Q', f.read(8))
+        for _ in range(num_cameras):
+            camera_id, model_id, width, height = struct.unpack('<iiQQ', f.read(24))
+            model_name, num_params = CAMERA_MODELS[model_id]
+            params = struct.unpack('<' + 'd' * num_params, f.read(8 * num_params))
+            cameras[camera_id] = _camera_to_intrinsic(model_name, width, height, params)
+    return cameras
+
+
+def _read_cameras_text(path):
+    cameras = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            elems = line.split()
+            params = [float(x) for x in elems[4:]]
+            cameras[int(elems[0])] = _camera_to_intrinsic(elems[1], int(elems[2]), int(elems[3]), params)
+    return cameras
+
+
+def _read_images_binary(path):
+    images = []
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    num_images, = struct.unpack_from('<Q', data, 0)
+    offset = 8
+    for _ in range(num_images):
+        values = struct.unpack_from('<i7di', data, offset)
+        offset += 64
+        name_end = data.index(b'\x00', offset)
+        name = data[offset:name_end].decode('utf-8')
+        offset = name_end + 1
+        num_points2D, = struct.unpack_from('<Q', data, offset)
+        # Skip the 2D observations (x, y, point3D_id), they are not needed here
+        offset += 8 + 24 * num_points2D
+        images.append((name, values[1:5], values[5:8], values[8], values[0]))
+    return images
+
+
+def _read_images_text(path):
+    images = []
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f if not line.startswith('#')]
+
+    # Every image takes two lines, the second one holds the 2D observations
+    for line in lines[0::2]:
+        if len(line) == 0:
+            continue
+        elems = line.split()
+        qvec = [float(x) for x in elems[1:5]]
+        tvec = [float(x) for x in elems[5:8]]
+        images.append((elems[9], qvec, tvec, int(elems[8]), int(elems[0])))
+    return images
+
+
+def _read_points3D_binary(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    num_points, = struct.unpack_from('<Q', data, 0)
+    xyz = np.empty((num_points, 3), dtype=np.float32)
+    rgb = np.empty((num_points, 3), dtype=np.uint8)
+    errors = np.empty(num_points, dtype=np.float32)
+    track_lengths = np.empty(num_points, dtype=np.int64)
+    # Byte offsets of the tracks, every element being (image_id, point2D_idx) as two int32
+    track_starts = np.empty(num_points, dtype=np.int64)
+
+    offset = 8
+    for i in range(num_points):
+        values = struct.unpack_from('<Q3d3BdQ', data, offset)
+        xyz[i] = values[1:4]
+        rgb[i] = values[4:7]
+        errors[i] = values[7]
+        track_lengths[i] = values[8]
+        track_starts[i] = offset + 51
+        offset += 51 + 8 * values[8]
+
+    # Gather the image ids of all the tracks at once. They are not 4-byte aligned, so their bytes are copied first
+    track_offsets = np.concatenate([[0], np.cumsum(track_lengths)])
+    element_starts = np.repeat(track_starts - 8 * track_offsets[:-1], track_lengths) + 8 * np.arange(track_offsets[-1])
+    id_bytes = np.frombuffer(data, dtype=np.uint8)[element_starts[:, None] + np.arange(4)]
+    track_image_ids = id_bytes.view('<i4').ravel().astype(np.int64)
+    return xyz, rgb, errors, track_lengths, track_image_ids
+
+
+def _read_points3D_text(path):
+    xyz, rgb, errors, track_lengths, track_image_ids = [], [], [], [], []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            elems = line.split()
+            xyz.append([float(x) for x in elems[1:4]])
+            rgb.append([int(x) for x in elems[4:7]])
+            errors.append(float(elems[7]))
+            track = elems[8::2]
+            track_lengths.append(len(track))
+            track_image_ids += [int(x) for x in track]
+    xyz = np.array(xyz, dtype=np.float32).reshape(-1, 3)
+    rgb = np.array(rgb, dtype=np.uint8).reshape(-1, 3)
+    errors = np.array(errors, dtype=np.float32)
+    track_lengths = np.array(track_lengths, dtype=np.int64)
+    track_image_ids = np.array(track_image_ids, dtype=np.int64)
+    return xyz, rgb, errors, track_lengths, track_image_ids
@@ -0,0 +1,56 @@
+import numpy as np
+import open3d as o3d
+
+
+class SpatialIndex:
+    ''' Nearest point, radius and box queries over a point cloud, returning indices into it
+
+    Point and radius queries go through a KD-tree. Box queries first narrow the points down to the slab of the
+    box along x with a binary search over the points sorted by x, then test only those.
+    '''
+    def __init__(self, xyz):
+        self._xyz = xyz
+
+        # The tree only points to the coordinates of the cloud it is built from, so the cloud lives as long as it
+        self._pcd = o3d.geometry.PointCloud()
+        self._pcd.points = o3d.utility.Vector3dVector(np.asarray(xyz, dtype=np.float64))
+        self._tree = o3d.geometry.KDTreeFlann(self._pcd)
+
+        self._x_order = np.argsort(xyz[:, 0], kind='stable')
+        self._sorted_x = np.ascontiguousarray(xyz[self._x_order, 0])
+
+    def __len__(self):
+        return len(self._xyz)
+
+    @property
+    def nbytes(self):
+        # The cloud holds a float64 copy of the points, and the tree about one index per point
+        return len(self._xyz) * 32 + self._x_order.nbytes + self._sorted_x.nbytes
+
+    def nearest(self, point, max_distance=None):
+        ''' Index of the point closest to point, None if there is none within max_distance '''
+        if len(self._xyz) == 0:
+            return None
+        count, indices, distances = self._tree.search_knn_vector_3d(np.asarray(point, dtype=np.float64), 1)
+        if count == 0 or (max_distance is not None and distances[0] > max_distance ** 2):
+            return None
+        return int(indices[0])
+
+    def radius(self, point, radius):
+        ''' Indices of the points within radius of point, sorted '''
+        if len(self._xyz) == 0:
+            return np.empty(0, dtype=np.int64)
+        _, indices, _ = self._tree.search_radius_vector_3d(np.asarray(point, dtype=np.float64), radius)
+        return np.sort(np.asarray(indices, dtype=np.int64))
+
+    def box(self, min_bound, max_bound):
+        ''' Indices of the points inside the axis-aligned box [min_bound, max_bound], sorted '''
+        min_bound = np.asarray(min_bound, dtype=np.float64)
+        max_bound = np.asarray(max_bound, dtype=np.float64)
+        start = np.searchsorted(self._sorted_x, min_bound[0], side='left')
+        end = np.searchsorted(self._sorted_x, max_bound[0], side='right')
+
+        candidates = self._x_order[start:end]
+        yz = self._xyz[candidates, 1:]
+        inside = np.all((yz >= min_bound[1:]) & (yz <= max_bound[1:]), axis=1)
+        return np.sort(candidates[inside])
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import os.path as osp
+import time
+
+
+# Stages of a reconstruction in the order they run, every stage only depends on the ones before it
+STAGES = ['list', 'preprocess', 'extract', 'match', 'verify', 'map', 'export']
+
+# Bump when what a stage produces changes, every manifest written before is then stale
+STAGE_VERSION = 1
+
+
+def stage_keys(inputs_hash, parameters):
+    ''' Key of every stage, {stage: sha1}
+
+    The key of a stage hashes the key of the stage before it with its own parameters, starting from the hash of
+    the input images, so changing the parameters of a stage changes the keys of all the stages after it.
+    '''
+    keys = {}
+    previous = inputs_hash
+    for stage in STAGES:
+        text = json.dumps(
+            {'previous': previous, 'parameters': parameters.get(stage, {}), 'version': STAGE_VERSION},
+            sort_keys=True)
+        keys[stage] = previous = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    return keys
+
+
+class StageManifests:
+    ''' One JSON manifest per finished stage, holding its key, parameters and a few outputs
+
+    A manifest is written once its stage is done, and the manifests of a stage and every stage after it are
+    removed before it runs again, so a run interrupted in the middle of a stage resumes from that stage.
+    '''
+    def __init__(self, manifest_dir):
+        self._manifest_dir = manifest_dir
+
+    @property
+    def manifest_dir(self):
+        return self._manifest_dir
+
+    def path(self, stage):
+        return osp.join(self._manifest_dir, f'{stage}.json')
+
+    def exists(self):
+        return osp.isdir(self._manifest_dir)
+
+    def read(self, stage):
+        if not osp.isfile(self.path(stage)):
+            return None
+        try:
+            with open(self.path(stage), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_done(self, stage, key):
+        manifest = self.read(stage)
+        return manifest is not None and manifest['key'] == key
+
+    def first_stale(self, keys):
+        ''' First stage that has to run again for keys, None when all of them are done '''
+        for stage in STAGES:
+            if not self.is_done(stage, keys[stage]):
+                return stage
+        return None
+
+    def status(self, keys):
+        ''' [(stage, 'cached' | 'stale' | 'missing')], stages after a stale or missing one are stale at best '''
+        statuses = []
+        valid = True
+        for stage in STAGES:
+            manifest = self.read(stage)
+            if manifest is None:
+                statuses.append((stage, 'missing'))
+                valid = False
+            elif valid and manifest['key'] == keys[stage]:
+                statuses.append((stage, 'cached'))
+            else:
+                statuses.append((stage, 'stale'))
+                valid = False
+        return statuses
+
+    def invalidate(self, stage):
+        ''' Remove the manifests of stage and of every stage after it '''
+        for later in STAGES[STAGES.index(stage):]:
+            if osp.isfile(self.path(later)):
+                os.remove(self.path(later))
+
+    def mark_done(self, stage, key, parameters, outputs=None):
+        os.makedirs(self._manifest_dir, exist_ok=True)
+        manifest = {
+            'stage': stage,
+            'key': key,
+            'version': STAGE_VERSION,
+            'parameters': parameters,
+            'outputs': outputs or {},
+            'finished': time.time(),
+        }
+        tmp_path = f'{self.path(stage)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.path(stage))
@@ -0,0 +1,178 @@
+import collections
+import concurrent.futures
+import json
+import numpy as np
+import open3d as o3d
+import open3d.visualization.rendering as rendering
+import os
+import os.path as osp
+import threading
+import traceback
+
+from utils.geometry_utils import compute_frustum_lines, compute_frustum_points, compute_frustum_rays
+from utils.pose_utils import interpolate_poses
+from utils.thread_utils import report_progress
+
+
+# Images rendered but not written yet, each one holds a full frame in memory
+DEFAULT_MAX_PENDING = 8
+
+# A viewpoint to render: output file name, intrinsics [width, height, fx, fy, cx, cy] and world-to-camera 4x4 matrix
+View = collections.namedtuple('View', ['name', 'intrinsic', 'extrinsic'])
+
+
+def write_image(path, image):
+    ''' Write an open3d image, as PNG unless path ends with .jpg '''
+    quality = 9  # png
+    if path.endswith(".jpg"):
+        quality = 100
+    if not o3d.io.write_image(path, image, quality):
+        raise OSError(f'Could not write {path}')
+
+
+class ImageWriter:
+    ''' Encodes and writes images on a thread pool, keeping at most max_pending images in memory
+
+    submit blocks while max_pending images are waiting, so a fast renderer cannot pile up frames. Callers that
+    must not block, like the GUI main thread, check has_capacity first and resume from on_written.
+    '''
+    def __init__(self, num_workers=None, max_pending=DEFAULT_MAX_PENDING):
+        self._pool = concurrent.futures.ThreadPoolExecutor(num_workers)
+        self._max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._errors = []
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def has_capacity(self):
+        return self.pending < self._max_pending
+
+    def submit(self, path, image, on_written=None):
+        self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+        future = self._pool.submit(write_image, path, image)
+        future.add_done_callback(lambda f: self._on_done(f, on_written))
+
+    def _on_done(self, future, on_written):
+        if future.exception() is not None:
+            self._errors.append(future.exception())
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+        if on_written is not None:
+            try:
+                on_written()
+            except Exception:
+                traceback.print_exc()
+
+    def close(self):
+        ''' Wait until every image is written, raising the first write error if any '''
+        self._pool.shutdown(wait=True)
+        if len(self._errors) > 0:
+            raise self._errors[0]
+
+
+def pinhole_intrinsic(intrinsic):
+    width, height, fx, fy, cx, cy = intrinsic
+    return o3d.camera.PinholeCameraIntrinsic(int(width), int(height), float(fx), float(fy), float(cx), float(cy))
+
+
+def camera_views(cameras, names=None):
+    ''' The viewpoints of the cameras of a CameraTable, all of them or the ones in names, saved as <image name>.png '''
+    names = cameras.names if names is None else names
+    extrinsics = cameras.extrinsic_matrices()
+    views = []
+    for name in names:
+        i = cameras.index(name)
+        views.append(View(osp.splitext(name)[0] + '.png', cameras.intrinsics[i], extrinsics[i]))
+    return views
+
+
+def flythrough_views(cameras, samples_per_camera, intrinsic):
+    ''' Viewpoints along the path through all the cameras of a CameraTable, in name order, as frame_%06d.png '''
+    rotations, translations = interpolate_poses(cameras.rotations, cameras.translations, samples_per_camera)
+    extrinsics = np.zeros((len(rotations), 4, 4), dtype=np.float64)
+    extrinsics[:, :3, :3] = rotations
+    extrinsics[:, :3, 3] = translations
+    extrinsics[:, 3, 3] = 1
+    return [View(f'frame_{i:06d}.png', intrinsic, extrinsic) for i, extrinsic in enumerate(extrinsics)]
+
+
+def read_views(path, cameras):
+    ''' Viewpoints listed in a JSON file
+
+    Every entry is either the name of a reconstructed image, or an object {"name": output file name,
+    "extrinsic": world-to-camera 4x4 matrix, "intrinsic": [width, height, fx, fy, cx, cy]} where the intrinsic
+    defaults to the one of the first camera.
+    '''
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    views = []
+    for i, entry in enumerate(entries):
+        if isinstance(entry, str):
+            views += camera_views(cameras, [entry])
+        else:
+            views.append(View(
+                entry.get('name', f'view_{i:06d}.png'),
+                np.asarray(entry.get('intrinsic', cameras.intrinsics[0]), dtype=np.float64),
+                np.asarray(entry['extrinsic'], dtype=np.float64),
+            ))
+    return views
+
+
+def camera_line_set(cameras, size, color):
+    ''' All the camera frusta of a CameraTable as a single LineSet '''
+    centers, rays = compute_frustum_rays(cameras.intrinsics, cameras.rotations, cameras.translations)
+    lines = o3d.geometry.LineSet()
+    lines.points = o3d.utility.Vector3dVector(compute_frustum_points(centers, rays, size))
+    lines.lines = o3d.utility.Vector2iVector(compute_frustum_lines(len(rays)))
+    lines.paint_uniform_color(color)
+    return lines
+
+
+def render_offscreen(colmap_api, settings, views, output_dir, width, show_cameras=False,
+                     num_writers=None, max_pending=DEFAULT_MAX_PENDING):
+    ''' Render the reconstruction from every view into output_dir, without any window
+
+    The frames are width pixels wide with the aspect ratio of the first view, the intrinsics of every view are
+    scaled to that size. Rendering and encoding overlap: the images are written by an ImageWriter. Returns the
+    number of written images.
+    '''
+    if len(views) == 0:
+        return 0
+    height = int(round(width * views[0].intrinsic[1] / views[0].intrinsic[0]))
+
+    renderer = rendering.OffscreenRenderer(width, height)
+    renderer.scene.set_background([
+        settings.bg_color.red, settings.bg_color.green, settings.bg_color.blue, settings.bg_color.alpha
+    ])
+    renderer.scene.add_geometry("__model__", colmap_api.pcd, settings.material)
+    if show_cameras:
+        color = [settings.camera_color.red, settings.camera_color.green, settings.camera_color.blue]
+        renderer.scene.add_geometry(
+            "__cameras__", camera_line_set(colmap_api.cameras, settings.camera_size, color), settings.material)
+
+    os.makedirs(output_dir, exist_ok=True)
+    writer = ImageWriter(num_writers, max_pending)
+    try:
+        for i, view in enumerate(views):
+            image_width, image_height, fx, fy, cx, cy = view.intrinsic
+            sx, sy = width / image_width, height / image_height
+            intrinsic_matrix = np.array([
+                [fx * sx, 0, cx * sx],
+                [0, fy * sy, cy * sy],
+                [0, 0, 1],
+            ])
+            renderer.setup_camera(intrinsic_matrix, view.extrinsic, width, height)
+            writer.submit(osp.join(output_dir, view.name), renderer.render_to_image())
+            report_progress('render', i + 1, len(views))
+    finally:
+        writer.close()
+    return len(views)
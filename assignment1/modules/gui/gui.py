@@ -5,7 +5,9 @@
 # SPDX-License-Identifier: MIT
 # ----------------------------------------------------------------------------
 
+import contextlib
 import glob
+import threading
 import time
 import numpy as np
 import open3d as o3d
@@ -17,7 +19,15 @@ import platform
 import sys
 
 from modules.colmap.api import ColmapAPI
+from modules.gui.recent import RecentCache, RecentEntry
+from modules.gui.export import ImageWriter, camera_views, flythrough_views, pinhole_intrinsic, write_image
 from modules.gui.settings import Settings
+from modules.gui.thumbnails import THUMBNAIL_SIZES, ThumbnailCache, build_thumbnails
+from modules.video.keyframes import VIDEO_EXTENSIONS, extract_keyframes
+from utils.geometry_utils import (
+    IMAGE_QUAD_TRIANGLES, IMAGE_QUAD_UVS, compute_frustum_lines, compute_frustum_points, compute_frustum_rays,
+    compute_image_quad)
+from utils.profile_utils import StageProfiler, format_record
 from utils.thread_utils import run_on_thread
 
 isMacOS = (platform.system() == "Darwin")
@@ -29,20 +39,97 @@ class AppWindow:
     MENU_OPEN_VIDEO = 13
     MENU_EXPORT = 14
     MENU_QUIT = 15
+    MENU_EXPORT_FLYTHROUGH = 16
+    MENU_EXPORT_VIEWS = 17
+    # File/Recent items take the ids from MENU_RECENT to MENU_RECENT + Settings.RECENT_MENU_SIZE - 1
+    MENU_RECENT = 40
     MENU_SHOW_SETTINGS = 21
     MENU_ABOUT = 31
 
     DEFAULT_IBL = "default"
 
+    # Seconds between two level-of-detail decisions
+    LOD_CHECK_INTERVAL = 0.5
+
+    # A click picks the nearest point within this fraction of the scene diagonal
+    PICK_DISTANCE = 0.01
+    # Observing images listed for a picked point
+    PICK_MAX_LISTED_IMAGES = 8
+
+    # Seconds between two checks of a point stream waiting for the main thread to upload its chunk
+    CHUNK_UPLOAD_POLL_INTERVAL = 0.5
+
+    # Point filter name: label in the panel
+    POINT_FILTER_LABELS = {
+        'max_error': "Max error (px)",
+        'min_track_length': "Min track length",
+        'min_angle': "Min angle (deg)",
+        'std_ratio': "Outlier std ratio",
+    }
+
     def __init__(self, width, height):
         self.settings = Settings()
 
-        # COLMAP API
-        self.colmap_api = ColmapAPI(
-            gpu_index=self.settings.DEFAULT_GPU_INDEX,
-            camera_model=self.settings.DEFAULT_CAMERA_MODEL,
-            matcher=self.settings.DEFAULT_COLMAP_MATCHER,
-        )
+        # Names of the point cloud chunks currently in the scene
+        self._model_geometry_names = []
+        self._point_stream_id = 0
+        # Set once the window closes, the main thread then no longer runs what the worker threads post to it
+        self._closing = threading.Event()
+
+        # All camera frusta are drawn as a single line set, rebuilt from these cached rays
+        self._frustum_centers = None
+        self._frustum_rays = None
+        self._camera_lines = None
+
+        # Models COLMAP wrote besides the main one: visibility and frustum (centers, rays) by model name, and
+        # the future loading them, whose events are dropped once another dataset is loaded
+        self._sub_model_visible = {}
+        self._sub_model_frustums = {}
+        self._sub_models_future = None
+
+        # Thumbnails of the dataset, built in the background and decoded only for the selected camera, whose name
+        # and texture drawn on its frustum are kept. Futures are dropped once they are outdated
+        self._thumbnails = None
+        self._thumbnails_future = None
+        self._camera_image_future = None
+        self._camera_image_name = None
+        self._camera_texture = None
+
+        # Level of detail currently displayed, driven by camera distance and frame time
+        self._lod_level = 0
+        self._lod_fps_bias = 0
+        self._frame_time = 0.0
+        self._last_tick = None
+        self._last_lod_check = 0.0
+
+        # Fly-through playback: precomputed world-to-camera matrices, played at target_fps from the start time
+        self._flythrough = None
+        self._flythrough_intrinsic = None
+        self._flythrough_bounds = None
+        self._flythrough_start = 0.0
+        self._flythrough_frame = -1
+
+        # Stage timings of the last estimation and display, shown in the COLMAP panel
+        self._profile_lines = []
+
+        # Future of the stage status shown in the COLMAP panel, an outdated one is dropped
+        self._stages_future = None
+
+        # Index of the picked point and whether only a box around it is displayed
+        self._picked_point = None
+        self._cropped = False
+
+        # Datasets listed in File/Recent, most recent first, and the reconstructions kept loaded among them.
+        # The displayed one is not in the cache, it is put back when another dataset is opened
+        self._recent_paths = []
+        self._recent_cache = RecentCache(self.settings.recent_cache_mb * 2 ** 20)
+        # Future of the result being loaded, and the fingerprint of the displayed one
+        self._load_future = None
+        self._result_fingerprint = None
+
+        # COLMAP API, a new one is created for every dataset
+        self.colmap_api = self._create_colmap_api(
+            self.settings.DEFAULT_CAMERA_MODEL, self.settings.DEFAULT_COLMAP_MATCHER)
 
         self.window = gui.Application.instance.create_window(
             "Open3D", width, height)
@@ -51,6 +138,7 @@ class AppWindow:
         # 3D widget
         self._scene = gui.SceneWidget()
         self._scene.scene = rendering.Open3DScene(w.renderer)
+        self._scene.set_on_mouse(self._on_scene_mouse)
 
         # Sizing
         em = w.theme.font_size
@@ -87,6 +175,10 @@ class AppWindow:
         self._point_size.set_limits(1, 10)
         self._point_size.set_on_value_changed(self._on_point_size)
 
+        self._adaptive_lod = gui.Checkbox("Adaptive LOD")
+        self._adaptive_lod.set_on_checked(self._on_adaptive_lod)
+        gui_ctrls.add_child(self._adaptive_lod)
+
         grid = gui.VGrid(2, 0.25 * em)
         grid.add_child(gui.Label("Cam Size"))
         grid.add_child(self._camera_size)
@@ -94,6 +186,15 @@ class AppWindow:
         grid.add_child(self._point_size)
         gui_ctrls.add_child(grid)
 
+        self._recent_cache_mb = gui.NumberEdit(gui.NumberEdit.INT)
+        self._recent_cache_mb.set_limits(0, 1 << 20)
+        self._recent_cache_mb.int_value = self.settings.recent_cache_mb
+        self._recent_cache_mb.set_on_value_changed(self._on_recent_cache_mb)
+        grid = gui.VGrid(2, 0.25 * em)
+        grid.add_child(gui.Label("Recent cache (MB)"))
+        grid.add_child(self._recent_cache_mb)
+        gui_ctrls.add_child(grid)
+
         self._settings_panel.add_child(gui_ctrls)
 
         # COLMAP Control
@@ -110,26 +211,125 @@ class AppWindow:
             self._colmap_matchers.add_item(name)
         self._colmap_matchers.set_on_selection_changed(self._on_colmap_matcher_change)
 
+        self._downsample_factors = gui.Combobox()
+        for factor in Settings.DOWNSAMPLE_FACTORS:
+            self._downsample_factors.add_item(str(factor))
+        self._downsample_factors.set_on_selection_changed(self._on_colmap_downsample_change)
+
         grid = gui.VGrid(2, 0.25 * em)
         grid.add_child(gui.Label("Camera"))
         grid.add_child(self._camera_models)
         grid.add_child(gui.Label("Matchers"))
         grid.add_child(self._colmap_matchers)
+        grid.add_child(gui.Label("Downsample"))
+        grid.add_child(self._downsample_factors)
         colmap_ctrls.add_child(grid)
 
+        self._incremental = gui.Checkbox("Only add new images")
+        self._incremental.checked = self.settings.incremental_reconstruction
+        self._incremental.set_on_checked(self._on_colmap_incremental)
+        colmap_ctrls.add_child(self._incremental)
+        self._stages_label = gui.Label("")
+        colmap_ctrls.add_child(self._stages_label)
+
+        self._show_profile = gui.Checkbox("Show stage timings")
+        self._show_profile.checked = self.settings.show_stage_timings
+        self._show_profile.set_on_checked(self._on_show_profile)
+        colmap_ctrls.add_child(self._show_profile)
+        self._profile_label = gui.Label("")
+        self._profile_label.visible = self.settings.show_stage_timings
+        colmap_ctrls.add_child(self._profile_label)
+
         h = gui.Horiz(0.25 * em)  # row 2
         self._fit_colmap_button = gui.Button("Fit Colmap")
         self._fit_colmap_button.horizontal_padding_em = 0.2
         self._fit_colmap_button.enabled = False
         self._fit_colmap_button.set_on_clicked(self._on_fit_colmap_button)
+        self._dense_button = gui.Button("Dense")
+        self._dense_button.horizontal_padding_em = 0.2
+        self._dense_button.enabled = False
+        self._dense_button.set_on_clicked(self._on_dense_button)
         h.add_stretch()
         h.add_child(self._fit_colmap_button)
+        h.add_child(self._dense_button)
         h.add_stretch()
         colmap_ctrls.add_child(h)
 
+        self._show_dense = gui.Checkbox("Show dense cloud")
+        self._show_dense.checked = True
+        self._show_dense.enabled = False
+        self._show_dense.set_on_checked(self._on_show_dense)
+        colmap_ctrls.add_child(self._show_dense)
+        self._dense_label = gui.Label("")
+        colmap_ctrls.add_child(self._dense_label)
+
+        self._sub_models_label = gui.Label("Other models")
+        self._sub_models_label.visible = False
+        colmap_ctrls.add_child(self._sub_models_label)
+        self._sub_models_tree = gui.TreeView()
+        self._sub_models_tree.visible = False
+        colmap_ctrls.add_child(self._sub_models_tree)
+
         self.colmap_ctrls = colmap_ctrls
         self._settings_panel.add_fixed(separation_height)
         self._settings_panel.add_child(self.colmap_ctrls)
+
+        # Selection Control
+        selection_ctrls = gui.CollapsableVert("Selection", 0.25 * em,
+                                            gui.Margins(em, 0, 0, 0))
+        selection_ctrls.add_child(gui.Label("Ctrl+click to pick a point"))
+        self._pick_label = gui.Label("")
+        selection_ctrls.add_child(self._pick_label)
+
+        self._selection_size = gui.Slider(gui.Slider.DOUBLE)
+        self._selection_size.set_limits(0.01, 0.5)
+        self._selection_size.double_value = self.settings.selection_size
+        self._selection_size.set_on_value_changed(self._on_selection_size)
+        grid = gui.VGrid(2, 0.25 * em)
+        grid.add_child(gui.Label("Region Size"))
+        grid.add_child(self._selection_size)
+        selection_ctrls.add_child(grid)
+
+        h = gui.Horiz(0.25 * em)
+        self._select_radius_button = gui.Button("Select radius")
+        self._select_radius_button.horizontal_padding_em = 0.2
+        self._select_radius_button.set_on_clicked(self._on_select_radius_button)
+        self._crop_button = gui.Button("Crop box")
+        self._crop_button.horizontal_padding_em = 0.2
+        self._crop_button.set_on_clicked(self._on_crop_button)
+        self._reset_selection_button = gui.Button("Reset")
+        self._reset_selection_button.horizontal_padding_em = 0.2
+        self._reset_selection_button.set_on_clicked(self._on_reset_selection_button)
+        h.add_child(self._select_radius_button)
+        h.add_child(self._crop_button)
+        h.add_child(self._reset_selection_button)
+        selection_ctrls.add_child(h)
+        self._region_label = gui.Label("")
+        selection_ctrls.add_child(self._region_label)
+        self._enable_selection_buttons()
+
+        self._settings_panel.add_fixed(separation_height)
+        self._settings_panel.add_child(selection_ctrls)
+
+        # Point filter Control
+        filter_ctrls = gui.CollapsableVert("Point filters", 0.25 * em,
+                                         gui.Margins(em, 0, 0, 0))
+        grid = gui.VGrid(2, 0.25 * em)
+        for name, label in AppWindow.POINT_FILTER_LABELS.items():
+            checkbox = gui.Checkbox(label)
+            checkbox.checked = name in self.settings.point_filters
+            checkbox.set_on_checked(lambda is_checked, name=name: self._on_point_filter_checked(name, is_checked))
+            threshold = gui.NumberEdit(gui.NumberEdit.INT if name == 'min_track_length' else gui.NumberEdit.DOUBLE)
+            threshold.set_value(self.settings.filter_thresholds[name])
+            threshold.set_on_value_changed(lambda value, name=name: self._on_point_filter_threshold(name, value))
+            grid.add_child(checkbox)
+            grid.add_child(threshold)
+        filter_ctrls.add_child(grid)
+        self._filter_label = gui.Label("")
+        filter_ctrls.add_child(self._filter_label)
+
+        self._settings_panel.add_fixed(separation_height)
+        self._settings_panel.add_child(filter_ctrls)
         # ----
 
         # Normally our user interface can be children of all one layout (usually
@@ -140,59 +340,30 @@ class AppWindow:
         # (position + size) of every child correctly. After the callback is
         # done the window will layout the grandchildren.
         w.set_on_layout(self._on_layout)
+        w.set_on_tick_event(self._on_tick)
+        w.set_on_close(self._on_close)
         w.add_child(self._scene)
         w.add_child(self._settings_panel)
 
         # ---- Menu ----
         # The menu is global (because the macOS menu is global), so only create
-        # it once, no matter how many windows are created
+        # it once, no matter how many windows are created. It is only built
+        # again to update File/Recent
         if gui.Application.instance.menubar is None:
-            if isMacOS:
-                app_menu = gui.Menu()
-                app_menu.add_item("About", AppWindow.MENU_ABOUT)
-                app_menu.add_separator()
-                app_menu.add_item("Quit", AppWindow.MENU_QUIT)
-
-            file_menu = gui.Menu()
-            file_menu.add_item("Open existing result...", AppWindow.MENU_OPEN_EXISTING)
-            file_menu.add_item("Open image folder...", AppWindow.MENU_OPEN_IMAGE_FOLDER)
-            file_menu.add_item("Export Current Image...", AppWindow.MENU_EXPORT)
-
-            if not isMacOS:
-                file_menu.add_separator()
-                file_menu.add_item("Quit", AppWindow.MENU_QUIT)
-
-            settings_menu = gui.Menu()
-            settings_menu.add_item("3D Reconstruction",
-                                   AppWindow.MENU_SHOW_SETTINGS)
-            settings_menu.set_checked(AppWindow.MENU_SHOW_SETTINGS, True)
-            help_menu = gui.Menu()
-            help_menu.add_item("About", AppWindow.MENU_ABOUT)
-
-            menu = gui.Menu()
-            if isMacOS:
-                # macOS will name the first menu item for the running application
-                # (in our case, probably "Python"), regardless of what we call
-                # it. This is the application menu, and it is where the
-                # About..., Preferences..., and Quit menu items typically go.
-                menu.add_menu("Example", app_menu)
-                menu.add_menu("File", file_menu)
-                menu.add_menu("Settings", settings_menu)
-                # Don't include help menu unless it has something more than
-                # About...
-            else:
-                menu.add_menu("File", file_menu)
-                menu.add_menu("Settings", settings_menu)
-                menu.add_menu("Help", help_menu)
-            gui.Application.instance.menubar = menu
+            gui.Application.instance.menubar = self._build_menubar()
 
         # The menubar is global, but we need to connect the menu items to the
         # window, so that the window can call the appropriate function when the
         # menu item is activated.
         w.set_on_menu_item_activated(AppWindow.MENU_OPEN_EXISTING, self._on_menu_open_existing)
         w.set_on_menu_item_activated(AppWindow.MENU_OPEN_IMAGE_FOLDER, self._on_menu_open_image_folder)
+        w.set_on_menu_item_activated(AppWindow.MENU_OPEN_VIDEO, self._on_menu_open_video)
         w.set_on_menu_item_activated(AppWindow.MENU_EXPORT,
                                      self._on_menu_export)
+        w.set_on_menu_item_activated(AppWindow.MENU_EXPORT_FLYTHROUGH, self._on_menu_export_flythrough)
+        w.set_on_menu_item_activated(AppWindow.MENU_EXPORT_VIEWS, self._on_menu_export_views)
+        for i in range(Settings.RECENT_MENU_SIZE):
+            w.set_on_menu_item_activated(AppWindow.MENU_RECENT + i, lambda i=i: self._on_menu_recent(i))
         w.set_on_menu_item_activated(AppWindow.MENU_QUIT, self._on_menu_quit)
         w.set_on_menu_item_activated(AppWindow.MENU_SHOW_SETTINGS,
                                      self._on_menu_toggle_settings_panel)
@@ -201,6 +372,60 @@ class AppWindow:
 
         self._apply_settings()
 
+    def _build_menubar(self):
+        if isMacOS:
+            app_menu = gui.Menu()
+            app_menu.add_item("About", AppWindow.MENU_ABOUT)
+            app_menu.add_separator()
+            app_menu.add_item("Quit", AppWindow.MENU_QUIT)
+
+        file_menu = gui.Menu()
+        file_menu.add_item("Open existing result...", AppWindow.MENU_OPEN_EXISTING)
+        file_menu.add_item("Open image folder...", AppWindow.MENU_OPEN_IMAGE_FOLDER)
+        file_menu.add_item("Open video...", AppWindow.MENU_OPEN_VIDEO)
+        file_menu.add_menu("Recent", self._build_recent_menu())
+        file_menu.add_item("Export Current Image...", AppWindow.MENU_EXPORT)
+        file_menu.add_item("Export Fly-through...", AppWindow.MENU_EXPORT_FLYTHROUGH)
+        file_menu.add_item("Export Camera Views...", AppWindow.MENU_EXPORT_VIEWS)
+
+        if not isMacOS:
+            file_menu.add_separator()
+            file_menu.add_item("Quit", AppWindow.MENU_QUIT)
+
+        settings_menu = gui.Menu()
+        settings_menu.add_item("3D Reconstruction",
+                               AppWindow.MENU_SHOW_SETTINGS)
+        settings_menu.set_checked(AppWindow.MENU_SHOW_SETTINGS, self._settings_panel.visible)
+        help_menu = gui.Menu()
+        help_menu.add_item("About", AppWindow.MENU_ABOUT)
+
+        menu = gui.Menu()
+        if isMacOS:
+            # macOS will name the first menu item for the running application
+            # (in our case, probably "Python"), regardless of what we call
+            # it. This is the application menu, and it is where the
+            # About..., Preferences..., and Quit menu items typically go.
+            menu.add_menu("Example", app_menu)
+            menu.add_menu("File", file_menu)
+            menu.add_menu("Settings", settings_menu)
+            # Don't include help menu unless it has something more than
+            # About...
+        else:
+            menu.add_menu("File", file_menu)
+            menu.add_menu("Settings", settings_menu)
+            menu.add_menu("Help", help_menu)
+        return menu
+
+    def _build_recent_menu(self):
+        recent_menu = gui.Menu()
+        if len(self._recent_paths) == 0:
+            recent_menu.add_item("No recent result", AppWindow.MENU_RECENT)
+            recent_menu.set_enabled(AppWindow.MENU_RECENT, False)
+        for i, path in enumerate(self._recent_paths):
+            label = f"{path} (in memory)" if path in self._recent_cache else path
+            recent_menu.add_item(label, AppWindow.MENU_RECENT + i)
+        return recent_menu
+
     def _on_point_size(self, size):
         self.settings.material.point_size = int(size)
         self.settings.apply_material = True
@@ -211,9 +436,278 @@ class AppWindow:
         self.settings.apply_camera = True
         self._apply_settings()
 
-    def _on_fit_colmap_button(self):
-        self.colmap_api.estimate_cameras()
+    def _on_adaptive_lod(self, is_checked):
+        self.settings.adaptive_lod = is_checked
+        if not is_checked and self._lod_level != 0 and not self._cropped:
+            self._show_point_level(0)
+
+    def _on_tick(self):
+        now = time.monotonic()
+        if self._last_tick is not None:
+            self._frame_time = 0.9 * self._frame_time + 0.1 * (now - self._last_tick)
+        self._last_tick = now
+
+        redraw = self._advance_flythrough(now)
+
+        if not self.settings.adaptive_lod or self._frustum_rays is None or self._cropped:
+            return redraw
+        if now - self._last_lod_check < AppWindow.LOD_CHECK_INTERVAL:
+            return redraw
+        self._last_lod_check = now
+
+        level = self._select_lod_level()
+        if level == self._lod_level:
+            return redraw
+        self._show_point_level(level)
+        return True
+
+    def _flythrough_views(self):
+        seconds_per_camera = self.settings.flythrough_seconds_per_camera
+        samples_per_camera = max(1, int(round(seconds_per_camera * self.settings.target_fps)))
+        cameras = self.colmap_api.cameras
+        intrinsic = cameras.intrinsics[cameras.index(self.colmap_api.activate_camera_name)]
+        return flythrough_views(cameras, samples_per_camera, intrinsic)
+
+    def _on_flythrough_button(self):
+        if self._flythrough is not None:
+            self._stop_flythrough()
+            return
+
+        views = self._flythrough_views()
+        self._flythrough = [view.extrinsic for view in views]
+        self._flythrough_intrinsic = pinhole_intrinsic(views[0].intrinsic)
+        self._flythrough_bounds = self.colmap_api.bounds
+        self._flythrough_start = time.monotonic()
+        self._flythrough_frame = -1
+        self._flythrough_button.text = "Stop"
+        # The camera goes through the image of the selected one
+        self._show_camera_texture(False)
+
+    def _stop_flythrough(self):
+        self._flythrough = None
+        self._flythrough_button.text = "Play fly-through"
+        self._show_camera_texture(True)
+
+    def _advance_flythrough(self, now):
+        if self._flythrough is None:
+            return False
+
+        # The frame follows the clock: when rendering falls behind, frames are dropped instead of slowing down
+        frame = int((now - self._flythrough_start) * self.settings.target_fps)
+        if frame >= len(self._flythrough):
+            self._stop_flythrough()
+            return False
+        if frame == self._flythrough_frame:
+            return False
+
+        self._flythrough_frame = frame
+        self._scene.setup_camera(self._flythrough_intrinsic, self._flythrough[frame], self._flythrough_bounds)
+        return True
+
+    def _on_scene_mouse(self, event):
+        if event.type != gui.MouseEvent.Type.BUTTON_DOWN or not event.is_modifier_down(gui.KeyModifier.CTRL):
+            return gui.Widget.EventCallbackResult.IGNORED
+        if self._frustum_rays is None:
+            return gui.Widget.EventCallbackResult.HANDLED
+
+        frame = self._scene.frame
+        x, y = event.x - frame.x, event.y - frame.y
+
+        def on_depth(depth_image):
+            depth = np.asarray(depth_image)[y, x]
+            if depth >= 1.0:
+                # Clicked on the background
+                return
+            position = self._scene.scene.camera.unproject(x, y, depth, frame.width, frame.height)
+            self._pick_point(position)
+
+        self._scene.scene.scene.render_to_depth_image(on_depth)
+        return gui.Widget.EventCallbackResult.HANDLED
+
+    @run_on_thread
+    def _pick_point(self, position):
+        # The spatial index may still be building, wait for it here rather than on the main thread
+        max_distance = AppWindow.PICK_DISTANCE * np.linalg.norm(self.colmap_api.bounds.get_extent())
+        index = self.colmap_api.spatial_index.nearest(position, max_distance)
+        self._post_to_main_thread(lambda: self._show_picked_point(index))
+
+    def _show_picked_point(self, index):
+        self._picked_point = index
+        self._scene.scene.remove_geometry("__pick__")
+        if index is None:
+            self._pick_label.text = "No point under the cursor"
+        else:
+            info = self.colmap_api.point_info(index)
+            names = info['images']
+            lines = [
+                f"Point {index}: ({info['xyz'][0]:.3f}, {info['xyz'][1]:.3f}, {info['xyz'][2]:.3f})",
+                f"Error {info['error']:.2f} px, seen by {len(names)} images",
+            ] + names[:AppWindow.PICK_MAX_LISTED_IMAGES]
+            if len(names) > AppWindow.PICK_MAX_LISTED_IMAGES:
+                lines.append("...")
+            self._pick_label.text = "\n".join(lines)
+
+            # Lines from the point to the centers of its observing cameras
+            centers = self.colmap_api.cameras.centers(self.colmap_api.cameras.indices(names))
+            track = o3d.geometry.LineSet()
+            track.points = o3d.utility.Vector3dVector(np.concatenate([info['xyz'][None], centers]))
+            track.lines = o3d.utility.Vector2iVector(
+                np.stack([np.zeros(len(names), dtype=np.int32), np.arange(1, len(names) + 1, dtype=np.int32)], axis=1))
+            track.paint_uniform_color(self._selection_color())
+            self._scene.scene.add_geometry("__pick__", track, self.settings.material)
+
+        self._enable_selection_buttons()
+        self.window.set_needs_layout()
+        self.window.post_redraw()
+
+    def _selection_color(self):
+        return [self.settings.selection_color.red, self.settings.selection_color.green,
+                self.settings.selection_color.blue]
+
+    def _selection_radius(self):
+        return self.settings.selection_size * np.linalg.norm(self.colmap_api.bounds.get_extent())
+
+    def _enable_selection_buttons(self):
+        self._select_radius_button.enabled = self._picked_point is not None
+        self._crop_button.enabled = self._picked_point is not None
+        self._reset_selection_button.enabled = self._picked_point is not None or self._cropped
+
+    def _visible_points(self, indices):
+        # Drop the points hidden by the active filters
+        mask = self.colmap_api.point_mask
+        if mask is None:
+            return indices
+        return indices[mask[indices]]
+
+    def _on_point_filter_checked(self, name, is_checked):
+        if is_checked:
+            self.settings.point_filters[name] = self.settings.filter_thresholds[name]
+        else:
+            self.settings.point_filters.pop(name, None)
+        self._apply_point_filters()
+
+    def _on_point_filter_threshold(self, name, value):
+        if name == 'min_track_length':
+            value = int(value)
+        self.settings.filter_thresholds[name] = value
+        if name in self.settings.point_filters:
+            self.settings.point_filters[name] = value
+            self._apply_point_filters()
+
+    def _apply_point_filters(self):
+        # A threshold that was never used before is computed on the whole cloud, keep it off the main thread
+        self._filter_label.text = "Filtering ..."
+        future = run_on_thread(self.colmap_api.set_point_filters)(dict(self.settings.point_filters))
+        future.add_done_callback(self._on_point_filters_done, dispatch=self._post_to_main_thread)
+
+    def _on_point_filters_done(self, future):
+        if future.exception() is not None:
+            self._filter_label.text = f"Filtering failed: {future.exception()}"
+            return
+        self._update_filter_label()
+        if self._frustum_rays is None:
+            # Nothing displayed yet, the filters apply to the next result
+            return
+        if self._cropped:
+            self._on_crop_button()
+        else:
+            self._show_point_level(0)
+        if self._picked_point is not None and self._scene.scene.has_geometry("__selection__"):
+            self._on_select_radius_button()
+
+    def _update_filter_label(self):
+        mask = self.colmap_api.point_mask
+        if mask is None:
+            self._filter_label.text = ""
+        else:
+            self._filter_label.text = f"{np.count_nonzero(mask)} of {len(mask)} points kept"
+        self.window.set_needs_layout()
+
+    def _on_selection_size(self, size):
+        self.settings.selection_size = size
+
+    def _on_select_radius_button(self):
+        center = self.colmap_api.point_info(self._picked_point)['xyz']
+        radius = self._selection_radius()
+        indices = self._visible_points(self.colmap_api.spatial_index.radius(center, radius))
+
+        # Drawn over the model with larger points, so the selection stands out
+        material = rendering.MaterialRecord()
+        material.shader = "defaultUnlit"
+        material.point_size = self.settings.material.point_size + 2
+        selection = self.colmap_api.points_subset(indices)
+        selection.paint_uniform_color(self._selection_color())
+        self._scene.scene.remove_geometry("__selection__")
+        self._scene.scene.add_geometry("__selection__", selection, material)
+
+        self._region_label.text = f"{len(indices)} points within {radius:.3f}"
+        self.window.set_needs_layout()
+
+    def _on_crop_button(self):
+        center = self.colmap_api.point_info(self._picked_point)['xyz']
+        half_size = self._selection_radius()
+        indices = self._visible_points(self.colmap_api.spatial_index.box(center - half_size, center + half_size))
+
+        # The cropped points replace the streamed chunks, level of detail is off until the crop is reset
+        self._cropped = True
+        self._clear_model_geometries()
+        self._scene.scene.remove_geometry("__crop__")
+        self._scene.scene.add_geometry("__crop__", self.colmap_api.points_subset(indices), self.settings.material)
+
+        self._region_label.text = f"{len(indices)} points in the box"
+        self._enable_selection_buttons()
+        self.window.set_needs_layout()
+
+    def _on_reset_selection_button(self):
+        if self._clear_selection():
+            self._show_point_level(self._lod_level)
+
+    def _clear_selection(self):
+        ''' Remove the picked point, selection and crop, returns whether the model was cropped '''
+        for name in ["__pick__", "__selection__", "__crop__"]:
+            self._scene.scene.remove_geometry(name)
+        cropped = self._cropped
+        self._picked_point = None
+        self._cropped = False
+        self._pick_label.text = ""
+        self._region_label.text = ""
+        self._enable_selection_buttons()
+        return cropped
+
+    def _select_lod_level(self):
+        num_levels = self.colmap_api.num_lod_levels
+        if num_levels == 1:
+            return 0
+
+        # View: the coarsest level whose voxels still project smaller than a point on screen
+        camera = self._scene.scene.camera
+        position = camera.get_model_matrix()[:3, 3]
+        bounds = self.colmap_api.bounds
+        distance = np.linalg.norm(position - np.clip(position, bounds.min_bound, bounds.max_bound))
+        focal = 0.5 * self._scene.frame.height / np.tan(np.radians(camera.get_field_of_view()) / 2)
+
+        view_level = 0
+        if distance > 0:
+            for level in range(1, num_levels):
+                if self.colmap_api.lod_voxel_size(level) * focal / distance > self.settings.material.point_size:
+                    break
+                view_level = level
+
+        # Frame time: coarsen while below the target frame rate, refine again once well above it
+        target_frame_time = 1.0 / self.settings.target_fps
+        if self._frame_time > target_frame_time:
+            self._lod_fps_bias = min(self._lod_fps_bias + 1, num_levels - 1)
+        elif self._frame_time < 0.5 * target_frame_time:
+            self._lod_fps_bias = max(self._lod_fps_bias - 1, 0)
+
+        return min(view_level + self._lod_fps_bias, num_levels - 1)
+
+    def _show_point_level(self, level, profiler=None):
+        self._lod_level = level
+        self._clear_model_geometries()
+        self._stream_point_chunks(self._point_stream_id, level, profiler)
 
+    def _on_fit_colmap_button(self):
         em = self.window.theme.font_size
         dlg = gui.Dialog("Error")
 
@@ -235,23 +729,144 @@ class AppWindow:
         dlg.add_child(dlg_layout)
         self.window.show_dialog(dlg)
 
-        self._enable_colmap_ok_button_when_done()
-
-    def _enable_colmap_ok_button_when_done(self):
-        w = self.window
-        if self.colmap_api.estimate_done():
+        self._clear_profile()
+        future = self.colmap_api.estimate_cameras(
+            recompute=True, incremental=self.settings.incremental_reconstruction)
+        future.add_progress_callback(self._on_colmap_progress, dispatch=self._post_to_main_thread)
+        future.add_progress_callback(self._on_profile_progress, dispatch=self._post_to_main_thread)
+        future.add_done_callback(self._on_fit_colmap_done, dispatch=self._post_to_main_thread)
+
+    def _post_to_main_thread(self, function):
+        gui.Application.instance.post_to_main_thread(self.window, function)
+
+    def _on_colmap_progress(self, event):
+        if event.profile is not None:
+            return
+        text = f"Running COLMAP: {event.stage}"
+        if event.total:
+            text += f" ({event.current}/{event.total})"
+        self._colmap_running_label.text = text
+
+    def _on_fit_colmap_done(self, future):
+        if future.exception() is not None:
+            self._colmap_running_label.text = f"COLMAP failed: {future.exception()}"
+            self._update_stages_label()
+        else:
+            self._result_fingerprint = self.colmap_api._reconstruction_fingerprint()
             self._add_geometries_from_colmap()
+            self._load_sub_models()
+            self._add_recent(self.colmap_api.data_path)
             self._colmap_running_label.text = 'Done!'
-            self._fit_colmap_ok_button.enabled = True
-            w.post_redraw()
-        else:
-            gui.Application.instance.post_to_main_thread(w, self._enable_colmap_ok_button_when_done)
+        self._fit_colmap_ok_button.enabled = True
+        self.window.post_redraw()
+
+    def _on_dense_button(self):
+        # Depth maps are computed on a process pool, the window stays responsive
+        self._dense_button.enabled = False
+        self._dense_label.text = "Dense: starting ..."
+        future = self.colmap_api.estimate_dense()
+        future.add_progress_callback(self._on_dense_progress, dispatch=self._post_to_main_thread)
+        future.add_progress_callback(self._on_profile_progress, dispatch=self._post_to_main_thread)
+        future.add_done_callback(self._on_dense_done, dispatch=self._post_to_main_thread)
+        self.window.set_needs_layout()
+
+    def _on_dense_progress(self, event):
+        if event.profile is not None:
+            return
+        text = f"Dense: {event.stage}"
+        if event.total:
+            text += f" ({event.current}/{event.total})"
+        self._dense_label.text = text
+
+    def _on_dense_done(self, future):
+        self._dense_button.enabled = self._frustum_rays is not None
+        if future.exception() is not None:
+            self._dense_label.text = f"Dense failed: {future.exception()}"
+            return
+        pcd = future.result()
+        if pcd is not self.colmap_api.dense_pcd:
+            # Another result was loaded meanwhile
+            self._dense_label.text = ""
+            return
+        self._show_dense_cloud(pcd)
+        self.window.post_redraw()
+
+    def _show_dense_cloud(self, pcd):
+        self._dense_label.text = f"Dense: {len(pcd.points)} points"
+        self._scene.scene.remove_geometry("__dense__")
+        self._scene.scene.add_geometry("__dense__", pcd, self.settings.material)
+        self._scene.scene.show_geometry("__dense__", self._show_dense.checked)
+        self._show_dense.enabled = True
+        self.window.set_needs_layout()
+
+    def _on_show_dense(self, is_checked):
+        if self._scene.scene.has_geometry("__dense__"):
+            self._scene.scene.show_geometry("__dense__", is_checked)
 
     def _on_colmap_matcher_change(self, name, index):
         self.colmap_api.matcher = name
+        self._update_stages_label()
 
     def _on_colmap_camera_model_change(self, name, index):
         self.colmap_api.camera_model = name
+        self._update_stages_label()
+
+    def _on_colmap_incremental(self, is_checked):
+        self.settings.incremental_reconstruction = is_checked
+
+    def _on_show_profile(self, is_checked):
+        self.settings.show_stage_timings = is_checked
+        self._profile_label.visible = is_checked
+        self.window.set_needs_layout()
+
+    def _clear_profile(self):
+        self._profile_lines = []
+        self._profile_label.text = ""
+
+    def _on_profile_progress(self, event):
+        if event.profile is not None:
+            self._add_profile_record(event.profile)
+
+    def _add_profile_record(self, record):
+        self._profile_lines.append(format_record(record))
+        self._profile_label.text = "\n".join(self._profile_lines)
+        if self.settings.show_stage_timings:
+            self.window.set_needs_layout()
+
+    def _on_colmap_downsample_change(self, name, index):
+        self.settings.image_downsample_factor = int(name)
+        self.colmap_api.downsample_factor = int(name)
+        self._update_stages_label()
+
+    def _update_stages_label(self):
+        # Stages a Fit Colmap run would reuse with the current folder and settings, the others run again. Listing
+        # and hashing the images takes a while on large folders, so it runs on a thread
+        colmap_api = self.colmap_api
+        try:
+            colmap_api.data_path
+        except ValueError:
+            self._stages_future = None
+            self._stages_label.text = ""
+            return
+        future = run_on_thread(colmap_api.stage_status)()
+        self._stages_future = future
+        future.add_done_callback(self._on_stage_status, dispatch=self._post_to_main_thread)
+
+    def _on_stage_status(self, future):
+        if future is not self._stages_future:
+            return
+        self._stages_future = None
+        if future.exception() is not None:
+            self._stages_label.text = ""
+            return
+        statuses = future.result()
+        cached = [stage for stage, status in statuses if status == 'cached']
+        pending = [stage for stage, status in statuses if status != 'cached']
+        text = f"Cached stages: {', '.join(cached) or 'none'}"
+        if len(pending) > 0:
+            text += f"\nTo run: {', '.join(pending)}"
+        self._stages_label.text = text
+        self.window.set_needs_layout()
 
     def _apply_settings(self):
         bg_color = [
@@ -273,6 +888,7 @@ class AppWindow:
 
         self._point_size.double_value = self.settings.material.point_size
         self._camera_size.double_value = self.settings.camera_size
+        self._adaptive_lod.checked = self.settings.adaptive_lod
 
     def _on_layout(self, layout_context):
         # The on_layout callback should set the frame (position + size) of every
@@ -336,6 +952,20 @@ class AppWindow:
         dlg.set_on_done(self._on_load_image_folder_dialog_done)
         self.window.show_dialog(dlg)
 
+    def _on_menu_open_video(self):
+        dlg = gui.FileDialog(
+            gui.FileDialog.OPEN,
+            "Choose video to load",
+            self.window.theme
+        )
+        dlg.add_filter(" ".join(VIDEO_EXTENSIONS), "Video files (" + ", ".join(VIDEO_EXTENSIONS) + ")")
+        dlg.add_filter("", "All files")
+
+        # A file dialog MUST define on_cancel and on_done functions
+        dlg.set_on_cancel(self._on_file_dialog_cancel)
+        dlg.set_on_done(self._on_load_video_dialog_done)
+        self.window.show_dialog(dlg)
+
     def _on_file_dialog_cancel(self):
         self.window.close_dialog()
 
@@ -346,7 +976,7 @@ class AppWindow:
     def _on_load_image_folder_dialog_done(self, data_path):
         self.window.close_dialog()
 
-        self.colmap_api.data_path = data_path
+        self._open_dataset(osp.abspath(data_path))
 
         # Verify if there is any image in this folder
         if len(self.colmap_api._list_images_in_folder(self.colmap_api.image_dir)) == 0:
@@ -371,6 +1001,58 @@ class AppWindow:
             self.window.show_dialog(dlg)
 
         self._fit_colmap_button.enabled = True
+        self._update_stages_label()
+
+    def _on_load_video_dialog_done(self, video_path):
+        self.window.close_dialog()
+
+        # The keyframes become the image folder of a dataset next to the video
+        data_path = osp.splitext(video_path)[0]
+        image_dir = osp.join(data_path, 'images')
+
+        em = self.window.theme.font_size
+        dlg = gui.Dialog("Video")
+
+        dlg_layout = gui.Vert(em / 2, gui.Margins(em, em, em, em))
+        self._video_label = gui.Label("Extracting keyframes. Please wait ...")
+        dlg_layout.add_child(self._video_label)
+
+        self._video_ok_button = gui.Button("Close")
+        self._video_ok_button.set_on_clicked(self._on_info_ok)
+        self._video_ok_button.enabled = False
+
+        h = gui.Horiz()
+        h.add_stretch()
+        h.add_child(self._video_ok_button)
+        h.add_stretch()
+        dlg_layout.add_child(h)
+
+        dlg.add_child(dlg_layout)
+        self.window.show_dialog(dlg)
+
+        future = run_on_thread(extract_keyframes)(video_path, image_dir)
+        future.add_progress_callback(self._on_video_progress, dispatch=self._post_to_main_thread)
+        future.add_done_callback(
+            lambda f: self._on_video_done(f, data_path), dispatch=self._post_to_main_thread)
+
+    def _on_video_progress(self, event):
+        text = f"Extracting keyframes: frame {event.current}"
+        if event.total:
+            text += f"/{event.total}"
+        self._video_label.text = text
+
+    def _on_video_done(self, future, data_path):
+        if future.exception() is not None:
+            self._video_label.text = f"Could not read the video: {future.exception()}"
+        elif future.result() == 0:
+            self._video_label.text = "No keyframe could be extracted from this video."
+        else:
+            self._open_dataset(osp.abspath(data_path))
+            self._fit_colmap_button.enabled = True
+            self._update_stages_label()
+            self._video_label.text = f"Extracted {future.result()} keyframes into {data_path}"
+        self._video_ok_button.enabled = True
+        self.window.post_redraw()
 
     def _on_menu_export(self):
         dlg = gui.FileDialog(gui.FileDialog.SAVE, "Choose file to save",
@@ -385,7 +1067,91 @@ class AppWindow:
         frame = self._scene.frame
         self.export_image(filename, frame.width, frame.height)
 
+    def _on_menu_export_flythrough(self):
+        self._show_export_views_dialog(self._on_export_flythrough_dialog_done)
+
+    def _on_menu_export_views(self):
+        self._show_export_views_dialog(self._on_export_views_dialog_done)
+
+    def _show_export_views_dialog(self, on_done):
+        if self.colmap_api.num_cameras == 0:
+            self.window.show_message_box("Error", "Fit COLMAP or open an existing result first.")
+            return
+
+        dlg = gui.FileDialog(gui.FileDialog.OPEN_DIR, "Choose folder to save the images",
+                             self.window.theme)
+        dlg.set_on_cancel(self._on_file_dialog_cancel)
+        dlg.set_on_done(on_done)
+        self.window.show_dialog(dlg)
+
+    def _on_export_flythrough_dialog_done(self, output_dir):
+        self.window.close_dialog()
+        self.export_views(output_dir, self._flythrough_views())
+
+    def _on_export_views_dialog_done(self, output_dir):
+        self.window.close_dialog()
+        self.export_views(output_dir, camera_views(self.colmap_api.cameras))
+
+    def export_views(self, output_dir, views):
+        ''' Render every modules.gui.export.View into output_dir, one view per redraw
+
+        The images are encoded and written on a thread pool. When too many of them wait to be written, rendering
+        pauses until one is done instead of blocking the event loop. For a renderer without any window, see
+        render.py.
+        '''
+        if self._flythrough is not None:
+            self._stop_flythrough()
+        os.makedirs(output_dir, exist_ok=True)
+        self._show_camera_texture(False)
+
+        bounds = self.colmap_api.bounds
+        frame = self._scene.frame
+        writer = ImageWriter(max_pending=self.settings.export_max_pending)
+        # Index of the next view to render, and whether a render request is in flight. Only used on the main thread
+        state = {'next': 0, 'rendering': False, 'done': False}
+
+        def render_next():
+            if state['rendering'] or state['done']:
+                return
+            i = state['next']
+            if i == len(views):
+                if writer.pending == 0:
+                    state['done'] = True
+                    try:
+                        writer.close()
+                        print(f'Exported {len(views)} images into {output_dir}')
+                    except OSError as e:
+                        self.window.show_message_box("Error", str(e))
+                    self._show_camera_texture(True)
+                    self._update_camera()
+                    self.window.post_redraw()
+                return
+            if not writer.has_capacity():
+                # Resumed by on_written
+                return
+
+            state['rendering'] = True
+            view = views[i]
+            self._scene.setup_camera(pinhole_intrinsic(view.intrinsic), view.extrinsic, bounds)
+
+            def on_image(image):
+                state['rendering'] = False
+                state['next'] = i + 1
+                writer.submit(osp.join(output_dir, view.name), image,
+                              on_written=lambda: self._post_to_main_thread(render_next))
+                self._post_to_main_thread(render_next)
+
+            self._scene.scene.scene.render_to_image(on_image)
+            self.window.post_redraw()
+
+        render_next()
+
+    def _on_close(self):
+        self._closing.set()
+        return True
+
     def _on_menu_quit(self):
+        self._closing.set()
         gui.Application.instance.quit()
 
     def _on_menu_toggle_settings_panel(self):
@@ -461,93 +1227,450 @@ class AppWindow:
 
     def _on_camera_list_change(self, name, index):
         self.colmap_api.activate_camera_name = name
+        if self._flythrough is not None:
+            self._stop_flythrough()
         self._update_camera()
+        self._load_camera_image()
 
     def load_existing_result(self, data_path):
-        self._scene.scene.clear_geometry()
+        data_path = osp.abspath(data_path)
+        self._open_dataset(data_path, keep_cached=True)
+        entry = self._recent_cache.take(data_path)
+        if entry is not None and self._is_entry_current(entry):
+            self._show_recent_entry(entry)
+            return
 
-        self.colmap_api.data_path = data_path
         if self.colmap_api.check_colmap_folder_valid():
-            self.colmap_api.estimate_cameras(recompute=False)
-            self._add_geometries_from_colmap()
+            self._clear_profile()
+            future = self.colmap_api.estimate_cameras(recompute=False)
+            self._load_future = future
+            future.add_progress_callback(self._on_profile_progress, dispatch=self._post_to_main_thread)
+            future.add_done_callback(self._on_load_existing_done, dispatch=self._post_to_main_thread)
+            self._load_sub_models()
         else:
             self.colmap_api.data_path = None
-            em = self.window.theme.font_size
-            dlg = gui.Dialog("Error")
-
-            # Add the text
-            dlg_layout = gui.Vert(em / 2, gui.Margins(em, em, em, em))
-            dlg_layout.add_child(gui.Label("Picked folder does not contain precomputed COLMAP data!"))
+            self._show_error_dialog("Picked folder does not contain precomputed COLMAP data!")
+
+    def _on_load_existing_done(self, future):
+        if future is not self._load_future:
+            # Another dataset was opened meanwhile
+            return
+        self._load_future = None
+        if future.exception() is not None:
+            self._show_error_dialog(f"Could not load the result: {future.exception()}")
+            return
+        self._result_fingerprint = self.colmap_api._reconstruction_fingerprint()
+        self._add_geometries_from_colmap()
+        self._add_recent(self.colmap_api.data_path)
+
+    def _create_colmap_api(self, camera_model, matcher):
+        colmap_api = ColmapAPI(
+            gpu_index=self.settings.DEFAULT_GPU_INDEX,
+            camera_model=camera_model,
+            matcher=matcher,
+            execution_mode=self.settings.DEFAULT_EXECUTION_MODE,
+            downsample_factor=self.settings.image_downsample_factor,
+        )
+        colmap_api.set_point_filters(self.settings.point_filters)
+        return colmap_api
+
+    def _open_dataset(self, data_path, keep_cached=False):
+        # Put the displayed reconstruction in the recent cache, clear the scene and give data_path a new API.
+        # A cached reconstruction of data_path is dropped unless keep_cached, it is about to be recomputed
+        if self._flythrough is not None:
+            self._stop_flythrough()
+        self._stash_current_result()
+        self._load_future = None
+        self._clear_model_geometries()
+        self._clear_sub_models()
+        self._scene.scene.clear_geometry()
+        self._clear_selection()
+        self._frustum_rays = None
+        self._result_fingerprint = None
+        self._clear_camera_image()
+        self._dense_button.enabled = False
+        if not keep_cached:
+            self._recent_cache.take(data_path)
+        self.colmap_api.data_path = data_path
 
-            ok = gui.Button("OK")
-            ok.set_on_clicked(self._on_error_ok)
+    def _stash_current_result(self):
+        colmap_api = self.colmap_api
+        # Only a displayed result that is not being recomputed is kept
+        if self._frustum_rays is not None and self._result_fingerprint is not None and colmap_api.estimate_done():
+            frustums = (self._frustum_centers, self._frustum_rays)
+            nbytes = colmap_api.memory_usage() + self._frustum_centers.nbytes + self._frustum_rays.nbytes
+            entry = RecentEntry(colmap_api, frustums, self._result_fingerprint, nbytes)
+            evicted = self._recent_cache.put(colmap_api.data_path, entry)
+            if len(evicted) > 0:
+                print('Evicted from the recent cache:', ', '.join(evicted))
+        # The settings picked in the panel carry over to the next dataset
+        self.colmap_api = self._create_colmap_api(colmap_api.camera_model, colmap_api.matcher)
+
+    @staticmethod
+    def _is_entry_current(entry):
+        # Whether the model on disk is still the one that was loaded
+        try:
+            return entry.colmap_api._reconstruction_fingerprint() == entry.fingerprint
+        except FileNotFoundError:
+            return False
+
+    def _show_recent_entry(self, entry):
+        # Everything is already loaded, only the scene is rebuilt
+        colmap_api = entry.colmap_api
+        colmap_api.camera_model = self.colmap_api.camera_model
+        colmap_api.matcher = self.colmap_api.matcher
+        colmap_api.downsample_factor = self.colmap_api.downsample_factor
+        self.colmap_api = colmap_api
+        self._result_fingerprint = entry.fingerprint
+
+        self._clear_profile()
+        self._add_geometries_from_colmap(entry.frustums)
+        self._load_sub_models()
+        self._add_recent(colmap_api.data_path)
+        if colmap_api.point_filters != self.settings.point_filters:
+            self._apply_point_filters()
+
+    def _add_recent(self, data_path):
+        if data_path in self._recent_paths:
+            self._recent_paths.remove(data_path)
+        self._recent_paths = [data_path] + self._recent_paths[:Settings.RECENT_MENU_SIZE - 1]
+        gui.Application.instance.menubar = self._build_menubar()
+
+    def _on_menu_recent(self, index):
+        if index < len(self._recent_paths):
+            self.load_existing_result(self._recent_paths[index])
+
+    def _on_recent_cache_mb(self, value):
+        self.settings.recent_cache_mb = int(value)
+        evicted = self._recent_cache.resize(self.settings.recent_cache_mb * 2 ** 20)
+        if len(evicted) > 0:
+            print('Evicted from the recent cache:', ', '.join(evicted))
+            gui.Application.instance.menubar = self._build_menubar()
+
+    def _show_error_dialog(self, message):
+        em = self.window.theme.font_size
+        dlg = gui.Dialog("Error")
 
-            h = gui.Horiz()
-            h.add_stretch()
-            h.add_child(ok)
-            h.add_stretch()
-            dlg_layout.add_child(h)
+        # Add the text
+        dlg_layout = gui.Vert(em / 2, gui.Margins(em, em, em, em))
+        dlg_layout.add_child(gui.Label(message))
 
-            dlg.add_child(dlg_layout)
-            self.window.show_dialog(dlg)
+        ok = gui.Button("OK")
+        ok.set_on_clicked(self._on_error_ok)
 
-    def _add_geometries_from_colmap(self):
-        w = self.window
-        if self.colmap_api.estimate_done():
-            self._scene.scene.add_geometry("__model__", self.colmap_api.pcd, self.settings.material)
+        h = gui.Horiz()
+        h.add_stretch()
+        h.add_child(ok)
+        h.add_stretch()
+        dlg_layout.add_child(h)
 
-            # Update camera list in GUI
-            if not hasattr(self, '_camera_list'):
-                self.colmap_ctrls.add_child(gui.Label("Camera list"))
-                self._camera_list = gui.Combobox()
-                self.colmap_ctrls.add_child(self._camera_list)
-                self._camera_list.set_on_selection_changed(self._on_camera_list_change)
+        dlg.add_child(dlg_layout)
+        self.window.show_dialog(dlg)
 
-            self._camera_list.clear_items()
-            for camera_name in self.colmap_api.camera_names:
-                self._camera_list.add_item(camera_name)
+    def _add_geometries_from_colmap(self, frustums=None):
+        # Called once the estimation future is done, on the main thread. frustums are the (centers, rays) of the
+        # cameras when they were already computed
+        if self._flythrough is not None:
+            self._stop_flythrough()
+
+        profiler = StageProfiler(
+            'display', on_record=lambda record: self._post_to_main_thread(lambda: self._add_profile_record(record)))
+        profiler.metadata['data_path'] = self.colmap_api.data_path
+
+        self._clear_selection()
+        self.colmap_api.build_spatial_index()
+        self._update_filter_label()
+        self._update_stages_label()
+
+        self._scene.scene.remove_geometry("__dense__")
+        self._show_dense.enabled = False
+        self._dense_label.text = ""
+        self._dense_button.enabled = True
+        if self.colmap_api.dense_pcd is not None:
+            self._show_dense_cloud(self.colmap_api.dense_pcd)
+
+        self._lod_fps_bias = 0
+        self._show_point_level(0, profiler)
+
+        # Update camera list in GUI
+        if not hasattr(self, '_camera_list'):
+            self.colmap_ctrls.add_child(gui.Label("Camera list"))
+            self._camera_list = gui.Combobox()
+            self.colmap_ctrls.add_child(self._camera_list)
+            self._camera_list.set_on_selection_changed(self._on_camera_list_change)
+
+            self._flythrough_button = gui.Button("Play fly-through")
+            self._flythrough_button.horizontal_padding_em = 0.2
+            self._flythrough_button.set_on_clicked(self._on_flythrough_button)
+            self.colmap_ctrls.add_child(self._flythrough_button)
+
+            self._show_camera_image = gui.Checkbox("Show image on camera")
+            self._show_camera_image.checked = self.settings.show_camera_image
+            self._show_camera_image.set_on_checked(self._on_show_camera_image)
+            self.colmap_ctrls.add_child(self._show_camera_image)
+            self._camera_image = gui.ImageWidget()
+            self._camera_image.visible = False
+            self.colmap_ctrls.add_child(self._camera_image)
+            self._thumbnails_label = gui.Label("")
+            self.colmap_ctrls.add_child(self._thumbnails_label)
+
+        self._camera_list.clear_items()
+        for camera_name in self.colmap_api.camera_names:
+            self._camera_list.add_item(camera_name)
 
+        with profiler.stage('cameras', cameras=self.colmap_api.num_cameras):
+            if frustums is None:
+                frustums = compute_frustum_rays(*self.colmap_api.stacked_camera_parameters())
+            self._frustum_centers, self._frustum_rays = frustums
+            self._camera_lines = None
             self._visualize_cameras()
-            self._update_camera()
+        self._update_camera()
+        self._build_thumbnails()
+        self._load_camera_image()
 
-            w = self.window  # to make the code more concise
-            w.set_needs_layout()
-        else:
-            gui.Application.instance.post_to_main_thread(w, self._add_geometries_from_colmap)
+        w = self.window  # to make the code more concise
+        w.set_needs_layout()
+
+    def _load_sub_models(self):
+        # Every sub-model is shown as soon as it is loaded, the smallest ones first
+        self._clear_sub_models()
+        future = self.colmap_api.load_sub_models()
+        self._sub_models_future = future
+        future.add_progress_callback(
+            lambda event: self._on_sub_model_loaded(future, event), dispatch=self._post_to_main_thread)
+        future.add_done_callback(self._on_sub_models_done, dispatch=self._post_to_main_thread)
+
+    def _on_sub_model_loaded(self, future, event):
+        if future is not self._sub_models_future:
+            return
+        sub_model = self.colmap_api.sub_models[event.message]
+        name = sub_model.name
+        cameras = sub_model.cameras
+        self._sub_model_visible[name] = True
+        self._sub_model_frustums[name] = compute_frustum_rays(
+            cameras.intrinsics, cameras.rotations, cameras.translations)
+        self._add_sub_model_geometry(name, f"__sub_model_{name}__", sub_model.pcd)
+        self._add_sub_model_geometry(
+            name, f"__sub_model_{name}_cameras__", self._frustum_line_set(*self._sub_model_frustums[name]))
+
+        cell = gui.CheckableTextTreeCell(
+            f"Model {name}: {len(cameras)} images, {len(sub_model.pcd.points)} points", True,
+            lambda is_checked, name=name: self._on_show_sub_model(name, is_checked))
+        self._sub_models_tree.add_item(self._sub_models_tree.get_root_item(), cell)
+        self._sub_models_label.visible = True
+        self._sub_models_tree.visible = True
+
+        if self._frustum_rays is None and len(self._sub_model_frustums) == 1:
+            # Something to look at while the main reconstruction is still loading
+            bounds = sub_model.pcd.get_axis_aligned_bounding_box()
+            self._scene.setup_camera(60, bounds, bounds.get_center())
+        self.window.set_needs_layout()
+
+    def _on_sub_models_done(self, future):
+        if future is not self._sub_models_future:
+            return
+        if future.exception() is not None:
+            self._sub_models_label.text = f"Other models could not be loaded: {future.exception()}"
+            self._sub_models_label.visible = True
+            self.window.set_needs_layout()
+
+    def _on_show_sub_model(self, name, is_checked):
+        self._sub_model_visible[name] = is_checked
+        for geometry_name in [f"__sub_model_{name}__", f"__sub_model_{name}_cameras__"]:
+            self._scene.scene.show_geometry(geometry_name, is_checked)
+
+    def _add_sub_model_geometry(self, name, geometry_name, geometry):
+        self._scene.scene.remove_geometry(geometry_name)
+        self._scene.scene.add_geometry(geometry_name, geometry, self.settings.material)
+        self._scene.scene.show_geometry(geometry_name, self._sub_model_visible[name])
+
+    def _clear_sub_models(self):
+        self._sub_models_future = None
+        for name in self._sub_model_visible:
+            self._scene.scene.remove_geometry(f"__sub_model_{name}__")
+            self._scene.scene.remove_geometry(f"__sub_model_{name}_cameras__")
+        self._sub_model_visible = {}
+        self._sub_model_frustums = {}
+        self._sub_models_tree.clear()
+        self._sub_models_label.text = "Other models"
+        self._sub_models_label.visible = False
+        self._sub_models_tree.visible = False
+
+    def _clear_model_geometries(self):
+        # Invalidates any chunk stream that is still running
+        self._point_stream_id += 1
+        for name in self._model_geometry_names:
+            self._scene.scene.remove_geometry(name)
+        self._model_geometry_names = []
+
+    @run_on_thread
+    def _stream_point_chunks(self, stream_id, level, profiler=None):
+        # Chunks are converted on this thread and handed to the main thread one at a time, so the UI
+        # stays responsive and at most one chunk waits for upload
+        w = self.window
+        stage = contextlib.nullcontext() if profiler is None else \
+            profiler.stage('upload points', points=self.colmap_api.lod_num_points(level), level=level)
+        with stage:
+            for i, chunk in enumerate(self.colmap_api.iter_point_chunks(self.settings.point_chunk_size, level)):
+                if stream_id != self._point_stream_id:
+                    return
+
+                uploaded = threading.Event()
+
+                def add_chunk(name=f"__model_{i}__", chunk=chunk):
+                    if stream_id == self._point_stream_id:
+                        self._scene.scene.add_geometry(name, chunk, self.settings.material)
+                        self._model_geometry_names.append(name)
+                        w.post_redraw()
+                    uploaded.set()
+
+                gui.Application.instance.post_to_main_thread(w, add_chunk)
+                while not uploaded.wait(AppWindow.CHUNK_UPLOAD_POLL_INTERVAL):
+                    # add_chunk may never run once the window closes, and is not needed once the stream is replaced
+                    if self._closing.is_set() or stream_id != self._point_stream_id:
+                        return
+                if profiler is not None:
+                    profiler.count(chunks=i + 1)
+
+        if profiler is not None:
+            profiler.append_to(self.colmap_api.trace_path)
 
     def _update_camera(self):
-        bounds = self._scene.scene.bounding_box
+        bounds = self.colmap_api.bounds
         # self._scene.setup_camera(60, bounds, bounds.get_center())
 
         intrinsics, extrinsics = self.colmap_api.extract_camera_parameters(self.colmap_api.activate_camera_name)
         self._scene.setup_camera(intrinsics, extrinsics, bounds)
 
+    def _frustum_line_set(self, centers, rays, line_set=None):
+        # Reuses the lines of line_set when given, only the points depend on the camera size
+        if line_set is None:
+            line_set = o3d.geometry.LineSet()
+            line_set.lines = o3d.utility.Vector2iVector(compute_frustum_lines(len(rays)))
+
+        line_set.points = o3d.utility.Vector3dVector(compute_frustum_points(centers, rays, self.settings.camera_size))
+        line_set.paint_uniform_color([
+            self.settings.camera_color.red,
+            self.settings.camera_color.green,
+            self.settings.camera_color.blue,
+        ])
+        return line_set
+
     def _visualize_cameras(self):
-        for camera_name in self.colmap_api.camera_names:
-            intrinsics, extrinsics = self.colmap_api.extract_camera_parameters(camera_name)
-            camera_lines = o3d.geometry.LineSet.create_camera_visualization(
-                view_width_px=intrinsics.width,
-                view_height_px=intrinsics.height,
-                intrinsic=intrinsics.intrinsic_matrix,
-                extrinsic=extrinsics,
-                scale=self.settings.camera_size
-            )
-            r = self.settings.camera_color.red
-            g = self.settings.camera_color.green
-            b = self.settings.camera_color.blue
-            camera_lines.colors = o3d.utility.Vector3dVector(
-                [np.array([r, g, b]),] * 8
-            )
-            self._scene.scene.remove_geometry(f"__cam{camera_name}__")
-            self._scene.scene.add_geometry(f"__cam{camera_name}__", camera_lines, self.settings.material)
+        for name, (centers, rays) in self._sub_model_frustums.items():
+            self._add_sub_model_geometry(name, f"__sub_model_{name}_cameras__", self._frustum_line_set(centers, rays))
+
+        if self._frustum_rays is None:
+            return
+
+        self._camera_lines = self._frustum_line_set(self._frustum_centers, self._frustum_rays, self._camera_lines)
+        self._scene.scene.remove_geometry("__cameras__")
+        self._scene.scene.add_geometry("__cameras__", self._camera_lines, self.settings.material)
+        self._add_camera_texture()
+
+    def _build_thumbnails(self):
+        # Every image gets its thumbnails on a thread, the selected camera makes its own without waiting
+        colmap_api = self.colmap_api
+        if self._thumbnails is None or self._thumbnails.thumbnail_dir != colmap_api.thumbnail_dir:
+            self._thumbnails = ThumbnailCache(colmap_api.image_dir, colmap_api.thumbnail_dir)
+        elif self._thumbnails_future is not None and not self._thumbnails_future.done():
+            return
+
+        image_paths = colmap_api._list_images_in_folder(colmap_api.image_dir)
+        future = run_on_thread(build_thumbnails)(image_paths, colmap_api.thumbnail_dir, colmap_api._num_workers)
+        self._thumbnails_future = future
+        future.add_progress_callback(
+            lambda event: self._on_thumbnails_progress(future, event), dispatch=self._post_to_main_thread)
+        future.add_done_callback(self._on_thumbnails_done, dispatch=self._post_to_main_thread)
+
+    def _on_thumbnails_progress(self, future, event):
+        if future is self._thumbnails_future:
+            self._thumbnails_label.text = f"Thumbnails: {event.current}/{event.total}"
+
+    def _on_thumbnails_done(self, future):
+        if future is not self._thumbnails_future:
+            return
+        if future.exception() is not None:
+            self._thumbnails_label.text = f"Thumbnails failed: {future.exception()}"
+        else:
+            self._thumbnails_label.text = ""
+
+    def _load_camera_image(self):
+        # The thumbnails of the selected camera are decoded on a thread, only the larger one when it is drawn
+        name = self.colmap_api.activate_camera_name
+        future = run_on_thread(self._read_camera_image)(self._thumbnails, name, self.settings.show_camera_image)
+        self._camera_image_future = future
+        future.add_done_callback(
+            lambda future: self._on_camera_image_loaded(future, name), dispatch=self._post_to_main_thread)
+
+    @staticmethod
+    def _read_camera_image(thumbnails, name, with_texture):
+        image = thumbnails.get(name, THUMBNAIL_SIZES[-1])
+        texture = thumbnails.get(name, THUMBNAIL_SIZES[0]) if with_texture else None
+        return image, texture
+
+    def _on_camera_image_loaded(self, future, name):
+        if future is not self._camera_image_future:
+            return
+        self._camera_image_future = None
+        image, texture = (None, None) if future.exception() is not None else future.result()
+
+        self._camera_image.visible = image is not None
+        if image is not None:
+            self._camera_image.update_image(image)
+        self._camera_image_name = name
+        self._camera_texture = texture
+        self._add_camera_texture()
+        self.window.set_needs_layout()
+
+    def _on_show_camera_image(self, is_checked):
+        self.settings.show_camera_image = is_checked
+        if not is_checked:
+            self._scene.scene.remove_geometry("__camera_image__")
+        elif self._frustum_rays is not None:
+            self._load_camera_image()
+
+    def _add_camera_texture(self):
+        # The thumbnail is drawn over the far end of the frustum of its camera, half transparent so the points
+        # behind it stay visible
+        self._scene.scene.remove_geometry("__camera_image__")
+        if not self.settings.show_camera_image or self._camera_texture is None or self._frustum_rays is None:
+            return
+        if self._camera_image_name not in self.colmap_api.cameras:
+            # Refitted without that camera, the new selection brings its own image
+            return
+
+        index = self.colmap_api.cameras.index(self._camera_image_name)
+        vertices = compute_image_quad(
+            self._frustum_centers[index], self._frustum_rays[index], self.settings.camera_size)
+        mesh = o3d.geometry.TriangleMesh(
+            o3d.utility.Vector3dVector(vertices), o3d.utility.Vector3iVector(IMAGE_QUAD_TRIANGLES))
+        mesh.triangle_uvs = o3d.utility.Vector2dVector(IMAGE_QUAD_UVS)
+
+        material = rendering.MaterialRecord()
+        material.shader = "defaultUnlitTransparency"
+        material.base_color = [1.0, 1.0, 1.0, self.settings.camera_image_opacity]
+        material.albedo_img = self._camera_texture
+        self._scene.scene.add_geometry("__camera_image__", mesh, material)
+        self._show_camera_texture(self._flythrough is None)
+
+    def _show_camera_texture(self, show):
+        if self._scene.scene.has_geometry("__camera_image__"):
+            self._scene.scene.show_geometry("__camera_image__", show)
+
+    def _clear_camera_image(self):
+        self._thumbnails_future = None
+        self._camera_image_future = None
+        self._camera_image_name = None
+        self._camera_texture = None
+        self._scene.scene.remove_geometry("__camera_image__")
+        if hasattr(self, '_camera_image'):
+            self._camera_image.visible = False
+            self._thumbnails_label.text = ""
 
     def export_image(self, path, width, height):
         def on_image(image):
-            img = image
-
-            quality = 9  # png
-            if path.endswith(".jpg"):
-                quality = 100
-            o3d.io.write_image(path, img, quality)
+            # Encoding a large frame takes a while, keep it off the main thread
+            run_on_thread(write_image)(path, image)
 
         self._scene.scene.scene.render_to_image(on_image)
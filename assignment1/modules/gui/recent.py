@@ -0,0 +1,52 @@
+import collections
+
+
+# A reconstruction kept in memory: the ColmapAPI holding it, the frustum (centers, rays) computed from its cameras,
+# the fingerprint of the model it was loaded from and its estimated size in bytes
+RecentEntry = collections.namedtuple('RecentEntry', ['colmap_api', 'frustums', 'fingerprint', 'nbytes'])
+
+
+class RecentCache:
+    ''' Loaded reconstructions by data path, the least recently used being evicted beyond max_bytes
+
+    An entry larger than the whole budget is evicted right away, so the cache never holds more than max_bytes.
+    '''
+    def __init__(self, max_bytes):
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    def resize(self, max_bytes):
+        ''' Change the budget, returning the keys evicted to fit in it '''
+        self._max_bytes = max_bytes
+        return self._evict()
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def put(self, key, entry):
+        ''' Add or refresh an entry, returning the keys evicted to make room for it '''
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        return self._evict()
+
+    def take(self, key):
+        ''' Remove and return the entry of key, None if it is not cached '''
+        return self._entries.pop(key, None)
+
+    def _evict(self):
+        evicted = []
+        while len(self._entries) > 0 and self.nbytes > self._max_bytes:
+            key, _ = self._entries.popitem(last=False)
+            evicted.append(key)
+        return evicted
@@ -1,6 +1,9 @@
 import open3d.visualization.gui as gui
 import open3d.visualization.rendering as rendering
 
+from modules.colmap.point_filters import DEFAULT_FILTERS
+from modules.gui.export import DEFAULT_MAX_PENDING
+
 
 class Settings:
     UNLIT = "defaultUnlit"
@@ -10,7 +13,25 @@ class Settings:
 
     DEFAULT_GPU_INDEX = 0
 
+    # Run the reconstruction in a worker process so its Python work does not hold the GIL of the GUI
+    DEFAULT_EXECUTION_MODE = 'process'
+
     DEFAULT_DOWNSAMPLE_FACTOR = 1
+    DOWNSAMPLE_FACTORS = [DEFAULT_DOWNSAMPLE_FACTOR, 2, 4, 8]
+
+    DEFAULT_POINT_CHUNK_SIZE = 250000
+
+    DEFAULT_TARGET_FPS = 30
+
+    # Time the fly-through takes to go from one camera to the next
+    DEFAULT_FLYTHROUGH_SECONDS_PER_CAMERA = 0.5
+
+    # Radius of the selection and half size of the crop box, as a fraction of the scene diagonal
+    DEFAULT_SELECTION_SIZE = 0.05
+
+    # Memory budget of the reconstructions kept loaded for instant switching, and datasets listed in File/Recent
+    DEFAULT_RECENT_CACHE_MB = 2048
+    RECENT_MENU_SIZE = 8
 
     DEFAULT_CAMERA_MODEL = "OPENCV"
     CAMERA_MODELS = [
@@ -28,7 +49,8 @@ class Settings:
     COLMAP_MATCHERS = [
         DEFAULT_COLMAP_MATCHER,
         'vocab_tree_matcher',
-        'sequential_matcher'
+        'sequential_matcher',
+        'auto'
     ]
 
     DEFAULT_MATERIAL_NAME = "Polished ceramic [default]"
@@ -92,7 +114,31 @@ class Settings:
         self.camera_size = 0.3
         self.apply_camera = False
 
-        self.image_downsample_factor = 0
+        self.image_downsample_factor = Settings.DEFAULT_DOWNSAMPLE_FACTOR
+        self.incremental_reconstruction = True
+
+        self.point_chunk_size = Settings.DEFAULT_POINT_CHUNK_SIZE
+
+        self.adaptive_lod = True
+        self.target_fps = Settings.DEFAULT_TARGET_FPS
+
+        self.show_stage_timings = False
+
+        self.flythrough_seconds_per_camera = Settings.DEFAULT_FLYTHROUGH_SECONDS_PER_CAMERA
+        self.export_max_pending = DEFAULT_MAX_PENDING
+
+        self.selection_size = Settings.DEFAULT_SELECTION_SIZE
+        self.selection_color = gui.Color(1.0, 0.85, 0.0)
+
+        self.recent_cache_mb = Settings.DEFAULT_RECENT_CACHE_MB
+
+        # Draw the image of the selected camera at the end of its frustum
+        self.show_camera_image = False
+        self.camera_image_opacity = 0.7
+
+        # Thresholds of all the point filters, and the active ones
+        self.filter_thresholds = dict(DEFAULT_FILTERS)
+        self.point_filters = {}
 
         self.material = rendering.MaterialRecord()
         self.material.base_color = [0.9, 0.9, 0.9, 1.0]
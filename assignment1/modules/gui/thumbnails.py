@@ -0,0 +1,191 @@
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import numpy as np
+import open3d as o3d
+import os
+import os.path as osp
+import threading
+
+from modules.colmap.preprocess import DECODABLE_EXTENSIONS
+from utils.thread_utils import report_progress
+
+
+# Longest side in pixels of every level of the pyramid, each level being downsampled from the one before it
+THUMBNAIL_SIZES = [512, 256]
+
+# Decoded thumbnails kept in memory by a ThumbnailCache
+MAX_LOADED_THUMBNAILS = 64
+
+# The manifest is saved after every this many thumbnails, so an interrupted build keeps most of its work
+MANIFEST_SAVE_INTERVAL = 100
+
+MANIFEST_NAME = 'manifest.json'
+
+# First bytes of the files open3d decodes. They are checked before decoding, because libjpeg ends the whole
+# process on a file that does not start like a JPEG
+IMAGE_SIGNATURES = {'.jpg': b'\xff\xd8\xff', '.jpeg': b'\xff\xd8\xff', '.png': b'\x89PNG\r\n\x1a\n'}
+
+
+def thumbnail_path(thumbnail_dir, name, size):
+    return osp.join(thumbnail_dir, str(size), name + '.jpg')
+
+
+def build_thumbnails(image_paths, thumbnail_dir, num_workers=None):
+    ''' Write every level of the thumbnail pyramid of every image into thumbnail_dir
+
+    Images whose size and modification time match the manifest are skipped, so only new or modified images are
+    decoded. Images open3d cannot decode get no thumbnail, they are recorded in the manifest and only tried
+    again once modified. Returns the number of images whose thumbnails were made.
+    '''
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    manifest_path = osp.join(thumbnail_dir, MANIFEST_NAME)
+    manifest = {}
+    if osp.isfile(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+    if manifest.get('sizes') != THUMBNAIL_SIZES:
+        manifest = {}
+    entries = manifest.get('images', {})
+    failed = manifest.get('failed', {})
+
+    sources, todo = {}, []
+    for path in image_paths:
+        name = osp.basename(path)
+        if osp.splitext(name)[1].lower() not in DECODABLE_EXTENSIONS:
+            continue
+        stat = os.stat(path)
+        sources[name] = [stat.st_size, stat.st_mtime_ns]
+        built = all(osp.isfile(thumbnail_path(thumbnail_dir, name, size)) for size in THUMBNAIL_SIZES)
+        if failed.get(name) == sources[name]:
+            continue
+        if entries.get(name) != sources[name] or not built:
+            todo.append(path)
+
+    # Remove the thumbnails of images that are gone
+    entries = {name: source for name, source in entries.items() if name in sources}
+    failed = {name: source for name, source in failed.items() if name in sources}
+    for size in THUMBNAIL_SIZES:
+        size_dir = osp.join(thumbnail_dir, str(size))
+        if osp.isdir(size_dir):
+            for file_name in os.listdir(size_dir):
+                if osp.splitext(file_name)[0] not in sources:
+                    os.remove(osp.join(size_dir, file_name))
+
+    def save_manifest():
+        tmp_path = f'{manifest_path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'sizes': THUMBNAIL_SIZES, 'images': entries, 'failed': failed}, f)
+        os.replace(tmp_path, manifest_path)
+
+    made = 0
+    if len(todo) > 0:
+        print(f'Making thumbnails of {len(todo)} images into {thumbnail_dir}')
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=context) as pool:
+            jobs = {pool.submit(make_thumbnails, path, thumbnail_dir): osp.basename(path) for path in todo}
+            for i, job in enumerate(concurrent.futures.as_completed(jobs)):
+                name = jobs[job]
+                try:
+                    job.result()
+                except OSError as e:
+                    print(f'Could not make the thumbnails of {name}: {e}')
+                    failed[name] = sources[name]
+                except concurrent.futures.process.BrokenProcessPool:
+                    # A decoder ended its worker, the images left are tried again by the next build
+                    print(f'A thumbnail worker stopped while making the thumbnails of {name}')
+                    break
+                else:
+                    entries[name] = sources[name]
+                    made += 1
+                report_progress('thumbnails', i + 1, len(todo))
+                if (i + 1) % MANIFEST_SAVE_INTERVAL == 0:
+                    save_manifest()
+    save_manifest()
+    return made
+
+
+def make_thumbnails(path, thumbnail_dir):
+    ''' Write every level of the thumbnail pyramid of the image at path, raising OSError if it cannot be read '''
+    signature = IMAGE_SIGNATURES.get(osp.splitext(path)[1].lower())
+    if signature is not None:
+        with open(path, 'rb') as f:
+            if f.read(len(signature)) != signature:
+                raise OSError(f'{path} is not a {osp.splitext(path)[1][1:].upper()} image')
+    image = o3d.t.io.read_image(path)
+    if image.is_empty():
+        raise OSError(f'Could not read {path}')
+
+    # JPEG only stores 8-bit gray or color images
+    pixels = image.as_tensor().numpy()
+    if pixels.dtype == np.uint16:
+        pixels = (pixels // 257).astype(np.uint8)
+    if pixels.ndim == 3 and pixels.shape[2] in (2, 4):
+        pixels = pixels[:, :, :pixels.shape[2] - 1]
+    image = o3d.t.geometry.Image(o3d.core.Tensor(np.ascontiguousarray(pixels)))
+
+    name = osp.basename(path)
+    for size in THUMBNAIL_SIZES:
+        scale = size / max(image.rows, image.columns)
+        if scale < 1:
+            image = image.resize(scale, o3d.t.geometry.InterpType.Super)
+        output_path = thumbnail_path(thumbnail_dir, name, size)
+        os.makedirs(osp.dirname(output_path), exist_ok=True)
+        # Written under another name first, so a thumbnail that was interrupted while saving is never read
+        tmp_path = f'{output_path}.{os.getpid()}.{threading.get_ident()}.tmp.jpg'
+        o3d.t.io.write_image(tmp_path, image, 90)
+        os.replace(tmp_path, output_path)
+
+
+class ThumbnailCache:
+    ''' Thumbnails of the images of image_dir, decoded on first use and kept up to capacity in memory
+
+    A thumbnail that was not built yet is made right away, so it does not have to wait for build_thumbnails.
+    It is safe to call get from several threads.
+    '''
+    def __init__(self, image_dir, thumbnail_dir, capacity=MAX_LOADED_THUMBNAILS):
+        self._image_dir = image_dir
+        self._thumbnail_dir = thumbnail_dir
+        self._capacity = capacity
+        self._images = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def thumbnail_dir(self):
+        return self._thumbnail_dir
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, name, size):
+        ''' The thumbnail of the image name at a size of THUMBNAIL_SIZES as an open3d.geometry.Image, or None
+        if the image cannot be decoded '''
+        key = (name, size)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+
+        path = thumbnail_path(self._thumbnail_dir, name, size)
+        if not osp.isfile(path):
+            source_path = osp.join(self._image_dir, name)
+            if not osp.isfile(source_path) or osp.splitext(name)[1].lower() not in DECODABLE_EXTENSIONS:
+                return None
+            try:
+                make_thumbnails(source_path, self._thumbnail_dir)
+            except OSError as e:
+                print(f'Could not make the thumbnails of {name}: {e}')
+                return None
+        image = o3d.io.read_image(path)
+        if image.is_empty():
+            return None
+
+        with self._lock:
+            self._images[key] = image
+            while len(self._images) > self._capacity:
+                self._images.popitem(last=False)
+        return image
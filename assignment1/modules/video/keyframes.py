@@ -0,0 +1,142 @@
+import json
+import numpy as np
+import open3d as o3d
+import os
+import os.path as osp
+import subprocess
+
+from utils.thread_utils import report_progress
+
+
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
+
+# Width of the grayscale frames the metrics are computed on
+ANALYSIS_WIDTH = 160
+
+
+def probe_video(path):
+    ''' Return the width, height, frame rate and (estimated) number of frames of a video using ffprobe
+
+    The size is the one of the frames ffmpeg decodes, which are rotated upright when the video carries a
+    rotation, as phones recording in portrait do.
+    '''
+    args = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,avg_frame_rate,nb_frames,duration:stream_tags=rotate'
+                         ':stream_side_data=rotation',
+        '-of', 'json', path,
+    ]
+    try:
+        output = subprocess.run(args, check=True, capture_output=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError('Could not find ffprobe, please install ffmpeg')
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f'ffprobe failed on {path}: {e.stderr.decode(errors="ignore").strip()}')
+
+    streams = json.loads(output).get('streams', [])
+    if len(streams) == 0:
+        raise RuntimeError(f'No video stream in {path}')
+    stream = streams[0]
+
+    num, den = stream.get('avg_frame_rate', '0/1').split('/')
+    fps = float(num) / float(den) if float(den) != 0 else 0.0
+    num_frames = int(stream.get('nb_frames', 0) or 0)
+    if num_frames == 0 and fps > 0:
+        num_frames = int(float(stream.get('duration', 0) or 0) * fps)
+    width, height = int(stream['width']), int(stream['height'])
+    if video_rotation(stream) % 180 == 90:
+        width, height = height, width
+    return width, height, fps, num_frames
+
+
+def video_rotation(stream):
+    ''' Rotation in degrees of a stream as reported by ffprobe, from its display matrix or its rotate tag '''
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            return int(round(float(side_data['rotation']))) % 360
+    return int(stream.get('tags', {}).get('rotate', 0) or 0) % 360
+
+
+def iter_video_frames(path, width, height):
+    ''' Decode a video lazily, yielding one (height, width, 3) uint8 RGB frame at a time '''
+    args = ['ffmpeg', '-v', 'error', '-i', path, '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    frame_size = width * height * 3
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, bufsize=frame_size)
+    try:
+        while True:
+            buffer = process.stdout.read(frame_size)
+            if len(buffer) < frame_size:
+                break
+            yield np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+def analysis_frame(frame):
+    ''' Small grayscale float32 copy of a frame, subsampled by striding '''
+    step = max(1, frame.shape[1] // ANALYSIS_WIDTH)
+    return frame[::step, ::step].mean(axis=2, dtype=np.float32)
+
+
+def sharpness(gray):
+    ''' Variance of the Laplacian, higher is sharper '''
+    laplacian = gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1] - 4 * gray[1:-1, 1:-1]
+    return float(laplacian.var())
+
+
+def motion(gray, reference):
+    ''' Mean absolute intensity change between two analysis frames, in [0, 1] '''
+    return float(np.abs(gray - reference).mean()) / 255.0
+
+
+def select_keyframes(frames, min_motion=0.04, max_motion=0.15, window=15):
+    ''' Pick keyframes from an iterable of frames, yielding (index, frame)
+
+    Frames that barely moved since the last keyframe are dropped. Once the motion exceeds min_motion, the
+    sharpest frame among the next `window` candidates is kept, or earlier if the motion reaches max_motion.
+    Only the current best candidate is held in memory.
+    '''
+    reference = None
+    best = None
+    num_candidates = 0
+
+    for index, frame in enumerate(frames):
+        gray = analysis_frame(frame)
+        frame_motion = 1.0 if reference is None else motion(gray, reference)
+        if best is None and frame_motion < min_motion:
+            continue
+
+        score = sharpness(gray)
+        if best is None or score > best[0]:
+            best = (score, index, frame, gray)
+        num_candidates += 1
+
+        if num_candidates >= window or frame_motion >= max_motion:
+            _, best_index, best_frame, reference = best
+            yield best_index, best_frame
+            best = None
+            num_candidates = 0
+
+    if best is not None:
+        yield best[1], best[2]
+
+
+def extract_keyframes(video_path, image_dir, **selection_kwargs):
+    ''' Stream a video and write its keyframes into image_dir, returning the number of written frames '''
+    width, height, _, num_frames = probe_video(video_path)
+    os.makedirs(image_dir, exist_ok=True)
+
+    def frames():
+        for index, frame in enumerate(iter_video_frames(video_path, width, height)):
+            if index % 30 == 0:
+                report_progress('extract frames', index, num_frames)
+            yield frame
+
+    count = 0
+    for index, frame in select_keyframes(frames(), **selection_kwargs):
+        o3d.t.io.write_image(osp.join(image_dir, f'frame_{index:06d}.jpg'), o3d.t.geometry.Image(frame), 95)
+        count += 1
+    print(f'Extracted {count} keyframes from {video_path} into {image_dir}')
+    return count
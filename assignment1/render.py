@@ -0,0 +1,59 @@
+import argparse
+
+from modules.colmap.api import ColmapAPI
+from modules.gui.export import DEFAULT_MAX_PENDING, camera_views, flythrough_views, read_views, render_offscreen
+from modules.gui.settings import Settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Render views of an existing reconstruction to image files, without a window.')
+    parser.add_argument('data_path', help='Dataset folder with precomputed COLMAP results')
+    parser.add_argument('output_dir', help='Folder receiving the images')
+    parser.add_argument('--views', default='flythrough',
+                        help='"flythrough" for frame_000000.png, frame_000001.png, ... along the cameras, '
+                             '"cameras" for <image name>.png from every reconstructed camera, or a JSON file '
+                             'listing image names and/or {"name", "extrinsic", "intrinsic"} objects')
+    parser.add_argument('--width', type=int, default=1280,
+                        help='Width of the frames, the height follows the aspect ratio of the first camera')
+    parser.add_argument('--fps', type=int, default=Settings.DEFAULT_TARGET_FPS,
+                        help='Frames per second of the fly-through')
+    parser.add_argument('--seconds-per-camera', type=float, default=Settings.DEFAULT_FLYTHROUGH_SECONDS_PER_CAMERA,
+                        help='Time spent going from one camera to the next')
+    parser.add_argument('--show-cameras', action='store_true',
+                        help='Draw the camera frusta as well')
+    parser.add_argument('--writers', type=int, default=None,
+                        help='Threads encoding the images')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='Rendered images waiting to be written, rendering pauses when reached')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    api = ColmapAPI(
+        gpu_index=None,
+        camera_model=Settings.DEFAULT_CAMERA_MODEL,
+        matcher=Settings.DEFAULT_COLMAP_MATCHER,
+    )
+    api.data_path = args.data_path
+    if not api.check_colmap_folder_valid():
+        raise ValueError(f'{args.data_path} does not contain precomputed COLMAP data')
+    api.estimate_cameras(recompute=False).result()
+
+    if args.views == 'flythrough':
+        samples_per_camera = max(1, int(round(args.seconds_per_camera * args.fps)))
+        views = flythrough_views(api.cameras, samples_per_camera, api.cameras.intrinsics[0])
+    elif args.views == 'cameras':
+        views = camera_views(api.cameras)
+    else:
+        views = read_views(args.views, api.cameras)
+
+    print(f'Rendering {len(views)} views into {args.output_dir}')
+    render_offscreen(
+        api, Settings(), views, args.output_dir, args.width, args.show_cameras, args.writers, args.max_pending)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import contextlib
+import numpy as np
+import os
+import os.path as osp
+import pytest
+import sqlite3
+import sys
+
+# Modules are imported from the project folder, as when running main.py from it
+sys.path.insert(0, osp.dirname(osp.dirname(osp.abspath(__file__))))
+
+
+def write_text_model(model_dir, num_images, num_points, seed=0):
+    ''' Write a COLMAP text model and return its points as (xyz, rgb)
+
+    Image i is img<i>.jpg, a 640x480 PINHOLE camera looking down z from (i, 0, 0). Every point is observed by the
+    first three images.
+    '''
+    rng = np.random.default_rng(seed)
+    xyz = rng.uniform([-1, -1, 4], [1, 1, 6], (num_points, 3))
+    rgb = rng.integers(0, 256, (num_points, 3))
+    os.makedirs(model_dir, exist_ok=True)
+    with open(osp.join(model_dir, 'cameras.txt'), 'w') as f:
+        for i in range(num_images):
+            f.write(f'{i + 1} PINHOLE 640 480 500 500 320 240\n')
+    with open(osp.join(model_dir, 'images.txt'), 'w') as f:
+        for i in range(num_images):
+            f.write(f'{i + 1} 1 0 0 0 {-i} 0 0 {i + 1} img{i:03d}.jpg\n\n')
+    with open(osp.join(model_dir, 'points3D.txt'), 'w') as f:
+        track = ' '.join(f'{image_id} 0' for image_id in range(1, min(num_images, 3) + 1))
+        for i in range(num_points):
+            f.write(f'{i + 1} {" ".join(map(str, xyz[i]))} {" ".join(map(str, rgb[i]))} 0.5 {track}\n')
+    return xyz, rgb
+
+
+@pytest.fixture
+def text_model():
+    return write_text_model
+
+
+def write_image_database(database_path, names):
+    ''' Write a COLMAP database holding only the images table, with image ids from 1 in the order of names '''
+    with contextlib.closing(sqlite3.connect(database_path)) as db:
+        db.execute('CREATE TABLE images (image_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+        db.executemany('INSERT INTO images (name) VALUES (?)', [(name,) for name in names])
+        db.commit()
+
+
+@pytest.fixture
+def image_database():
+    return write_image_database
@@ -0,0 +1,82 @@
+import json
+import numpy as np
+import os
+
+from modules.colmap.api import ColmapAPI
+
+
+API_KWARGS = {'gpu_index': None, 'camera_model': 'OPENCV', 'matcher': 'exhaustive_matcher'}
+
+
+def load_api(tmp_path, text_model, num_images=3, num_points=10):
+    ''' A ColmapAPI that loaded the text model written into tmp_path, and the points of that model '''
+    xyz, rgb = text_model(str(tmp_path / 'colmap' / 'sparse' / '0'), num_images, num_points)
+    os.makedirs(tmp_path / 'images')
+    api = ColmapAPI(**API_KWARGS)
+    api.data_path = str(tmp_path)
+    api.estimate_cameras(recompute=False).result()
+    return api, xyz, rgb
+
+
+def test_iter_point_chunks_covers_the_cloud_in_order(tmp_path, text_model):
+    api, xyz, rgb = load_api(tmp_path, text_model)
+    chunks = list(api.iter_point_chunks(chunk_size=4))
+    assert [len(chunk.points) for chunk in chunks] == [4, 4, 2]
+    np.testing.assert_allclose(np.concatenate([np.asarray(chunk.points) for chunk in chunks]), xyz, rtol=1e-6)
+    np.testing.assert_allclose(np.concatenate([np.asarray(chunk.colors) for chunk in chunks]), rgb / 255.0)
+
+
+def test_bounds_and_num_points(tmp_path, text_model):
+    api, xyz, _ = load_api(tmp_path, text_model)
+    assert api.num_points == len(xyz)
+    np.testing.assert_allclose(api.bounds.min_bound, xyz.min(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(api.bounds.max_bound, xyz.max(axis=0), rtol=1e-6)
+
+
+def test_stacked_camera_parameters_follow_the_camera_names(tmp_path, text_model):
+    api, _, _ = load_api(tmp_path, text_model)
+    intrinsics, rotations, translations = api.stacked_camera_parameters()
+    assert api.camera_names == ['img000.jpg', 'img001.jpg', 'img002.jpg']
+    np.testing.assert_allclose(intrinsics, np.tile([640, 480, 500, 500, 320, 240], (3, 1)))
+    np.testing.assert_allclose(rotations, np.tile(np.eye(3), (3, 1, 1)))
+    np.testing.assert_allclose(translations[:, 0], [0, -1, -2])
+
+
+def test_find_new_images_lists_the_images_added_since_the_last_run(tmp_path, text_model, image_database):
+    text_model(str(tmp_path / 'colmap' / 'sparse' / '0'), 3, 10)
+    os.makedirs(tmp_path / 'images')
+    names = ['img000.jpg', 'img001.jpg', 'img002.jpg', 'img003.jpg']
+    for name in names:
+        (tmp_path / 'images' / name).write_bytes(b'')
+    api = ColmapAPI(**API_KWARGS)
+    api.data_path = str(tmp_path)
+    image_database(api.database_path, names[:3])
+    with open(api.run_parameters_path, 'w') as f:
+        json.dump(api._run_parameters(), f)
+    assert api._find_new_images(api.image_dir) == ['img003.jpg']
+
+    # A full run is needed with other parameters, or once an image was removed
+    api.matcher = 'sequential_matcher'
+    assert api._find_new_images(api.image_dir) is None
+    api.matcher = 'exhaustive_matcher'
+    os.remove(tmp_path / 'images' / 'img000.jpg')
+    assert api._find_new_images(api.image_dir) is None
+
+
+def test_the_largest_model_is_the_main_one_and_the_others_are_sub_models(tmp_path, text_model):
+    sparse_dir = tmp_path / 'colmap' / 'sparse'
+    text_model(str(sparse_dir / '0'), 2, 5)
+    text_model(str(sparse_dir / '1'), 3, 20)
+    text_model(str(sparse_dir / '2'), 2, 10)
+    os.makedirs(tmp_path / 'images')
+    api = ColmapAPI(**API_KWARGS)
+    api.data_path = str(tmp_path)
+    assert api.model_dir == str(sparse_dir / '1')
+    assert api.sub_model_dirs == [str(sparse_dir / '0'), str(sparse_dir / '2')]
+
+    future = api.load_sub_models()
+    assert sorted(future.result(timeout=60)) == ['0', '2']
+    sub_models = api.sub_models
+    assert len(sub_models['0'].pcd.points) == 5 and len(sub_models['2'].pcd.points) == 10
+    assert sub_models['2'].cameras.names == ['img000.jpg', 'img001.jpg']
+    assert future.progress.total == 2
@@ -0,0 +1,35 @@
+import pytest
+
+from batch import run_job
+from modules.colmap.api import ColmapAPI
+from modules.colmap.stages import STAGES
+
+
+API_KWARGS = {'gpu_index': None, 'camera_model': 'OPENCV', 'matcher': 'exhaustive_matcher'}
+
+
+@pytest.fixture
+def api_state(monkeypatch):
+    state = {'status': 'cached', 'ran': False}
+
+    def estimate_cameras(self, recompute, incremental=False):
+        state['ran'] = True
+        raise RuntimeError('ran')
+
+    monkeypatch.setattr(ColmapAPI, 'check_colmap_folder_valid', lambda self: True)
+    monkeypatch.setattr(ColmapAPI, 'is_cache_valid', lambda self: True)
+    monkeypatch.setattr(ColmapAPI, 'stage_status', lambda self: [(stage, state['status']) for stage in STAGES])
+    monkeypatch.setattr(ColmapAPI, '_estimate_cameras', estimate_cameras)
+    return state
+
+
+def test_run_job_skips_up_to_date_datasets(tmp_path, api_state):
+    entry = run_job(str(tmp_path), API_KWARGS, recompute=False, incremental=True)
+    assert entry['status'] == 'skipped' and not api_state['ran']
+
+
+def test_run_job_resumes_datasets_made_with_other_settings(tmp_path, api_state):
+    # The cached model is still valid, but the stages say it was made with another matcher
+    api_state['status'] = 'stale'
+    entry = run_job(str(tmp_path), dict(API_KWARGS, matcher='sequential_matcher'), recompute=False, incremental=True)
+    assert api_state['ran'] and entry['status'] == 'failed' and entry['error'] == 'ran'
@@ -0,0 +1,35 @@
+import numpy as np
+
+from benchmarks.run_benchmarks import BENCHMARKS, compare_to_baseline, run_benchmarks
+from benchmarks.synthetic import make_reconstruction
+
+
+def test_synthetic_cameras_look_at_the_origin():
+    reconstruction = make_reconstruction(50, 100)
+    rotations, translations = reconstruction['rotations'], reconstruction['translations']
+    np.testing.assert_allclose(np.einsum('nij,nkj->nik', rotations, rotations), np.tile(np.eye(3), (50, 1, 1)),
+                               atol=1e-12)
+    # The origin is 5 in front of every camera, on its optical axis
+    np.testing.assert_allclose(translations, np.tile([0, 0, 5.0], (50, 1)), atol=1e-12)
+    assert reconstruction['xyz'].shape == (100, 3) and len(reconstruction['image_names']) == 50
+
+
+def test_every_benchmark_runs_on_a_small_scene():
+    results = run_benchmarks([(10, 1000)], list(BENCHMARKS), repeat=1)
+    assert [entry['name'] for entry in results] == list(BENCHMARKS)
+    assert all(entry['cameras'] == 10 and entry['points'] == 1000 for entry in results)
+    assert all(entry['median_seconds'] >= 0 for entry in results)
+
+
+def test_compare_to_baseline_reports_slowdowns_beyond_the_tolerance():
+    baseline = {'results': [
+        {'name': 'frustums', 'cameras': 10, 'points': 1000, 'median_seconds': 1.0},
+        {'name': 'cache_load', 'cameras': 10, 'points': 1000, 'median_seconds': 1.0},
+    ]}
+    results = [
+        {'name': 'frustums', 'cameras': 10, 'points': 1000, 'median_seconds': 1.1},
+        {'name': 'cache_load', 'cameras': 10, 'points': 1000, 'median_seconds': 1.5},
+        {'name': 'point_chunks', 'cameras': 10, 'points': 1000, 'median_seconds': 9.0},
+    ]
+    regressions = compare_to_baseline(results, baseline, 0.2)
+    assert [(entry['name'], reference) for entry, reference in regressions] == [('cache_load', 1.0)]
@@ -0,0 +1,80 @@
+import numpy as np
+
+from modules.colmap import cache
+from modules.colmap.cache import CACHE_ARRAYS, ReconstructionCache, compute_fingerprint
+
+
+def make_reconstruction(num_points=10, num_images=3):
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(2, 4, num_points)
+    return {
+        'image_names': [f'img{i}.jpg' for i in range(num_images)],
+        'xyz': rng.random((num_points, 3)),
+        'rgb': rng.integers(0, 255, (num_points, 3)),
+        'errors': rng.random(num_points),
+        'track_offsets': np.concatenate([[0], np.cumsum(lengths)]),
+        'track_images': rng.integers(0, num_images, lengths.sum()),
+        'rotations': np.tile(np.eye(3), (num_images, 1, 1)),
+        'translations': rng.random((num_images, 3)),
+        'intrinsics': rng.random((num_images, 6)),
+    }
+
+
+def test_cache_round_trip(tmp_path):
+    reconstruction = make_reconstruction()
+    store = ReconstructionCache(str(tmp_path / 'cache'))
+    assert not store.is_valid('abc')
+
+    store.save(reconstruction, 'abc')
+    assert store.is_valid('abc') and not store.is_valid('other')
+    loaded = store.load()
+    assert loaded['image_names'] == reconstruction['image_names']
+    for name, dtype in CACHE_ARRAYS.items():
+        assert isinstance(loaded[name], np.memmap) and loaded[name].dtype == dtype
+        np.testing.assert_allclose(loaded[name], np.asarray(reconstruction[name], dtype=dtype))
+
+
+def test_cache_of_another_version_is_invalid(tmp_path, monkeypatch):
+    store = ReconstructionCache(str(tmp_path / 'cache'))
+    store.save(make_reconstruction(), 'abc')
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    assert not store.is_valid('abc')
+
+
+def test_cache_with_a_broken_manifest_is_invalid(tmp_path):
+    store = ReconstructionCache(str(tmp_path / 'cache'))
+    store.save(make_reconstruction(), 'abc')
+    with open(store.manifest_path, 'w') as f:
+        f.write('{')
+    assert not store.is_valid('abc')
+    assert store.read_manifest() is None
+
+
+def test_lod_levels_are_dropped_with_the_reconstruction(tmp_path):
+    store = ReconstructionCache(str(tmp_path / 'cache'))
+    store.save(make_reconstruction(), 'abc')
+    levels = [(0.5, np.zeros((4, 3)), np.zeros((4, 3))), (1.0, np.ones((2, 3)), np.ones((2, 3)))]
+    store.save_lod(levels)
+    loaded = store.load_lod()
+    assert [voxel_size for voxel_size, _, _ in loaded] == [0.5, 1.0]
+    np.testing.assert_array_equal(loaded[1][1], np.ones((2, 3)))
+
+    store.save(make_reconstruction(), 'def')
+    assert store.load_lod() is None
+
+
+def test_masks_round_trip(tmp_path):
+    store = ReconstructionCache(str(tmp_path / 'cache'))
+    store.save(make_reconstruction(), 'abc')
+    assert store.load_mask('error_1') is None
+    store.save_mask('error_1', [True, False, True])
+    np.testing.assert_array_equal(store.load_mask('error_1'), [True, False, True])
+
+
+def test_fingerprint_changes_with_the_files(tmp_path):
+    path = tmp_path / 'points3D.bin'
+    path.write_bytes(b'abc')
+    fingerprint = compute_fingerprint([str(path)])
+    assert compute_fingerprint([str(path)]) == fingerprint
+    path.write_bytes(b'abcd')
+    assert compute_fingerprint([str(path)]) != fingerprint
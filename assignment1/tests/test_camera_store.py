@@ -0,0 +1,40 @@
+import numpy as np
+
+from modules.colmap.camera_store import CameraTable
+
+
+def make_table():
+    # The identity and a rotation of 90 degrees around y
+    rotations = np.array([np.eye(3), [[0.0, 0, 1], [0, 1, 0], [-1, 0, 0]]])
+    translations = np.array([[1.0, 2.0, 3.0], [0.0, 0.0, 1.0]])
+    intrinsics = np.array([[640, 480, 500, 510, 320, 240], [800, 600, 700, 700, 400, 300]], dtype=np.float64)
+    return CameraTable(['a.jpg', 'b.jpg'], intrinsics, rotations, translations)
+
+
+def test_lookup_by_name():
+    cameras = make_table()
+    assert len(cameras) == 2 and 'b.jpg' in cameras and 'c.jpg' not in cameras
+    assert cameras.index('b.jpg') == 1
+    np.testing.assert_array_equal(cameras.indices(['b.jpg', 'a.jpg']), [1, 0])
+
+
+def test_matrices_and_centers():
+    cameras = make_table()
+    extrinsics = cameras.extrinsic_matrices()
+    np.testing.assert_allclose(extrinsics[:, :3, :3], cameras.rotations)
+    np.testing.assert_allclose(extrinsics[:, :3, 3], cameras.translations)
+    np.testing.assert_allclose(cameras.intrinsic_matrices([0])[0], [[500, 0, 320], [0, 510, 240], [0, 0, 1]])
+
+    # The center is the point the world-to-camera transform brings to the origin
+    centers = cameras.centers()
+    camera_centers = np.einsum('nij,nj->ni', cameras.rotations, centers) + cameras.translations
+    np.testing.assert_allclose(camera_centers, 0, atol=1e-12)
+
+
+def test_camera_dict_and_pinhole_intrinsic():
+    cameras = make_table()
+    camera = cameras.camera_dict('a.jpg')
+    assert camera['intrinsic'] == {'width': 640, 'height': 480, 'fx': 500, 'fy': 510, 'cx': 320, 'cy': 240}
+    intrinsic = cameras.pinhole_intrinsic('b.jpg')
+    assert (intrinsic.width, intrinsic.height) == (800, 600)
+    assert cameras.pinhole_intrinsic('b.jpg') is intrinsic
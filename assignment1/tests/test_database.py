@@ -0,0 +1,7 @@
+from modules.colmap.database import read_image_names
+
+
+def test_read_image_names(tmp_path, image_database):
+    database_path = str(tmp_path / 'database.db')
+    image_database(database_path, ['b.jpg', 'a.jpg'])
+    assert read_image_names(database_path) == {'b.jpg': 1, 'a.jpg': 2}
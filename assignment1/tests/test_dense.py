@@ -0,0 +1,47 @@
+import numpy as np
+
+from modules.colmap.dense import depth_map_path, select_sources
+
+
+def tracks_to_arrays(tracks):
+    offsets = np.concatenate([[0], np.cumsum([len(track) for track in tracks])]).astype(np.int64)
+    images = np.concatenate([np.asarray(track, dtype=np.int64) for track in tracks])
+    return offsets, images
+
+
+def covisibility_sources(tracks, num_images, num_sources):
+    covisibility = np.zeros((num_images, num_images))
+    for track in tracks:
+        for a in track:
+            for b in track:
+                if a != b:
+                    covisibility[a, b] += 1
+    order = np.argsort(-covisibility, axis=1, kind='stable')[:, :num_sources]
+    return [row[covisibility[i, row] > 0] for i, row in enumerate(order)]
+
+
+def test_select_sources_ranks_images_by_shared_points():
+    tracks = [[0, 1], [0, 1], [0, 2], [1, 2, 3]]
+    offsets, images = tracks_to_arrays(tracks)
+    sources = select_sources(offsets, images, 5, 2)
+    assert [list(row) for row in sources] == [[1, 2], [0, 2], [0, 1], [1, 2], []]
+
+
+def test_select_sources_matches_the_dense_covisibility_for_any_chunking():
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        num_images = int(rng.integers(2, 20))
+        tracks = [rng.choice(num_images, size=int(rng.integers(1, min(num_images, 5) + 1)), replace=False)
+                  for _ in range(int(rng.integers(1, 200)))]
+        offsets, images = tracks_to_arrays(tracks)
+        expected = covisibility_sources(tracks, num_images, 3)
+        for max_pairs in (1, 7, 1 << 22):
+            sources = select_sources(offsets, images, num_images, 3, max_pairs=max_pairs)
+            assert len(sources) == num_images
+            for row, expected_row in zip(sources, expected):
+                np.testing.assert_array_equal(row, expected_row)
+
+
+def test_depth_map_path_keeps_images_of_the_same_stem_apart():
+    paths = {depth_map_path('depth', name) for name in ['a.jpg', 'a.png', 'a.JPG']}
+    assert len(paths) == 3
@@ -0,0 +1,71 @@
+import json
+import numpy as np
+import open3d as o3d
+import pytest
+import threading
+
+from modules.colmap.camera_store import CameraTable
+from modules.gui import export
+from modules.gui.export import ImageWriter, camera_views, flythrough_views, read_views, write_image
+
+
+def make_cameras(count):
+    ''' Cameras looking down z from (i, 0, 0) '''
+    translations = np.zeros((count, 3))
+    translations[:, 0] = -np.arange(count)
+    intrinsics = np.tile([640.0, 480, 500, 500, 320, 240], (count, 1))
+    return CameraTable([f'img{i}.jpg' for i in range(count)], intrinsics, np.tile(np.eye(3), (count, 1, 1)),
+                       translations)
+
+
+def test_flythrough_goes_through_every_camera():
+    cameras = make_cameras(3)
+    views = flythrough_views(cameras, 4, cameras.intrinsics[0])
+    assert [view.name for view in views[:2]] == ['frame_000000.png', 'frame_000001.png'] and len(views) == 9
+    np.testing.assert_allclose([view.extrinsic for view in views[::4]], cameras.extrinsic_matrices(), atol=1e-12)
+    np.testing.assert_allclose(views[1].extrinsic[:3, 3], [-0.25, 0, 0], atol=1e-12)
+
+
+def test_camera_views_and_views_read_from_json(tmp_path):
+    cameras = make_cameras(3)
+    views = camera_views(cameras, ['img2.jpg'])
+    assert views[0].name == 'img2.png'
+    np.testing.assert_allclose(views[0].extrinsic, cameras.extrinsic_matrices()[2])
+
+    path = tmp_path / 'views.json'
+    path.write_text(json.dumps(['img1.jpg', {'name': 'top.png', 'extrinsic': np.eye(4).tolist()}]))
+    views = read_views(str(path), cameras)
+    assert [view.name for view in views] == ['img1.png', 'top.png']
+    np.testing.assert_allclose(views[1].intrinsic, cameras.intrinsics[0])
+
+
+def test_write_image_as_png(tmp_path):
+    pixels = np.full((8, 10, 3), 100, dtype=np.uint8)
+    path = str(tmp_path / 'frame.png')
+    write_image(path, o3d.geometry.Image(pixels))
+    np.testing.assert_array_equal(np.asarray(o3d.io.read_image(path)), pixels)
+
+
+def test_image_writer_bounds_the_pending_images(tmp_path, monkeypatch):
+    release = threading.Event()
+    written = []
+
+    def slow_write(path, image):
+        release.wait(10)
+        written.append(path)
+    monkeypatch.setattr(export, 'write_image', slow_write)
+
+    writer = ImageWriter(num_workers=1, max_pending=2)
+    writer.submit('a.png', None)
+    writer.submit('b.png', None)
+    assert not writer.has_capacity() and writer.pending == 2
+    release.set()
+    writer.close()
+    assert sorted(written) == ['a.png', 'b.png'] and writer.pending == 0
+
+
+def test_image_writer_raises_the_write_errors_on_close(tmp_path):
+    writer = ImageWriter(num_workers=1)
+    writer.submit(str(tmp_path / 'missing' / 'frame.png'), o3d.geometry.Image(np.zeros((4, 4, 3), dtype=np.uint8)))
+    with pytest.raises(OSError):
+        writer.close()
@@ -0,0 +1,72 @@
+import json
+import numpy as np
+import os
+import os.path as osp
+
+from modules.colmap import feature_store
+from modules.colmap.feature_store import FeatureStore, extractor_key, hash_images
+
+
+def write_bytes(path, data):
+    os.makedirs(osp.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def count_hashed_files(monkeypatch):
+    hashed = []
+    hash_file = feature_store.hash_file
+    monkeypatch.setattr(feature_store, 'hash_file', lambda path: hashed.append(path) or hash_file(path))
+    return hashed
+
+
+def test_hash_images_only_reads_new_or_modified_images(tmp_path, monkeypatch):
+    memo_path = str(tmp_path / 'hashes.json')
+    a = write_bytes(str(tmp_path / 'images' / 'a.jpg'), b'a')
+    b = write_bytes(str(tmp_path / 'images' / 'b.jpg'), b'b')
+    hashed = count_hashed_files(monkeypatch)
+
+    first = hash_images([a, b], memo_path)
+    assert set(first) == {'a.jpg', 'b.jpg'} and first['a.jpg'] != first['b.jpg']
+    assert hash_images([a, b], memo_path) == first
+    assert len(hashed) == 2
+
+    write_bytes(b, b'modified')
+    assert hash_images([a, b], memo_path)['b.jpg'] != first['b.jpg']
+    assert len(hashed) == 3
+
+
+def test_hash_images_keeps_images_of_the_same_name_in_other_folders(tmp_path, monkeypatch):
+    # The original images and their downsampled copies share the memo of a dataset
+    memo_path = str(tmp_path / 'hashes.json')
+    original = write_bytes(str(tmp_path / 'images' / 'x.jpg'), b'original')
+    downsampled = write_bytes(str(tmp_path / 'images_2' / 'x.jpg'), b'small')
+    hashed = count_hashed_files(monkeypatch)
+
+    for _ in range(3):
+        hash_images([original], memo_path)
+        hash_images([downsampled], memo_path)
+    assert len(hashed) == 2
+
+    with open(memo_path, 'r') as f:
+        assert set(json.load(f)) == {original, downsampled}
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
+
+
+def test_feature_store_round_trip(tmp_path):
+    store = FeatureStore(str(tmp_path), extractor_key({'max_num_features': 100}))
+    keypoints = np.random.rand(5, 6).astype(np.float32)
+    descriptors = np.random.randint(0, 255, (5, 128)).astype(np.uint8)
+    assert not store.contains('ab12')
+
+    store.save('ab12', keypoints, descriptors)
+    assert store.contains('ab12')
+    loaded_keypoints, loaded_descriptors = store.load('ab12')
+    np.testing.assert_array_equal(loaded_keypoints, keypoints)
+    np.testing.assert_array_equal(loaded_descriptors, descriptors)
+
+
+def test_extractor_key_depends_on_the_options():
+    assert extractor_key({'a': 1, 'b': 2}) == extractor_key({'b': 2, 'a': 1})
+    assert extractor_key({'a': 1}) != extractor_key({'a': 2})
@@ -0,0 +1,28 @@
+import numpy as np
+
+from utils.geometry_utils import FRUSTUM_LINES, compute_frustum_lines, compute_frustum_points, compute_frustum_rays
+
+
+def test_frustum_rays_go_through_the_image_corners():
+    intrinsics = [[640, 480, 500, 400, 320, 240]]
+    # Rotated by 90 degrees around z, with its center at (1, 2, 3)
+    rotations = np.array([[[0.0, 1, 0], [-1, 0, 0], [0, 0, 1]]])
+    translations = -np.einsum('nij,nj->ni', rotations, [[1.0, 2, 3]])
+    centers, rays = compute_frustum_rays(intrinsics, rotations, translations)
+    np.testing.assert_allclose(centers, [[1, 2, 3]])
+
+    corners = np.array([[-0.64, -0.6, 1], [0.64, -0.6, 1], [0.64, 0.6, 1], [-0.64, 0.6, 1]])
+    np.testing.assert_allclose(rays[0], corners @ rotations[0])
+
+
+def test_frustum_points_and_lines_of_every_camera():
+    centers = np.array([[0.0, 0, 0], [10, 0, 0]])
+    rays = np.tile([[-1.0, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]], (2, 1, 1))
+    points = compute_frustum_points(centers, rays, 0.5)
+    assert points.shape == (10, 3)
+    np.testing.assert_allclose(points[5], [10, 0, 0])
+    np.testing.assert_allclose(points[7], [10.5, -0.5, 0.5])
+
+    lines = compute_frustum_lines(2)
+    np.testing.assert_array_equal(lines[:len(FRUSTUM_LINES)], FRUSTUM_LINES)
+    np.testing.assert_array_equal(lines[len(FRUSTUM_LINES):], FRUSTUM_LINES + 5)
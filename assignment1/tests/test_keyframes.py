@@ -0,0 +1,48 @@
+import json
+import numpy as np
+import subprocess
+
+from modules.video import keyframes
+from modules.video.keyframes import probe_video, select_keyframes
+
+
+def fake_ffprobe(monkeypatch, stream):
+    def run(args, **kwargs):
+        return subprocess.CompletedProcess(args, 0, stdout=json.dumps({'streams': [stream]}).encode())
+    monkeypatch.setattr(keyframes.subprocess, 'run', run)
+
+
+def test_probe_video_reads_the_stream(monkeypatch):
+    fake_ffprobe(monkeypatch, {'width': 1920, 'height': 1080, 'avg_frame_rate': '30/1', 'nb_frames': '300'})
+    assert probe_video('video.mp4') == (1920, 1080, 30.0, 300)
+
+
+def test_probe_video_swaps_the_size_of_portrait_phone_videos(monkeypatch):
+    # ffmpeg rotates the decoded frames upright, so they are 1080 wide and 1920 high
+    stream = {'width': 1920, 'height': 1080, 'avg_frame_rate': '30/1', 'nb_frames': '300',
+              'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}]}
+    fake_ffprobe(monkeypatch, stream)
+    assert probe_video('video.mp4')[:2] == (1080, 1920)
+
+    fake_ffprobe(monkeypatch, dict(stream, side_data_list=[], tags={'rotate': '270'}))
+    assert probe_video('video.mp4')[:2] == (1080, 1920)
+
+    fake_ffprobe(monkeypatch, dict(stream, side_data_list=[{'rotation': 180}]))
+    assert probe_video('video.mp4')[:2] == (1920, 1080)
+
+
+def test_probe_video_estimates_the_number_of_frames_from_the_duration(monkeypatch):
+    fake_ffprobe(monkeypatch, {'width': 64, 'height': 48, 'avg_frame_rate': '25/1', 'duration': '2.0'})
+    assert probe_video('video.mkv') == (64, 48, 25.0, 50)
+
+
+def test_select_keyframes_skips_still_frames_and_keeps_the_sharpest():
+    rng = np.random.default_rng(0)
+    sharp = rng.integers(0, 255, (48, 64, 3)).astype(np.uint8)
+    blurry = np.full((48, 64, 3), 128, dtype=np.uint8)
+    blurry[:, 32:] = 100
+    frames = [sharp] * 5 + [blurry, 255 - sharp, blurry]
+
+    selected = [index for index, _ in select_keyframes(frames, min_motion=0.04, max_motion=1.0, window=3)]
+    # The first frame, nothing while the video stands still, then the sharpest of the next three candidates
+    assert selected == [0, 6]
@@ -0,0 +1,31 @@
+import numpy as np
+
+from modules.colmap.lod import build_lod_pyramid, voxel_downsample
+
+
+def test_voxel_downsample_averages_each_voxel():
+    xyz = np.array([[0.1, 0.1, 0.1], [0.3, 0.3, 0.3], [1.5, 0.1, 0.1]])
+    rgb = np.array([[0, 0, 0], [100, 200, 50], [255, 255, 255]], dtype=np.uint8)
+    down_xyz, down_rgb = voxel_downsample(xyz, rgb, 1.0)
+    order = np.argsort(down_xyz[:, 0])
+    np.testing.assert_allclose(down_xyz[order], [[0.2, 0.2, 0.2], [1.5, 0.1, 0.1]], rtol=1e-6)
+    np.testing.assert_array_equal(down_rgb[order], [[50, 100, 25], [255, 255, 255]])
+    assert down_xyz.dtype == np.float32 and down_rgb.dtype == np.uint8
+
+
+def test_lod_pyramid_halves_the_points_at_every_level():
+    rng = np.random.default_rng(0)
+    xyz = rng.random((20000, 3)).astype(np.float32)
+    rgb = rng.integers(0, 255, (20000, 3)).astype(np.uint8)
+    levels = build_lod_pyramid(xyz, rgb, min_points=1000)
+
+    assert len(levels) > 0
+    sizes = [len(xyz)] + [len(level_xyz) for _, level_xyz, _ in levels]
+    assert all(smaller <= larger // 2 for larger, smaller in zip(sizes, sizes[1:]))
+    assert all(a < b for (a, _, _), (b, _, _) in zip(levels, levels[1:]))
+    assert sizes[-2] > 1000
+
+
+def test_small_clouds_have_no_lod_levels():
+    xyz = np.random.default_rng(0).random((100, 3))
+    assert build_lod_pyramid(xyz, np.zeros((100, 3), dtype=np.uint8), min_points=1000) == []
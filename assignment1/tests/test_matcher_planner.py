@@ -0,0 +1,86 @@
+import struct
+
+from modules.colmap.matcher_planner import (
+    EXHAUSTIVE_LIMIT, SEQUENTIAL_OVERLAP, _filename_sequence_order, _sequential_pairs, plan_matching, read_exif)
+
+
+def numbered_images(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f'DSC_{i + 1:04d}.JPG'
+        path.write_bytes(b'')
+        paths.append(str(path))
+    return paths
+
+
+def exif_jpeg(date):
+    ''' Bytes of a JPEG whose only content is an EXIF DateTime '''
+    value = date.encode('ascii') + b'\x00'
+    # Little endian TIFF header, then IFD0 with a single ASCII entry whose value follows the IFD
+    tiff = b'II*\x00' + struct.pack('<I', 8) + struct.pack('<HHHII', 1, 0x0132, 2, len(value), 26)
+    tiff += struct.pack('<I', 0) + value
+    return b'\xff\xd8\xff\xe1' + struct.pack('>H', 8 + len(tiff)) + b'Exif\x00\x00' + tiff + b'\xff\xd9'
+
+
+def timed_images(tmp_path, count):
+    paths = []
+    for i in range(count):
+        # Shot in the reverse order of their names
+        path = tmp_path / f'IMG_{i:04d}.JPG'
+        path.write_bytes(exif_jpeg(f'2024:01:01 12:{(count - i) // 60:02d}:{(count - i) % 60:02d}'))
+        paths.append(str(path))
+    return paths
+
+
+def test_small_datasets_are_matched_exhaustively(tmp_path):
+    plan = plan_matching(numbered_images(tmp_path, EXHAUSTIVE_LIMIT))
+    assert plan.strategies == ['exhaustive'] and plan.pairs is None
+    assert plan.estimated_pairs == EXHAUSTIVE_LIMIT * (EXHAUSTIVE_LIMIT - 1) // 2
+
+
+def test_numbered_file_names_alone_are_matched_exhaustively(tmp_path):
+    # Camera photo collections are numbered too, without retrieval a sequence plan could not connect them
+    plan = plan_matching(numbered_images(tmp_path, 2 * EXHAUSTIVE_LIMIT), vocab_path=str(tmp_path / 'missing.bin'))
+    assert plan.strategies == ['exhaustive'] and plan.pairs is None
+    assert 'unordered' in plan.reason
+
+
+def test_numbered_file_names_with_retrieval_are_matched_in_sequence(tmp_path):
+    vocab_path = tmp_path / 'vocab.bin'
+    vocab_path.write_bytes(b'')
+    paths = numbered_images(tmp_path, 2 * EXHAUSTIVE_LIMIT)
+    plan = plan_matching(paths, vocab_path=str(vocab_path))
+    assert plan.strategies == ['sequential (file names)', 'retrieval (vocab tree)'] and plan.use_vocab_tree
+    assert ('DSC_0001.JPG', 'DSC_0002.JPG') in plan.pairs
+    # Loop closure pairs far along the sequence
+    assert ('DSC_0001.JPG', f'DSC_{1 + 2 ** 7:04d}.JPG') in plan.pairs
+
+
+def test_capture_times_order_the_images(tmp_path):
+    paths = timed_images(tmp_path, 2 * EXHAUSTIVE_LIMIT)
+    assert read_exif(paths[0])[0] > read_exif(paths[1])[0]
+    plan = plan_matching(paths)
+    assert plan.strategies == ['sequential (timestamps)']
+    assert ('IMG_0000.JPG', 'IMG_0001.JPG') in plan.pairs
+    assert ('IMG_0000.JPG', f'IMG_{2 ** 7:04d}.JPG') in plan.pairs
+
+
+def test_images_without_capture_time_are_not_left_out_of_the_sequence(tmp_path):
+    paths = timed_images(tmp_path, 2 * EXHAUSTIVE_LIMIT)
+    with open(paths[5], 'wb') as f:
+        f.write(b'\xff\xd8\xff\xd9')
+    plan = plan_matching(paths)
+    assert plan.strategies == ['exhaustive'] and plan.pairs is None
+
+
+def test_sequential_pairs_add_quadratic_overlap():
+    pairs = _sequential_pairs(list(range(1000)))
+    neighbors = sorted(j for i, j in pairs if i == 0)
+    assert neighbors == list(range(1, SEQUENTIAL_OVERLAP + 1)) + [2 ** k for k in range(4, SEQUENTIAL_OVERLAP)]
+    assert all(i < j for i, j in pairs)
+
+
+def test_filename_sequence_order():
+    assert _filename_sequence_order(['frame_3.png', 'frame_1.png', 'frame_2.png']) == [1, 2, 0]
+    assert _filename_sequence_order(['a.png', 'b.png']) is None
+    assert _filename_sequence_order(['x_1.png', 'x_100.png', 'x_5000.png']) is None
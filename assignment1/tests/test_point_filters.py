@@ -0,0 +1,51 @@
+import numpy as np
+
+from modules.colmap.point_filters import (
+    error_mask, mask_key, statistical_mask, track_length_mask, triangulation_angles)
+
+
+def test_error_and_track_length_masks():
+    np.testing.assert_array_equal(error_mask([0.5, 2.0, 3.0], 2.0), [True, True, False])
+    np.testing.assert_array_equal(track_length_mask([0, 2, 5, 6], 2), [True, True, False])
+
+
+def test_triangulation_angles_of_tracks_up_to_three_images():
+    centers = np.array([[-1.0, 0, 0], [1.0, 0, 0], [0, 0, 0]])
+    xyz = np.array([[0, 0, 1.0], [0, 0, 1.0], [0, 0, 1.0]])
+    # Seen by cameras 0 and 1, by cameras 2 and 0 and 1, and by camera 2 only
+    track_offsets = np.array([0, 2, 5, 6])
+    track_images = np.array([0, 1, 2, 0, 1, 2])
+    angles = triangulation_angles(xyz, track_offsets, track_images, centers)
+    np.testing.assert_allclose(angles, [90, 90, 0], atol=1e-9)
+
+
+def test_triangulation_angles_compare_every_pair_of_a_track():
+    # Rays at 0, 120, -110 and 60 degrees around the point: the widest pair is -110 and 60, which a search from
+    # the first ray (furthest: 120, then furthest from 120: -110) misses
+    directions = np.radians([0, 120, -110, 60])
+    rays = np.stack([np.cos(directions), np.sin(directions), np.zeros(4)], axis=1)
+    xyz = np.zeros((1, 3))
+    angles = triangulation_angles(xyz, np.array([0, 4]), np.arange(4), xyz - rays)
+    np.testing.assert_allclose(angles, [170], atol=1e-9)
+
+    # Same result when the tracks are compared a few pairs at a time
+    track_offsets = np.array([0, 4, 8, 10])
+    track_images = np.array([0, 1, 2, 3, 3, 2, 1, 0, 0, 1])
+    xyz = np.zeros((3, 3))
+    np.testing.assert_allclose(
+        triangulation_angles(xyz, track_offsets, track_images, -rays, max_pairs=1),
+        triangulation_angles(xyz, track_offsets, track_images, -rays), atol=1e-9)
+
+
+def test_statistical_mask_drops_isolated_points():
+    rng = np.random.default_rng(0)
+    xyz = np.concatenate([rng.normal(size=(500, 3)) * 0.1, [[50.0, 50.0, 50.0]]])
+    mask = statistical_mask(xyz, 2.0)
+    assert not mask[-1] and mask[:-1].mean() > 0.9
+    # Too few points to compare with their neighbours
+    assert statistical_mask(xyz[:5], 2.0).all()
+
+
+def test_mask_key():
+    assert mask_key('max_error', 2.0) == 'max_error_2'
+    assert mask_key('min_angle', 1.5) == 'min_angle_1.5'
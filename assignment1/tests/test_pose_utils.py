@@ -0,0 +1,62 @@
+import numpy as np
+
+from utils.pose_utils import (
+    interpolate_poses, invert_poses, matrices_to_quaternions, multiply_quaternions, quaternions_from_axis_angle,
+    quaternions_to_matrices, slerp)
+
+
+def random_rotations(count, seed=0):
+    rng = np.random.default_rng(seed)
+    axes = rng.normal(size=(count, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    return quaternions_to_matrices(quaternions_from_axis_angle(rng.uniform(-np.pi, np.pi, count), axes))
+
+
+def test_quaternion_matrix_round_trip():
+    rotations = random_rotations(100)
+    quaternions = matrices_to_quaternions(rotations)
+    assert np.all(quaternions[:, 3] >= 0)
+    np.testing.assert_allclose(np.linalg.norm(quaternions, axis=1), 1)
+    np.testing.assert_allclose(quaternions_to_matrices(quaternions), rotations, atol=1e-12)
+
+
+def test_multiply_quaternions_composes_rotations():
+    rotations = random_rotations(20)
+    q = matrices_to_quaternions(rotations)
+    composed = quaternions_to_matrices(multiply_quaternions(q[:10], q[10:]))
+    np.testing.assert_allclose(composed, rotations[:10] @ rotations[10:], atol=1e-12)
+
+
+def test_slerp_follows_the_shortest_arc_at_constant_speed():
+    q1 = quaternions_from_axis_angle(0.0, [0, 0, 1])
+    q2 = quaternions_from_axis_angle(np.pi / 2, [0, 0, 1])
+    np.testing.assert_allclose(slerp(q1, q2, 0), q1, atol=1e-12)
+    np.testing.assert_allclose(slerp(q1, q2, 1), q2, atol=1e-12)
+    np.testing.assert_allclose(slerp(q1, q2, 0.5), quaternions_from_axis_angle(np.pi / 4, [0, 0, 1]), atol=1e-12)
+    # -q2 is the same rotation, the interpolation does not go the long way round
+    np.testing.assert_allclose(slerp(q1, -q2, 0.5), quaternions_from_axis_angle(np.pi / 4, [0, 0, 1]), atol=1e-12)
+    # Nearly identical rotations
+    np.testing.assert_allclose(slerp(q1, q1, 0.3), q1, atol=1e-12)
+
+
+def test_invert_poses():
+    rotations = random_rotations(5)
+    translations = np.random.default_rng(1).normal(size=(5, 3))
+    inverse_rotations, inverse_translations = invert_poses(rotations, translations)
+    point = np.array([0.3, -1.0, 2.0])
+    camera_points = np.einsum('nij,j->ni', rotations, point) + translations
+    back = np.einsum('nij,nj->ni', inverse_rotations, camera_points) + inverse_translations
+    np.testing.assert_allclose(back, np.tile(point, (5, 1)), atol=1e-12)
+
+
+def test_interpolate_poses_goes_through_every_pose():
+    rotations = random_rotations(4)
+    translations = np.random.default_rng(2).normal(size=(4, 3))
+    path_rotations, path_translations = interpolate_poses(rotations, translations, 5)
+    assert len(path_rotations) == 3 * 5 + 1
+    np.testing.assert_allclose(path_rotations[::5], rotations, atol=1e-9)
+    np.testing.assert_allclose(path_translations[::5], translations, atol=1e-9)
+
+    # Camera centers move in a straight line between two cameras
+    _, centers = invert_poses(path_rotations, path_translations)
+    np.testing.assert_allclose(centers[2], centers[0] + 0.4 * (centers[5] - centers[0]), atol=1e-9)
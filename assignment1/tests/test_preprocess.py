@@ -0,0 +1,33 @@
+import numpy as np
+import open3d as o3d
+
+from modules.colmap.preprocess import downsample_images, rescale_intrinsics
+
+
+def test_rescale_intrinsics_scales_every_axis():
+    intrinsics = [[300, 200, 250, 260, 150, 100], [300, 200, 1, 1, 1, 1]]
+    sizes = {'a.jpg': [1200, 800, 300, 200]}
+    rescaled = rescale_intrinsics(intrinsics, ['a.jpg', 'b.jpg'], sizes)
+    np.testing.assert_allclose(rescaled[0], [1200, 800, 1000, 1040, 600, 400])
+    # Images that were not downsampled are left as they are
+    np.testing.assert_allclose(rescaled[1], intrinsics[1])
+
+
+def test_rescale_intrinsics_keeps_pixel_centers_in_place():
+    # In COLMAP's convention the first pixel center is at 0.5, the center of the 4x4 block it was averaged from
+    rescaled = rescale_intrinsics([[100, 50, 80, 80, 0.5, 0.5]], ['a.jpg'], {'a.jpg': [400, 200, 100, 50]})
+    np.testing.assert_allclose(rescaled[0, 4:], [2.0, 2.0])
+
+
+def test_downsample_images_writes_readable_pngs(tmp_path):
+    pixels = np.zeros((40, 60, 3), dtype=np.uint8)
+    pixels[:, 30:] = 200
+    path = str(tmp_path / 'a.png')
+    assert o3d.t.io.write_image(path, o3d.t.geometry.Image(o3d.core.Tensor(pixels)))
+
+    sizes = downsample_images([path], str(tmp_path / 'images_2'), 2, str(tmp_path / 'manifest.json'), 1)
+    assert sizes == {'a.png': [60, 40, 30, 20]}
+    small = np.asarray(o3d.io.read_image(str(tmp_path / 'images_2' / 'a.png')))
+    assert small.shape == (20, 30, 3)
+    np.testing.assert_array_equal(small[:, :15], 0)
+    np.testing.assert_array_equal(small[:, 15:], 200)
@@ -0,0 +1,48 @@
+import json
+
+from utils.profile_utils import StageProfiler, format_record
+
+
+def test_stages_are_recorded_when_they_finish():
+    finished = []
+    profiler = StageProfiler('run', on_record=finished.append)
+    with profiler.stage('outer', images=3):
+        with profiler.stage('inner'):
+            profiler.count(pairs=2)
+        profiler.count(points=10)
+
+    assert [record['stage'] for record in finished] == ['inner', 'outer']
+    inner, outer = profiler.records
+    assert inner['counts'] == {'pairs': 2} and outer['counts'] == {'images': 3, 'points': 10}
+    assert 0 <= inner['seconds'] <= outer['seconds'] and outer['start'] <= inner['start']
+
+
+def test_stages_that_raise_are_recorded_too():
+    profiler = StageProfiler('run')
+    try:
+        with profiler.stage('map'):
+            raise RuntimeError('mapper failed')
+    except RuntimeError:
+        pass
+    assert [record['stage'] for record in profiler.records] == ['map']
+
+
+def test_runs_are_appended_as_json_lines(tmp_path):
+    trace_path = str(tmp_path / 'colmap' / 'trace.jsonl')
+    for name in ['first', 'second']:
+        profiler = StageProfiler(name)
+        profiler.metadata['matcher'] = 'exhaustive_matcher'
+        with profiler.stage('match'):
+            pass
+        profiler.append_to(trace_path)
+
+    with open(trace_path, 'r') as f:
+        runs = [json.loads(line) for line in f]
+    assert [run['name'] for run in runs] == ['first', 'second']
+    assert runs[0]['metadata'] == {'matcher': 'exhaustive_matcher'} and runs[0]['stages'][0]['stage'] == 'match'
+
+
+def test_format_record():
+    record = {'stage': 'match', 'seconds': 12.3, 'peak_rss_mb': 812.4, 'counts': {'pairs': 4950}}
+    assert format_record(record) == 'match: 12.30 s, 812 MB, pairs=4950'
+    assert format_record(dict(record, peak_rss_mb=None, counts={})) == 'match: 12.30 s'
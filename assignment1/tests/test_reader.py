@@ -0,0 +1,27 @@
+import numpy as np
+
+from modules.colmap.reader import find_models, model_size, read_sparse_model
+
+
+def test_read_text_model(tmp_path, text_model):
+    xyz, rgb = text_model(str(tmp_path), 3, 10)
+    reconstruction = read_sparse_model(str(tmp_path))
+    assert reconstruction['image_names'] == ['img000.jpg', 'img001.jpg', 'img002.jpg']
+    np.testing.assert_allclose(reconstruction['xyz'], xyz, rtol=1e-6)
+    np.testing.assert_array_equal(reconstruction['rgb'], rgb)
+    np.testing.assert_allclose(reconstruction['rotations'], np.tile(np.eye(3), (3, 1, 1)))
+    np.testing.assert_allclose(reconstruction['translations'], [[0, 0, 0], [-1, 0, 0], [-2, 0, 0]])
+    np.testing.assert_allclose(reconstruction['intrinsics'], np.tile([640, 480, 500, 500, 320, 240], (3, 1)))
+
+
+def test_find_models_in_numbered_folders(tmp_path, text_model):
+    assert find_models(str(tmp_path / 'missing')) == []
+    for name in ['10', '2', '0']:
+        text_model(str(tmp_path / name), 2, 10)
+    (tmp_path / '3').mkdir()
+    assert find_models(str(tmp_path)) == [str(tmp_path / name) for name in ['0', '2', '10']]
+
+    # A model written directly into the folder is the only one
+    text_model(str(tmp_path), 5, 50)
+    assert find_models(str(tmp_path)) == [str(tmp_path)]
+    assert model_size(str(tmp_path)) > model_size(str(tmp_path / '0'))
@@ -0,0 +1,38 @@
+from modules.gui.recent import RecentCache, RecentEntry
+
+
+def entry(nbytes):
+    return RecentEntry(None, None, 'fingerprint', nbytes)
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_budget():
+    cache = RecentCache(100)
+    assert cache.put('a', entry(40)) == []
+    assert cache.put('b', entry(40)) == []
+    # Putting a again makes b the least recently used
+    assert cache.put('a', entry(40)) == []
+    assert cache.put('c', entry(40)) == ['b']
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert len(cache) == 2 and cache.nbytes == 80
+
+
+def test_entries_larger_than_the_budget_are_not_kept():
+    cache = RecentCache(100)
+    cache.put('a', entry(40))
+    assert cache.put('b', entry(200)) == ['a', 'b']
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_take_removes_the_entry():
+    cache = RecentCache(100)
+    cache.put('a', entry(40))
+    assert cache.take('a').nbytes == 40
+    assert cache.take('a') is None and len(cache) == 0
+
+
+def test_resize_evicts_to_fit_the_new_budget():
+    cache = RecentCache(100)
+    for key in 'abc':
+        cache.put(key, entry(30))
+    assert cache.resize(50) == ['a', 'b']
+    assert cache.max_bytes == 50 and list('c') == [key for key in 'abc' if key in cache]
@@ -0,0 +1,17 @@
+import numpy as np
+
+from utils.shared_memory_utils import attach_arrays, release_blocks, share_arrays
+from utils.thread_utils import run_on_process
+
+
+def test_arrays_shared_by_another_process_are_mapped_without_copy():
+    arrays = {'xyz': np.arange(12, dtype=np.float32).reshape(4, 3), 'empty': np.zeros((0, 3), dtype=np.uint8)}
+    descriptors = run_on_process(share_arrays)(arrays).result(timeout=60)
+    shared, blocks = attach_arrays(descriptors)
+    np.testing.assert_array_equal(shared['xyz'], arrays['xyz'])
+    assert shared['empty'].shape == (0, 3) and shared['empty'].dtype == np.uint8
+
+    # Blocks stay open while arrays map them
+    assert len(release_blocks(blocks)) == 2
+    del shared
+    assert release_blocks(blocks) == []
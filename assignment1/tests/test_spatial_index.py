@@ -0,0 +1,33 @@
+import numpy as np
+
+from modules.colmap.spatial_index import SpatialIndex
+
+
+def make_index():
+    xyz = np.random.default_rng(0).random((2000, 3)).astype(np.float32)
+    return xyz, SpatialIndex(xyz)
+
+
+def test_nearest():
+    xyz, index = make_index()
+    point = np.array([0.5, 0.5, 0.5])
+    expected = int(np.argmin(np.linalg.norm(xyz - point, axis=1)))
+    assert index.nearest(point) == expected
+    assert index.nearest([5, 5, 5], max_distance=0.1) is None
+    assert SpatialIndex(np.zeros((0, 3), dtype=np.float32)).nearest(point) is None
+
+
+def test_radius_matches_brute_force():
+    xyz, index = make_index()
+    point = xyz[10]
+    expected = np.flatnonzero(np.linalg.norm(xyz - point, axis=1) <= 0.1)
+    np.testing.assert_array_equal(index.radius(point, 0.1), expected)
+
+
+def test_box_matches_brute_force():
+    xyz, index = make_index()
+    min_bound, max_bound = [0.2, 0.1, 0.4], [0.5, 0.6, 0.7]
+    expected = np.flatnonzero(np.all((xyz >= min_bound) & (xyz <= max_bound), axis=1))
+    np.testing.assert_array_equal(index.box(min_bound, max_bound), expected)
+    assert len(index.box([2, 2, 2], [3, 3, 3])) == 0
+    assert len(index) == len(xyz) and index.nbytes > 0
@@ -0,0 +1,46 @@
+from modules.colmap.stages import STAGES, StageManifests, stage_keys
+
+
+def test_stage_keys_chain_the_parameters_of_earlier_stages():
+    keys = stage_keys('images', {'match': {'matcher': 'exhaustive_matcher'}})
+    assert list(keys) == STAGES and len(set(keys.values())) == len(STAGES)
+    assert stage_keys('images', {'match': {'matcher': 'exhaustive_matcher'}}) == keys
+
+    changed = stage_keys('images', {'match': {'matcher': 'sequential_matcher'}})
+    first_changed = STAGES.index('match')
+    assert all(changed[stage] == keys[stage] for stage in STAGES[:first_changed])
+    assert all(changed[stage] != keys[stage] for stage in STAGES[first_changed:])
+
+    other_images = stage_keys('other images', {'match': {'matcher': 'exhaustive_matcher'}})
+    assert all(other_images[stage] != keys[stage] for stage in STAGES)
+
+
+def test_manifests_resume_from_the_first_stale_stage(tmp_path):
+    stages = StageManifests(str(tmp_path / 'stages'))
+    keys = stage_keys('images', {})
+    assert not stages.exists() and stages.first_stale(keys) == 'list'
+
+    for stage in STAGES:
+        stages.mark_done(stage, keys[stage], {}, {'images': 3})
+    assert stages.first_stale(keys) is None
+    assert stages.read('list')['outputs'] == {'images': 3}
+    assert all(status == 'cached' for _, status in stages.status(keys))
+
+    changed = stage_keys('images', {'match': {'matcher': 'sequential_matcher'}})
+    assert stages.first_stale(changed) == 'match'
+    assert dict(stages.status(changed))['extract'] == 'cached'
+    assert dict(stages.status(changed))['export'] == 'stale'
+
+    stages.invalidate('map')
+    assert stages.first_stale(keys) == 'map'
+    assert dict(stages.status(keys)) == dict(
+        [(stage, 'cached') for stage in STAGES[:-2]] + [('map', 'missing'), ('export', 'missing')])
+
+
+def test_broken_manifests_are_missing(tmp_path):
+    stages = StageManifests(str(tmp_path / 'stages'))
+    keys = stage_keys('images', {})
+    stages.mark_done('list', keys['list'], {})
+    with open(stages.path('list'), 'w') as f:
+        f.write('{')
+    assert stages.read('list') is None and stages.first_stale(keys) == 'list'
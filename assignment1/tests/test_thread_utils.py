@@ -0,0 +1,72 @@
+import os
+import pytest
+import threading
+
+from utils.thread_utils import TaskFuture, report_progress, run_on_process, run_on_thread
+
+
+def count_to(total):
+    for i in range(total):
+        report_progress('count', i + 1, total)
+    return total
+
+
+def test_run_on_thread_returns_a_future_of_the_result():
+    future = run_on_thread(count_to)(3)
+    assert isinstance(future, TaskFuture)
+    assert future.result(timeout=10) == 3
+
+
+def test_exceptions_are_raised_by_the_future():
+    future = run_on_thread(int)('not a number')
+    with pytest.raises(ValueError):
+        future.result(timeout=10)
+
+
+def test_progress_and_done_callbacks_go_through_dispatch():
+    release = threading.Event()
+
+    def wait_then_count(total):
+        release.wait(10)
+        return count_to(total)
+
+    dispatched, events, done = [], [], []
+    finished = threading.Event()
+
+    def dispatch(function):
+        dispatched.append(function)
+        function()
+
+    future = run_on_thread(wait_then_count)(2)
+    future.add_progress_callback(events.append, dispatch=dispatch)
+    future.add_done_callback(lambda f: done.append(f) or finished.set(), dispatch=dispatch)
+    release.set()
+    # Done callbacks run on the task thread after the result is set
+    assert finished.wait(10)
+
+    assert [(event.stage, event.current, event.total) for event in events] == [('count', 1, 2), ('count', 2, 2)]
+    assert future.progress.current == 2
+    assert done == [future] and len(dispatched) == 3
+
+
+def test_report_progress_outside_a_task_does_nothing():
+    report_progress('count', 1, 1)
+
+
+def test_run_on_process_forwards_progress_and_result():
+    events = []
+    future = run_on_process(count_to)(3)
+    future.add_progress_callback(events.append)
+    assert future.result(timeout=60) == 3
+    # Events sent before the callback was added only update the latest progress
+    assert future.progress.current == 3 and all(event.stage == 'count' for event in events)
+
+
+def test_run_on_process_raises_the_exceptions_of_the_process():
+    with pytest.raises(ValueError):
+        run_on_process(int)('not a number').result(timeout=60)
+
+
+def test_run_on_process_fails_when_the_process_dies():
+    with pytest.raises(RuntimeError, match='exited with code 3'):
+        run_on_process(os._exit)(3).result(timeout=60)
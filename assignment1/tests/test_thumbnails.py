@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import open3d as o3d
+import os
+import os.path as osp
+
+from modules.gui.thumbnails import MANIFEST_NAME, THUMBNAIL_SIZES, ThumbnailCache, build_thumbnails, thumbnail_path
+
+
+def write_image(path, width, height):
+    pixels = (np.random.default_rng(0).random((height, width, 3)) * 255).astype(np.uint8)
+    o3d.t.io.write_image(str(path), o3d.t.geometry.Image(o3d.core.Tensor(pixels)))
+    return str(path)
+
+
+def make_images(tmp_path):
+    image_dir = tmp_path / 'images'
+    image_dir.mkdir()
+    good = [write_image(image_dir / 'a.jpg', 1200, 900), write_image(image_dir / 'b.png', 300, 200)]
+    corrupt = str(image_dir / 'c.jpg')
+    with open(corrupt, 'w') as f:
+        f.write('not an image')
+    return str(image_dir), good, corrupt
+
+
+def test_build_thumbnails_makes_every_level(tmp_path):
+    image_dir, good, _ = make_images(tmp_path)
+    thumbnail_dir = str(tmp_path / 'thumbnails')
+    assert build_thumbnails(good, thumbnail_dir, num_workers=1) == 2
+
+    sizes = [o3d.io.read_image(thumbnail_path(thumbnail_dir, 'a.jpg', size)).get_max_bound() for size in
+             THUMBNAIL_SIZES]
+    assert [max(size) for size in sizes] == THUMBNAIL_SIZES
+    # Never upscaled
+    assert max(o3d.io.read_image(thumbnail_path(thumbnail_dir, 'b.png', 512)).get_max_bound()) == 300
+    assert build_thumbnails(good, thumbnail_dir, num_workers=1) == 0
+
+    # Thumbnails of removed images are removed too
+    build_thumbnails(good[:1], thumbnail_dir, num_workers=1)
+    assert not osp.isfile(thumbnail_path(thumbnail_dir, 'b.png', 256))
+
+
+def test_build_thumbnails_skips_corrupt_images(tmp_path):
+    image_dir, good, corrupt = make_images(tmp_path)
+    thumbnail_dir = str(tmp_path / 'thumbnails')
+    assert build_thumbnails([corrupt] + good, thumbnail_dir, num_workers=1) == 2
+    assert all(osp.isfile(thumbnail_path(thumbnail_dir, osp.basename(path), 256)) for path in good)
+    with open(osp.join(thumbnail_dir, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    assert set(manifest['images']) == {'a.jpg', 'b.png'} and set(manifest['failed']) == {'c.jpg'}
+
+    # Only tried again once modified
+    assert build_thumbnails([corrupt] + good, thumbnail_dir, num_workers=1) == 0
+    write_image(corrupt, 64, 48)
+    assert build_thumbnails([corrupt] + good, thumbnail_dir, num_workers=1) == 1
+
+
+def test_thumbnail_cache_loads_lazily_and_evicts(tmp_path):
+    image_dir, good, corrupt = make_images(tmp_path)
+    thumbnail_dir = str(tmp_path / 'thumbnails')
+    cache = ThumbnailCache(image_dir, thumbnail_dir, capacity=2)
+
+    # Made on demand without a build
+    image = cache.get('a.jpg', 256)
+    assert np.asarray(image).shape == (192, 256, 3)
+    assert cache.get('a.jpg', 256) is image
+    assert cache.get('c.jpg', 256) is None
+    assert cache.get('missing.jpg', 256) is None
+
+    cache.get('b.png', 256)
+    cache.get('a.jpg', 512)
+    assert len(cache) == 2
+    assert cache.get('a.jpg', 256) is not image
+    assert sorted(os.listdir(osp.join(thumbnail_dir, '256'))) == ['a.jpg.jpg', 'b.png.jpg']
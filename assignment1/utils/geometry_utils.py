@@ -1,21 +1,66 @@
-import math
+import numpy as np
+
+from utils import pose_utils
 
 
 def create_quaternion(angle, axis):
-    w = math.cos(angle / 2)
-    x = axis[0] * math.sin(angle / 2)
-    y = axis[1] * math.sin(angle / 2)
-    z = axis[2] * math.sin(angle / 2)
-    return [x, y, z, w]
+    return pose_utils.quaternions_from_axis_angle(angle, axis).tolist()
 
 
 def multiply_quaternions(q1, q2):
-    x1, y1, z1, w1 = q1
-    x2, y2, z2, w2 = q2
+    return pose_utils.multiply_quaternions(q1, q2).tolist()
+
+
+# Frustum edges over the points [center, top-left, top-right, bottom-right, bottom-left]
+FRUSTUM_LINES = np.array([[0, 1], [0, 2], [0, 3], [0, 4], [1, 2], [2, 3], [3, 4], [4, 1]])
+
+
+def compute_frustum_rays(intrinsics, rotations, translations):
+    ''' Camera centers (N, 3) and world-space rays (N, 4, 3) through the image corners at unit depth
+
+    intrinsics holds rows of [width, height, fx, fy, cx, cy], rotations and translations are world-to-camera.
+    '''
+    intrinsics = np.asarray(intrinsics, dtype=np.float64)
+    rotations = np.asarray(rotations, dtype=np.float64)
+    translations = np.asarray(translations, dtype=np.float64)
+
+    width, height, fx, fy, cx, cy = intrinsics.T
+    zeros = np.zeros_like(width)
+    u = np.stack([zeros, width, width, zeros], axis=1)
+    v = np.stack([zeros, zeros, height, height], axis=1)
+
+    rays = np.empty(u.shape + (3,), dtype=np.float64)
+    rays[..., 0] = (u - cx[:, None]) / fx[:, None]
+    rays[..., 1] = (v - cy[:, None]) / fy[:, None]
+    rays[..., 2] = 1
+
+    # Camera to world: R^T x, applied to row vectors as x R
+    rays = np.einsum('nkj,nji->nki', rays, rotations)
+    centers = -np.einsum('nji,nj->ni', rotations, translations)
+    return centers, rays
+
+
+def compute_frustum_points(centers, rays, scale):
+    ''' Frustum vertices (N * 5, 3) matching FRUSTUM_LINES for every camera '''
+    points = np.empty((len(centers), 5, 3), dtype=np.float64)
+    points[:, 0] = centers
+    points[:, 1:] = centers[:, None] + scale * rays
+    return points.reshape(-1, 3)
+
+
+def compute_frustum_lines(num_cameras):
+    offsets = 5 * np.arange(num_cameras)
+    return (FRUSTUM_LINES[None] + offsets[:, None, None]).reshape(-1, 2)
+
+
+# Two triangles over the frustum corners [top-left, top-right, bottom-right, bottom-left], wound both ways so the
+# image shows from either side, and the texture coordinates of their vertices
+IMAGE_QUAD_TRIANGLES = np.array([[0, 1, 2], [0, 2, 3], [0, 2, 1], [0, 3, 2]])
+IMAGE_QUAD_UVS = np.array([[0, 0], [1, 0], [1, 1], [0, 0], [1, 1], [0, 1],
+                           [0, 0], [1, 1], [1, 0], [0, 0], [0, 1], [1, 1]], dtype=np.float64)
 
-    x =  w1*x2 + x1*w2 + y1*z2 - z1*y2
-    y =  w1*y2 - x1*z2 + y1*w2 + z1*x2
-    z =  w1*z2 + x1*y2 - y1*x2 + z1*w2
-    w =  w1*w2 - x1*x2 - y1*y2 - z1*z2
 
-    return [x, y, z, w]
+def compute_image_quad(center, rays, scale):
+    ''' Vertices (4, 3) of the image plane of one camera at the far end of its frustum, matching
+    IMAGE_QUAD_TRIANGLES '''
+    return center[None] + scale * rays
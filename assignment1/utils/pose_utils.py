@@ -0,0 +1,127 @@
+import numpy as np
+
+
+# Quaternions are stored as [x, y, z, w] along the last axis, like utils.geometry_utils.
+# COLMAP writes them as [w, x, y, z]: convert with q[..., [1, 2, 3, 0]].
+
+
+def quaternions_from_axis_angle(angles, axes):
+    ''' Quaternions (..., 4) rotating by angles (...) around axes (..., 3), the axes are used as given '''
+    angles = np.asarray(angles, dtype=np.float64)
+    axes = np.asarray(axes, dtype=np.float64)
+    half = angles[..., None] / 2
+    return np.concatenate([axes * np.sin(half), np.cos(half)], axis=-1)
+
+
+def normalize_quaternions(quaternions):
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    return quaternions / np.linalg.norm(quaternions, axis=-1, keepdims=True)
+
+
+def multiply_quaternions(q1, q2):
+    ''' Hamilton products q1 * q2 of quaternions (..., 4), broadcast against each other '''
+    q1 = np.asarray(q1, dtype=np.float64)
+    q2 = np.asarray(q2, dtype=np.float64)
+    x1, y1, z1, w1 = np.moveaxis(q1, -1, 0)
+    x2, y2, z2, w2 = np.moveaxis(q2, -1, 0)
+    return np.stack([
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+    ], axis=-1)
+
+
+def quaternions_to_matrices(quaternions):
+    ''' Rotation matrices (..., 3, 3) of quaternions (..., 4), which are normalized first '''
+    x, y, z, w = np.moveaxis(normalize_quaternions(quaternions), -1, 0)
+    matrices = np.empty(x.shape + (3, 3), dtype=np.float64)
+    matrices[..., 0, 0] = 1 - 2 * y * y - 2 * z * z
+    matrices[..., 0, 1] = 2 * x * y - 2 * w * z
+    matrices[..., 0, 2] = 2 * z * x + 2 * w * y
+    matrices[..., 1, 0] = 2 * x * y + 2 * w * z
+    matrices[..., 1, 1] = 1 - 2 * x * x - 2 * z * z
+    matrices[..., 1, 2] = 2 * y * z - 2 * w * x
+    matrices[..., 2, 0] = 2 * z * x - 2 * w * y
+    matrices[..., 2, 1] = 2 * y * z + 2 * w * x
+    matrices[..., 2, 2] = 1 - 2 * x * x - 2 * y * y
+    return matrices
+
+
+def matrices_to_quaternions(matrices):
+    ''' Unit quaternions (..., 4) of rotation matrices (..., 3, 3), with w >= 0 '''
+    m = np.asarray(matrices, dtype=np.float64)
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+
+    # Each row is 4 times one component times the quaternion, the largest component keeps it well conditioned
+    candidates = np.stack([
+        np.stack([1 + m00 - m11 - m22, m[..., 0, 1] + m[..., 1, 0],
+                  m[..., 0, 2] + m[..., 2, 0], m[..., 2, 1] - m[..., 1, 2]], axis=-1),
+        np.stack([m[..., 0, 1] + m[..., 1, 0], 1 - m00 + m11 - m22,
+                  m[..., 1, 2] + m[..., 2, 1], m[..., 0, 2] - m[..., 2, 0]], axis=-1),
+        np.stack([m[..., 0, 2] + m[..., 2, 0], m[..., 1, 2] + m[..., 2, 1],
+                  1 - m00 - m11 + m22, m[..., 1, 0] - m[..., 0, 1]], axis=-1),
+        np.stack([m[..., 2, 1] - m[..., 1, 2], m[..., 0, 2] - m[..., 2, 0],
+                  m[..., 1, 0] - m[..., 0, 1], 1 + m00 + m11 + m22], axis=-1),
+    ], axis=-2)
+    best = np.argmax(np.stack([m00 - m11 - m22, m11 - m00 - m22, m22 - m00 - m11, m00 + m11 + m22], axis=-1),
+                     axis=-1)
+    quaternions = np.take_along_axis(candidates, best[..., None, None], axis=-2)[..., 0, :]
+    quaternions = normalize_quaternions(quaternions)
+    return np.where(quaternions[..., 3:] < 0, -quaternions, quaternions)
+
+
+def slerp(q1, q2, t):
+    ''' Spherical linear interpolation from q1 (t = 0) to q2 (t = 1), along the shortest arc
+
+    q1 and q2 are unit quaternions (..., 4), t is broadcast against their leading dimensions.
+    '''
+    q1 = np.asarray(q1, dtype=np.float64)
+    q2 = np.asarray(q2, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+
+    dot = np.sum(q1 * q2, axis=-1, keepdims=True)
+    q2 = np.where(dot < 0, -q2, q2)
+    dot = np.clip(np.abs(dot), 0, 1)
+
+    angle = np.arccos(dot)
+    sin_angle = np.sin(angle)
+    # Nearly identical rotations: the weights tend to those of a linear interpolation
+    near = sin_angle < 1e-6
+    safe_sin = np.where(near, 1, sin_angle)
+    w1 = np.where(near, 1 - t, np.sin((1 - t) * angle) / safe_sin)
+    w2 = np.where(near, t, np.sin(t * angle) / safe_sin)
+    return normalize_quaternions(w1 * q1 + w2 * q2)
+
+
+def invert_poses(rotations, translations):
+    ''' Invert rigid transforms x -> R x + t given as rotations (..., 3, 3) and translations (..., 3)
+
+    Turns world-to-camera poses into camera-to-world ones and back, the camera centers being the
+    inverted translations.
+    '''
+    rotations = np.asarray(rotations, dtype=np.float64)
+    translations = np.asarray(translations, dtype=np.float64)
+    inverse_rotations = np.swapaxes(rotations, -1, -2)
+    inverse_translations = -np.einsum('...ij,...j->...i', inverse_rotations, translations)
+    return inverse_rotations, inverse_translations
+
+
+def interpolate_poses(rotations, translations, samples_per_segment):
+    ''' Poses along the path through a sequence of rigid transforms, returned as rotations and translations
+
+    Every segment between two consecutive poses gets samples_per_segment poses, starting with the first pose of
+    the segment, and the last pose closes the path. Rotations are interpolated with SLERP and the centers
+    (inverted translations) linearly, so the path goes straight from one camera center to the next.
+    '''
+    rotations = np.asarray(rotations, dtype=np.float64)
+    quaternions = matrices_to_quaternions(rotations)
+    _, centers = invert_poses(rotations, translations)
+
+    t = np.arange(samples_per_segment) / samples_per_segment
+    path_quaternions = slerp(quaternions[:-1, None], quaternions[1:, None], t[None])
+    path_centers = centers[:-1, None] * (1 - t)[None, :, None] + centers[1:, None] * t[None, :, None]
+
+    path_quaternions = np.concatenate([path_quaternions.reshape(-1, 4), quaternions[-1:]])
+    path_centers = np.concatenate([path_centers.reshape(-1, 3), centers[-1:]])
+    return invert_poses(quaternions_to_matrices(path_quaternions).swapaxes(-1, -2), path_centers)
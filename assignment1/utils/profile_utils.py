@@ -0,0 +1,100 @@
+import contextlib
+import datetime
+import json
+import os
+import os.path as osp
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, memory is then left out of the records
+    resource = None
+
+
+def peak_rss_mb(children=False):
+    ''' Peak resident memory in MB of this process, or of its largest finished child process, None if unknown
+
+    The peak covers the whole life of the process, so it only grows from one stage to the next.
+    '''
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_maxrss * scale / (1 << 20)
+
+
+def format_record(record):
+    ''' One line summary of a stage record, e.g. "match: 12.30 s, 812 MB, pairs=4950" '''
+    text = f"{record['stage']}: {record['seconds']:.2f} s"
+    if record['peak_rss_mb'] is not None:
+        text += f", {record['peak_rss_mb']:.0f} MB"
+    for name, value in record['counts'].items():
+        text += f', {name}={value}'
+    return text
+
+
+class StageProfiler:
+    ''' Records the duration, peak memory and item counts of the stages of a task
+
+    Every stage becomes a record once it finishes:
+        {'stage': str, 'start': float, 'seconds': float, 'peak_rss_mb': float, 'peak_child_rss_mb': float,
+         'counts': {name: int}}
+    start is relative to the creation of the profiler. peak_child_rss_mb covers the external tools, e.g. COLMAP.
+    on_record, if given, is called with every finished record on the thread that ran the stage.
+    '''
+    def __init__(self, name, on_record=None):
+        self._name = name
+        self._on_record = on_record
+        self._started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._open = []
+        self._records = []
+        self.metadata = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def records(self):
+        return list(self._records)
+
+    @contextlib.contextmanager
+    def stage(self, name, **counts):
+        record = {'stage': name, 'start': time.perf_counter() - self._start, 'counts': dict(counts)}
+        self._open.append(record)
+        try:
+            yield record
+        finally:
+            self._open.remove(record)
+            record['seconds'] = time.perf_counter() - self._start - record['start']
+            record['peak_rss_mb'] = peak_rss_mb()
+            record['peak_child_rss_mb'] = peak_rss_mb(children=True)
+            self._records.append(record)
+            if self._on_record is not None:
+                self._on_record(record)
+
+    def count(self, **counts):
+        ''' Set item counts on the innermost running stage '''
+        if len(self._open) > 0:
+            self._open[-1]['counts'].update(counts)
+
+    def to_dict(self):
+        return {
+            'name': self._name,
+            'started': self._started.isoformat(timespec='seconds'),
+            'total_seconds': time.perf_counter() - self._start,
+            'peak_rss_mb': peak_rss_mb(),
+            'metadata': dict(self.metadata),
+            'stages': self.records,
+        }
+
+    def append_to(self, trace_path):
+        ''' Append this run as one JSON line to trace_path, so successive runs can be compared '''
+        os.makedirs(osp.dirname(osp.abspath(trace_path)), exist_ok=True)
+        with open(trace_path, 'a') as f:
+            f.write(json.dumps(self.to_dict()) + '\n')
+
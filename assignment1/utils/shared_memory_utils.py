@@ -0,0 +1,48 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def share_arrays(arrays):
+    ''' Copy arrays into new shared memory blocks
+
+    Returns picklable descriptors {name: (block_name, shape, dtype)} that attach_arrays turns back into arrays in
+    another process. The blocks are closed here but not unlinked, the receiving side owns them.
+    '''
+    descriptors = {}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        # Shared memory blocks cannot be empty
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        descriptors[name] = (block.name, array.shape, array.dtype.str)
+        block.close()
+    return descriptors
+
+
+def attach_arrays(descriptors):
+    ''' Map the blocks described by share_arrays without copying them
+
+    Returns the arrays and the blocks backing them. The block names are unlinked right away, so the memory is
+    released as soon as the blocks are closed, even if this process dies. A block cannot be closed while one of the
+    arrays, or a view of it, is alive.
+    '''
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        block.unlink()
+        blocks.append(block)
+        # Unlike np.ndarray(buffer=...), frombuffer holds the buffer of the block while the array or any view of
+        # it lives, so release_blocks cannot close the block under them
+        arrays[name] = np.frombuffer(block.buf, dtype=np.dtype(dtype), count=int(np.prod(shape))).reshape(shape)
+    return arrays, blocks
+
+
+def release_blocks(blocks):
+    ''' Close blocks, returning the ones that are still referenced by live arrays '''
+    pending = []
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            pending.append(block)
+    return pending
@@ -1,20 +1,163 @@
+import collections
+import concurrent.futures
 import multiprocessing
 import threading
+import traceback
+
+
+# profile holds the record of a stage that just finished (see utils.profile_utils), None for plain progress
+ProgressEvent = collections.namedtuple(
+    'ProgressEvent', ['stage', 'current', 'total', 'message', 'profile'], defaults=[None])
+
+# The future of the task running on the current thread, used by report_progress
+_current = threading.local()
+
+
+class TaskFuture(concurrent.futures.Future):
+    ''' A future that also carries progress events
+
+    Both done and progress callbacks accept an optional dispatch function, which receives a zero-argument
+    callable and decides where it runs (e.g. posting it to the GUI main thread).
+    '''
+    def __init__(self):
+        super().__init__()
+        self._progress = None
+        self._progress_callbacks = []
+
+    @property
+    def progress(self):
+        return self._progress
+
+    def add_done_callback(self, fn, dispatch=None):
+        if dispatch is None:
+            super().add_done_callback(fn)
+        else:
+            super().add_done_callback(lambda future: dispatch(lambda: fn(future)))
+
+    def add_progress_callback(self, fn, dispatch=None):
+        if dispatch is None:
+            callback = fn
+        else:
+            callback = lambda event: dispatch(lambda: fn(event))
+
+        with self._condition:
+            self._progress_callbacks.append(callback)
+
+    def set_progress(self, event):
+        with self._condition:
+            self._progress = event
+            callbacks = list(self._progress_callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                traceback.print_exc()
+
+
+def current_future():
+    ''' The future of the task running on this thread, or None '''
+    return getattr(_current, 'future', None)
+
+
+def report_progress(stage, current=None, total=None, message='', profile=None):
+    ''' Publish a progress event on the future of the task running on this thread, if any '''
+    future = current_future()
+    if future is not None:
+        future.set_progress(ProgressEvent(stage, current, total, message, profile))
 
 
 def run_on_thread(function):
     def wrap(*args, **kwargs):
-        t = threading.Thread(target=function, args=args, kwargs=kwargs, daemon=True)
+        future = TaskFuture()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            _current.future = future
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as e:
+                traceback.print_exc()
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                _current.future = None
+
+        t = threading.Thread(target=run, daemon=True)
         t.start()
 
-        return t
+        future.thread = t
+        return future
     return wrap
 
 
 def run_on_process(function):
+    ''' Run function in a spawned process and return a TaskFuture
+
+    The function must be importable under its own name, so wrap it at call time instead of decorating it.
+    Its arguments and its result must be picklable. Progress reported inside the process is forwarded to the
+    future through the same pipe as the result.
+    '''
     def wrap(*args, **kwargs):
-        process = multiprocessing.Process(target=function, args=args, kwargs=kwargs)
+        future = TaskFuture()
+        future.set_running_or_notify_cancel()
+
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_in_process, args=(sender, function, args, kwargs))
         process.start()
-        return process 
+        sender.close()
+
+        def monitor():
+            try:
+                while True:
+                    kind, value = receiver.recv()
+                    if kind == 'progress':
+                        future.set_progress(value)
+                    elif kind == 'result':
+                        future.set_result(value)
+                        break
+                    else:
+                        future.set_exception(value)
+                        break
+            except EOFError:
+                process.join()
+                future.set_exception(RuntimeError(f'Process exited with code {process.exitcode}'))
+            finally:
+                receiver.close()
+                process.join()
+
+        t = threading.Thread(target=monitor, daemon=True)
+        t.start()
+
+        future.process = process
+        return future
 
     return wrap
+
+
+class _PipeProgress:
+    def __init__(self, sender):
+        self._sender = sender
+
+    def set_progress(self, event):
+        self._sender.send(('progress', event))
+
+
+def _run_in_process(sender, function, args, kwargs):
+    _current.future = _PipeProgress(sender)
+    try:
+        result = function(*args, **kwargs)
+    except BaseException as e:
+        traceback.print_exc()
+        try:
+            sender.send(('error', e))
+        except Exception:
+            # The exception itself may not be picklable
+            sender.send(('error', RuntimeError(repr(e))))
+    else:
+        sender.send(('result', result))
+    finally:
+        sender.close()